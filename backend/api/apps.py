@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Connects the receivers that invalidate token claims and row
+        # fragments (see api/authentication.py and api/fragments.py).
+        from . import authentication, fragments  # noqa: F401
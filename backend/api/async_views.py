@@ -0,0 +1,70 @@
+# api/async_views.py
+"""
+Native async views on top of DRF.
+
+DRF's APIView.dispatch is synchronous. `AsyncViewMixin` replaces it with a
+coroutine that runs the unchanged DRF request pipeline: authentication
+(JWT), permission classes such as IsAdminOrOwner, throttling, exception
+handling and content negotiation. The parts of it that may touch the
+database (authenticating the user, permission checks) run through
+`sync_to_async`.
+
+Handlers defined with `async def` are awaited on the event loop. Plain
+`def` handlers keep working and run in the request's thread, so a view can
+move its read path to async one action at a time.
+
+Django's async ORM is a wrapper: each query runs through
+`sync_to_async(thread_sensitive=True)`, on one thread per request, with
+that request's database connection. Queries within a request therefore run
+one after the other (awaiting several with asyncio.gather does not overlap
+them), and each still occupies that thread while it waits on the database.
+What ASGI (uvicorn) gains is that the event loop keeps accepting and
+serving other requests meanwhile. Under WSGI (gunicorn), Django runs the
+same views through `async_to_sync`, so both deployments serve the same code.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.utils.decorators import classonlymethod
+from rest_framework.views import APIView
+
+
+class AsyncViewMixin:
+    view_is_async = True
+
+    @classonlymethod
+    def as_view(cls, *args, **kwargs):
+        view = super().as_view(*args, **kwargs)
+        # ViewSetMixin.as_view returns a plain function; it returns our
+        # coroutine, so tell Django to await it.
+        if not iscoroutinefunction(view):
+            markcoroutinefunction(view)
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def acheck_object_permissions(self, request, obj):
+        await sync_to_async(self.check_object_permissions)(request, obj)
+
+
+class AsyncAPIView(AsyncViewMixin, APIView):
+    pass
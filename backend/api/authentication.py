@@ -0,0 +1,185 @@
+# api/authentication.py
+"""
+JWT authentication without a user query per request.
+
+Tokens issued by /api/token/ and /api/token/refresh/ carry the user's
+`username` and `is_staff` as claims. For those, ClaimsJWTAuthentication
+returns a ClaimsUser: id, username, is_staff and the is_authenticated
+flags come from the signed token, which is all permission checks such as
+IsAdminOrOwner look at. Anything else (email, related managers, using it
+as a model instance) loads the User row once, on first use.
+
+Claims can go stale. Saving or deleting a user (promotion to admin,
+deactivation) records the time in the "prompts" cache; tokens issued
+before it authenticate the old way, loading the row, until they expire.
+Refreshing re-reads the claims, so a refreshed token is current again.
+Each worker remembers that time for PROMPT_AUTH_CACHE_TTL seconds, so a
+change made in another worker takes at most that long to apply there.
+
+That only works if every worker sees the same cache. When the "prompts"
+cache is per process (local memory, the default without PROMPT_CACHE_URL)
+a change made in one worker would go unnoticed in the others, so claims
+are not trusted at all and every request loads the user.
+
+Tokens without the claims (issued before, or by AccessToken.for_user)
+authenticate the old way.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.functional import SimpleLazyObject
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt import serializers, tokens
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from . import cache as response_cache
+
+CLAIMS = ('username', 'is_staff')
+
+# Drop every remembered change time once this many users are remembered.
+LOCAL_MAX = 10000
+
+
+def ttl():
+    return getattr(settings, 'PROMPT_AUTH_CACHE_TTL', 10)
+
+
+def stamp(token, user):
+    for claim in CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+# --- tokens ---
+
+class RefreshToken(tokens.RefreshToken):
+    user = None
+
+    @classmethod
+    def for_user(cls, user):
+        token = stamp(super().for_user(user), user)
+        token.user = user
+        return token
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        # On refresh, re-read the claims rather than copying old ones.
+        user = self.user
+        if user is None:
+            user = get_user_model().objects.filter(
+                **{api_settings.USER_ID_FIELD: self[api_settings.USER_ID_CLAIM]}
+            ).first()
+        if user is not None:
+            stamp(access, user)
+        return access
+
+
+class TokenObtainPairSerializer(serializers.TokenObtainPairSerializer):
+    token_class = RefreshToken
+
+
+class TokenRefreshSerializer(serializers.TokenRefreshSerializer):
+    token_class = RefreshToken
+
+
+# --- invalidation ---
+
+_changed = {}  # user id -> (remembered until, change time or None)
+
+
+def _key(user_id):
+    return f'prompts:auth:{user_id}'
+
+
+def shared():
+    """
+    Whether invalidations reach every worker: the "prompts" cache isn't
+    private to this process.
+    """
+    return not isinstance(response_cache.get_cache(), (LocMemCache, DummyCache))
+
+
+def changed_at(user_id):
+    """
+    When the user's claims last changed, if within an access token lifetime.
+    """
+    now = time.monotonic()
+    entry = _changed.get(user_id)
+    if entry is None or entry[0] <= now:
+        if len(_changed) >= LOCAL_MAX:
+            _changed.clear()
+        entry = (now + ttl(), response_cache.get_cache().get(_key(user_id)))
+        _changed[user_id] = entry
+    return entry[1]
+
+
+def invalidate(user_id):
+    """
+    Stop trusting the claims of the user's tokens issued until now.
+    """
+    lifetime = api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+    response_cache.get_cache().set(_key(user_id), time.time(), timeout=lifetime + 1)
+    _changed.pop(user_id, None)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate(instance.pk)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleted(sender, instance, **kwargs):
+    invalidate(instance.pk)
+
+
+# --- authentication ---
+
+def user_id(token):
+    # simplejwt writes the id claim as a string.
+    return get_user_model()._meta.get_field(api_settings.USER_ID_FIELD).to_python(
+        token[api_settings.USER_ID_CLAIM]
+    )
+
+
+def _load(user_id):
+    try:
+        return get_user_model().objects.get(**{api_settings.USER_ID_FIELD: user_id})
+    except get_user_model().DoesNotExist:
+        raise AuthenticationFailed("User not found", code='user_not_found')
+
+
+class ClaimsUser(SimpleLazyObject):
+    """
+    The user an access token describes. The claims answer id, pk,
+    username and is_staff; any other attribute loads the User.
+    """
+    is_active = True
+    is_anonymous = False
+    is_authenticated = True
+
+    def __init__(self, token):
+        pk = user_id(token)
+        super().__init__(lambda: _load(pk))
+        # Set on the proxy itself; LazyObject forwards other assignments.
+        self.__dict__.update(id=pk, pk=pk, **{claim: token[claim] for claim in CLAIMS})
+
+    def __bool__(self):
+        return True
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if shared() and all(claim in validated_token.payload for claim in CLAIMS):
+            changed = changed_at(user_id(validated_token))
+            if changed is None or validated_token['iat'] > changed:
+                return ClaimsUser(validated_token)
+        return super().get_user(validated_token)
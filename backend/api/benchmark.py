@@ -0,0 +1,106 @@
+# api/benchmark.py
+"""
+Shared helpers for the benchmark commands (seed_benchmark_data,
+run_benchmarks): timing, percentiles and a stable JSON report format, so
+runs can be diffed between commits.
+"""
+import datetime
+import json
+import platform
+import subprocess
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def percentile(sorted_values, q):
+    """
+    Linear-interpolated percentile of an already sorted list (q in 0..100).
+    """
+    if not sorted_values:
+        return None
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    pos = (len(sorted_values) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def summarize(latencies, elapsed=None, queries=None, statuses=None):
+    """
+    Latencies in seconds -> report dict in milliseconds.
+    """
+    values = sorted(latencies)
+    ms = lambda v: None if v is None else round(v * 1000, 3)  # noqa: E731
+    total = elapsed if elapsed is not None else sum(values)
+    report = {
+        'n': len(values),
+        'mean_ms': ms(sum(values) / len(values)) if values else None,
+        'p50_ms': ms(percentile(values, 50)),
+        'p90_ms': ms(percentile(values, 90)),
+        'p95_ms': ms(percentile(values, 95)),
+        'p99_ms': ms(percentile(values, 99)),
+        'max_ms': ms(values[-1]) if values else None,
+        'throughput_rps': round(len(values) / total, 2) if total else None,
+    }
+    if queries:
+        report['queries_mean'] = round(sum(queries) / len(queries), 2)
+        report['queries_max'] = max(queries)
+    if statuses:
+        report['status_codes'] = {str(code): statuses.count(code) for code in sorted(set(statuses))}
+    return report
+
+
+def measure(fn, iterations, warmup=0, count_queries=True):
+    """
+    Call fn(i) `iterations` times and summarise latency, throughput and
+    SQL query counts. fn may return an HTTP response; its status is recorded.
+    """
+    for i in range(warmup):
+        fn(i)
+    latencies, queries, statuses = [], [], []
+    started = time.perf_counter()
+    for i in range(iterations):
+        if count_queries:
+            with CaptureQueriesContext(connection) as captured:
+                t0 = time.perf_counter()
+                result = fn(i)
+                latencies.append(time.perf_counter() - t0)
+            queries.append(len(captured.captured_queries))
+        else:
+            t0 = time.perf_counter()
+            result = fn(i)
+            latencies.append(time.perf_counter() - t0)
+        status = getattr(result, 'status_code', None)
+        if status is not None:
+            statuses.append(status)
+    return summarize(latencies, time.perf_counter() - started, queries, statuses)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'git_revision': git_revision(),
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+
+def dump(report, path=None):
+    text = json.dumps(report, indent=2, sort_keys=True, default=str)
+    if path:
+        with open(path, 'w') as fh:
+            fh.write(text + '\n')
+    return text
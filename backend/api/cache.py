@@ -0,0 +1,168 @@
+# api/cache.py
+"""
+Response cache for the approved-prompt library.
+
+Only the user-independent, rarely changing part of a serialized prompt is
+cached. Vote counters and the per-user fields (`user_vote`,
+`is_bookmarked`) are volatile: after a cache hit they are read for just
+the ids on the page with one indexed query and merged back in, so votes
+and bookmarks never invalidate anything. List pages are cached as their
+links plus (id, updated_at) pairs; the rows are spliced from the
+pre-rendered fragments in api/fragments.py.
+
+Every key contains the current catalog generation (CatalogState), which
+the views bump whenever a prompt is approved, rejected, edited, reverted
+or deleted. Bumping is one UPDATE; old entries simply stop being read and
+age out of the cache.
+
+The backend is whatever Django cache alias settings.PROMPT_CACHE_ALIAS
+points at: local memory, file-based or Redis.
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+
+from .models import CatalogState, Prompt
+
+VOLATILE_FIELDS = ('vote', 'vote_count', 'like_count', 'dislike_count', 'user_vote', 'is_bookmarked')
+
+
+def get_cache():
+    return caches[getattr(settings, 'PROMPT_CACHE_ALIAS', 'default')]
+
+
+def timeout():
+    return getattr(settings, 'PROMPT_CACHE_TIMEOUT', 300)
+
+
+# --- catalog generation ---
+
+def catalog_generation():
+    try:
+        return CatalogState.objects.values_list('generation', flat=True).get(pk=1)
+    except CatalogState.DoesNotExist:
+        CatalogState.objects.get_or_create(pk=1)
+        return 0
+
+
+async def acatalog_generation():
+    try:
+        return await CatalogState.objects.values_list('generation', flat=True).aget(pk=1)
+    except CatalogState.DoesNotExist:
+        await CatalogState.objects.aget_or_create(pk=1)
+        return 0
+
+
+def bump_generation():
+    if not CatalogState.objects.filter(pk=1).update(generation=F('generation') + 1):
+        CatalogState.objects.get_or_create(pk=1, defaults={'generation': 1})
+
+
+# --- hit/miss counters ---
+
+class CacheStats:
+    """
+    Per-process counters, mirrored into the cache backend (when it can
+    increment atomically) so the ratio can be read across workers.
+    """
+    keys = ('hit', 'miss')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.local = dict.fromkeys(self.keys, 0)
+
+    def record(self, kind):
+        with self._lock:
+            self.local[kind] += 1
+        cache = get_cache()
+        key = f'prompts:stats:{kind}'
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 0, timeout=None)
+            cache.incr(key)
+
+    def snapshot(self):
+        cache = get_cache()
+        shared = {kind: cache.get(f'prompts:stats:{kind}', 0) for kind in self.keys}
+        lookups = shared['hit'] + shared['miss']
+        return {
+            'hits': shared['hit'],
+            'misses': shared['miss'],
+            'hit_ratio': round(shared['hit'] / lookups, 4) if lookups else None,
+            'process': dict(self.local),
+            'generation': catalog_generation(),
+        }
+
+
+stats = CacheStats()
+
+
+# --- keys and entries ---
+
+def make_key(kind, generation, request, *parts):
+    query = sorted((k, v) for k, values in request.query_params.lists() for v in values)
+    digest = hashlib.sha1(repr((request.get_host(), parts, query)).encode('utf-8')).hexdigest()
+    return f'prompts:{kind}:{generation}:{digest}'
+
+
+def strip_volatile(row):
+    # Keep the keys (so field order is preserved on merge), drop the values.
+    return {key: (None if key in VOLATILE_FIELDS else value) for key, value in row.items()}
+
+
+def _volatile_queryset(ids, user):
+    annotated = ['annotated_vote_count', 'annotated_like_count', 'annotated_dislike_count']
+    if user is not None and user.is_authenticated:
+        annotated += ['annotated_user_vote', 'annotated_is_bookmarked']
+    return Prompt.objects.filter(pk__in=ids).with_vote_stats(user).values('id', *annotated)
+
+
+def _volatile_row(row):
+    return {
+        'vote': row['annotated_vote_count'],
+        'vote_count': row['annotated_vote_count'],
+        'like_count': row['annotated_like_count'],
+        'dislike_count': row['annotated_dislike_count'],
+        'user_vote': row.get('annotated_user_vote', 0),
+        'is_bookmarked': row.get('annotated_is_bookmarked', False),
+    }
+
+
+def volatile_values(ids, user):
+    """
+    {id: {field: value}} for the volatile fields of the given prompts,
+    computed in a single query.
+    """
+    return {row['id']: _volatile_row(row) for row in _volatile_queryset(ids, user)}
+
+
+async def avolatile_values(ids, user):
+    return {row['id']: _volatile_row(row) async for row in _volatile_queryset(ids, user)}
+
+
+def _merge(rows, live):
+    merged = []
+    for row in rows:
+        if row['id'] not in live:
+            continue
+        row = dict(row)
+        # Only the fields the cached row has: ?fields=/?omit= may have left some out.
+        row.update((key, value) for key, value in live[row['id']].items() if key in row)
+        merged.append(row)
+    return merged
+
+
+def merge(rows, user):
+    """
+    Fill the volatile fields of cached rows for this user. Rows whose prompt
+    no longer exists are dropped.
+    """
+    return _merge(rows, volatile_values([row['id'] for row in rows], user))
+
+
+async def amerge(rows, user):
+    return _merge(rows, await avolatile_values([row['id'] for row in rows], user))
@@ -0,0 +1,53 @@
+# api/conditional.py
+"""
+HTTP conditional GET helpers (ETag / Last-Modified / 304).
+
+Detail and history views compute their validators from a few cheap
+lookups, then call `not_modified()` before doing any serialization. List
+pages hash the page they would send instead, which costs O(page) from
+the response cache. Only history sends Last-Modified: list and detail
+bodies show vote counts, which other users change without moving any
+timestamp. The ETag is a strong validator: a hash of everything
+the response body depends on, including the requesting user's own votes
+and bookmarks.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.sha1(repr(parts).encode('utf-8')).hexdigest())
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    A 304 (or 412) response if the client's validators still match,
+    otherwise None.
+    """
+    return finalize(
+        get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None,
+        ),
+        etag,
+        last_modified,
+    )
+
+
+def finalize(response, etag, last_modified=None):
+    """
+    Attach the validators to a response. Responses depend on who is asking,
+    so shared caches must key on the Authorization header and browsers must
+    revalidate before reuse.
+    """
+    if response is None:
+        return None
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Authorization'])
+    return response
@@ -0,0 +1,109 @@
+# api/counters.py
+"""
+Vote counters for prompts.
+
+A vote toggle changes the counters by a fixed delta computed from the old
+and new vote value, applied with F() expressions, so its cost does not
+depend on how many votes a prompt already has.
+
+Most prompts keep their totals in Prompt.like_count / dislike_count / vote.
+A hot prompt can be switched to N counter shards (PromptVoteShard):
+each vote then updates one randomly chosen shard row, so concurrent voters
+lock different rows instead of queueing on the Prompt row. Reads add the
+shard sums to the Prompt columns (see PromptQuerySet.with_vote_stats).
+Unsharded votes also rewrite Prompt.hot_score in the same UPDATE (see
+api/ranking.py); sharded ones leave it to the periodic refresh, which
+folds the shards back into the Prompt row first.
+"""
+import random
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from . import ranking
+from .models import Prompt, PromptVoteShard
+
+
+def vote_deltas(old, new):
+    """
+    (like, dislike, vote) deltas for a user's vote going from `old` to `new`,
+    where each is 1, -1 or 0 (no vote).
+    """
+    return (
+        int(new == 1) - int(old == 1),
+        int(new == -1) - int(old == -1),
+        new - old,
+    )
+
+
+def apply_vote(prompt_id, old, new, shards=0, created_at=None):
+    """
+    Add the deltas for one vote change to the prompt's counters. Must run in
+    the same transaction as the Vote row change. Pass the prompt's
+    `created_at` to rescore it for ?ordering=hot as well.
+    """
+    likes, dislikes, total = vote_deltas(old, new)
+    if not (likes or dislikes or total):
+        return
+    changes = {
+        'like_count': F('like_count') + likes,
+        'dislike_count': F('dislike_count') + dislikes,
+        'vote': F('vote') + total,
+    }
+    if not shards:
+        if created_at is not None:
+            changes['hot_score'] = ranking.score_expression(F('vote') + total, created_at)
+        Prompt.objects.filter(pk=prompt_id).update(**changes)
+        return
+    shard = random.randrange(shards)
+    if not PromptVoteShard.objects.filter(prompt_id=prompt_id, shard=shard).update(**changes):
+        # The shard set was changed under us (see set_shards); the Prompt row
+        # is always a valid place for the delta.
+        Prompt.objects.filter(pk=prompt_id).update(**changes)
+
+
+def shard_totals(prompt_id):
+    totals = PromptVoteShard.objects.filter(prompt_id=prompt_id).aggregate(
+        like_count=Sum('like_count'), dislike_count=Sum('dislike_count'), vote=Sum('vote'),
+    )
+    return {key: value or 0 for key, value in totals.items()}
+
+
+def _fold(prompt_id, **changes):
+    # Lock the prompt and its shard rows, so no vote lands on a shard while
+    # its totals move to the Prompt row.
+    prompt = Prompt.objects.select_for_update().only('id').get(pk=prompt_id)
+    list(PromptVoteShard.objects.select_for_update().filter(prompt_id=prompt.pk))
+    totals = shard_totals(prompt.pk)
+    Prompt.objects.filter(pk=prompt.pk).update(
+        like_count=F('like_count') + totals['like_count'],
+        dislike_count=F('dislike_count') + totals['dislike_count'],
+        vote=F('vote') + totals['vote'],
+        **changes,
+    )
+    return prompt
+
+
+def set_shards(prompt_id, shards):
+    """
+    Switch a prompt to `shards` counter rows (0 turns sharding off).
+    Existing shard totals are folded back into the Prompt row first, so the
+    visible counts never change.
+    """
+    with transaction.atomic():
+        prompt = _fold(prompt_id, vote_shards=shards)
+        PromptVoteShard.objects.filter(prompt_id=prompt.pk).delete()
+        PromptVoteShard.objects.bulk_create([
+            PromptVoteShard(prompt_id=prompt.pk, shard=i) for i in range(shards)
+        ])
+
+
+def fold_shards(prompt_id):
+    """
+    Move a sharded prompt's shard totals into its Prompt row and zero the
+    shards, keeping them. The visible counts don't change, and the `vote`
+    column catches up for ?ordering=top and hot.
+    """
+    with transaction.atomic():
+        prompt = _fold(prompt_id)
+        PromptVoteShard.objects.filter(prompt_id=prompt.pk).update(like_count=0, dislike_count=0, vote=0)
@@ -0,0 +1,188 @@
+# api/diffs.py
+"""
+Server-side diffs between two PromptVersions.
+
+A diff is computed per body field (description, prompt text, guidance) at
+line or word granularity and returned as compact ops:
+["=", text] unchanged, ["-", text] removed, ["+", text] added.
+
+SequenceMatcher is quadratic in the worst case and runs in the request,
+so the exact diff is bounded by PROMPT_DIFF_MAX_TOKENS: past it a word
+diff is computed at line granularity instead (the result says which), and
+a line diff that is still too large keeps SequenceMatcher's autojunk
+heuristic, which is fast but may report a less minimal diff.
+
+Versions never change once written, so results are memoized in an
+in-process LRU with a TTL, keyed by the version pair and granularity and
+bounded by the results' size (PROMPT_DIFF_CACHE_BYTES), since one diff of
+two large prompts can be megabytes.
+`iter_json()` serializes a result in chunks for a StreamingHttpResponse,
+so a huge diff is never built as one string.
+"""
+import difflib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import versioning
+
+GRANULARITIES = ('line', 'word')
+
+_WORD_RE = re.compile(r'\s+|\w+|[^\w\s]')
+
+# Rough per-entry and per-op bookkeeping, on top of the ops' text.
+ENTRY_OVERHEAD = 200
+OP_OVERHEAD = 8
+
+
+def max_tokens():
+    return getattr(settings, 'PROMPT_DIFF_MAX_TOKENS', 20000)
+
+
+def tokenize(text, granularity):
+    text = text or ''
+    if granularity == 'line':
+        return text.splitlines(keepends=True)
+    return _WORD_RE.findall(text)
+
+
+def diff_text(old, new, granularity='line'):
+    """
+    Ops turning `old` into `new`, with adjacent ops of the same kind merged.
+    """
+    a, b = tokenize(old, granularity), tokenize(new, granularity)
+    autojunk = len(a) + len(b) > max_tokens()
+    ops, insertions, deletions = [], 0, 0
+
+    def emit(kind, tokens):
+        if not tokens:
+            return
+        text = ''.join(tokens)
+        if ops and ops[-1][0] == kind:
+            ops[-1][1] += text
+        else:
+            ops.append([kind, text])
+
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=autojunk).get_opcodes():
+        if tag == 'equal':
+            emit('=', a[i1:i2])
+            continue
+        emit('-', a[i1:i2])
+        emit('+', b[j1:j2])
+        deletions += i2 - i1
+        insertions += j2 - j1
+    return {'stats': {'insertions': insertions, 'deletions': deletions}, 'ops': ops}
+
+
+def diff_versions(old, new, granularity='line'):
+    versioning.prefetch_bodies([old, new])
+    if granularity == 'word' and any(
+        len(tokenize(old.body[field], 'word')) + len(tokenize(new.body[field], 'word')) > max_tokens()
+        for field in versioning.BODY_FIELDS
+    ):
+        granularity = 'line'
+    return {
+        'from': old.pk,
+        'to': new.pk,
+        'granularity': granularity,
+        'fields': OrderedDict(
+            (field, diff_text(old.body[field], new.body[field], granularity))
+            for field in versioning.BODY_FIELDS
+        ),
+    }
+
+
+class TTLCache:
+    """
+    Thread-safe LRU of diff results, evicting the least recently used ones
+    once their total size exceeds `max_bytes`. Entries also expire after
+    `ttl` seconds.
+    """
+
+    def __init__(self, max_bytes, ttl=3600):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cost(result):
+        return ENTRY_OVERHEAD + sum(
+            OP_OVERHEAD + len(text) for entry in result['fields'].values() for _, text in entry['ops']
+        )
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, cost, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                self.size -= cost
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        cost = self.cost(value)
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._data[key] = (time.monotonic() + self.ttl, cost, value)
+            self.size += cost
+            while self.size > self.max_bytes:
+                _, (_, evicted, _) = self._data.popitem(last=False)
+                self.size -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+cache = TTLCache(
+    max_bytes=getattr(settings, 'PROMPT_DIFF_CACHE_BYTES', 32 * 1024 * 1024),
+    ttl=getattr(settings, 'PROMPT_DIFF_CACHE_TTL', 3600),
+)
+
+
+def cached_diff(old, new, granularity='line'):
+    """
+    (result, hit) for the diff between two versions.
+    """
+    key = (old.pk, new.pk, granularity)
+    result = cache.get(key)
+    if result is not None:
+        return result, True
+    result = diff_versions(old, new, granularity)
+    cache.set(key, result)
+    return result, False
+
+
+def iter_json(result, chunk_ops=200):
+    """
+    Yield the JSON encoding of a diff result piece by piece.
+    """
+    yield '{"from":%d,"to":%d,"granularity":%s,"fields":{' % (
+        result['from'], result['to'], json.dumps(result['granularity'])
+    )
+    for i, (field, entry) in enumerate(result['fields'].items()):
+        yield '%s%s:{"stats":%s,"ops":[' % ('' if i == 0 else ',', json.dumps(field), json.dumps(entry['stats']))
+        ops = entry['ops']
+        for start in range(0, len(ops), chunk_ops):
+            chunk = ','.join(json.dumps(op, ensure_ascii=False) for op in ops[start:start + chunk_ops])
+            yield chunk if start == 0 else ',' + chunk
+        yield ']}'
+    yield '}}'
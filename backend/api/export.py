@@ -0,0 +1,231 @@
+# api/export.py
+"""
+Streaming bulk export of the prompt library as NDJSON or CSV.
+
+Prompts are read with `QuerySet.iterator(chunk_size=...)`, a server-side
+cursor on Postgres, and handled one chunk at a time: the versions of the
+prompts in a chunk are fetched with one query and their bodies rebuilt
+together (see api/versioning.py), then the rows are encoded and yielded.
+Nothing holds more than one chunk, so memory use does not grow with the
+library.
+
+Under ASGI the view streams `astream()` instead: the same chunks, each
+read and rebuilt in one `sync_to_async` call and encoded from an async
+generator. A synchronous
+iterator there would be drained into a list before the first byte is
+sent (Django consumes it with `sync_to_async(list)`), buffering the whole
+export.
+
+Both formats carry the same columns. In CSV the version history is a
+JSON-encoded `versions` column.
+"""
+import csv
+import datetime
+import itertools
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from rest_framework.renderers import BaseRenderer
+
+from . import versioning
+from .models import PromptVersion
+
+# (output column, queryset expression)
+PROMPT_COLUMNS = (
+    ('id', 'id'),
+    ('user', 'user_id'),
+    ('user_username', 'user__username'),
+    ('title', 'title'),
+    ('prompt_description', 'prompt_description'),
+    ('prompt_text', 'prompt_text'),
+    ('guidance', 'guidance'),
+    ('task_type', 'task_type'),
+    ('output_format', 'output_format'),
+    ('category', 'category'),
+    ('status', 'status'),
+    ('vote_count', 'annotated_vote_count'),
+    ('like_count', 'annotated_like_count'),
+    ('dislike_count', 'annotated_dislike_count'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+)
+COLUMNS = tuple(name for name, _ in PROMPT_COLUMNS) + ('versions',)
+
+
+def chunk_size():
+    return getattr(settings, 'PROMPT_EXPORT_CHUNK_SIZE', 200)
+
+
+def export_queryset(queryset):
+    """
+    Vote totals plus the export columns of `queryset`, in id order so an
+    export can be resumed or compared.
+    """
+    return (
+        queryset.with_vote_stats()
+        .order_by('id')
+        .values_list(*(expr for _, expr in PROMPT_COLUMNS))
+    )
+
+
+def _versions_by_prompt(prompt_ids):
+    versions = list(
+        PromptVersion.objects.filter(prompt_id__in=prompt_ids)
+        .select_related('content')
+        .annotate(edited_by_username=F('edited_by__username'))
+        .order_by('prompt_id', 'version_created_at', 'id')
+    )
+    versioning.prefetch_bodies(versions)
+    grouped = {}
+    for version in versions:
+        grouped.setdefault(version.prompt_id, []).append({
+            'id': version.pk,
+            'version_created_at': version.version_created_at,
+            'edited_by': version.edited_by_id,
+            'edited_by_username': version.edited_by_username,
+            **{f: getattr(version, f) for f in versioning.META_FIELDS},
+            **version.body,
+        })
+    return grouped
+
+
+def iter_records(queryset, size=None):
+    """
+    Yield one dict per prompt (COLUMNS), with its version history oldest
+    first.
+    """
+    size = size or chunk_size()
+    names = [name for name, _ in PROMPT_COLUMNS]
+    chunk = []
+    for row in export_queryset(queryset).iterator(chunk_size=size):
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield from _records(names, chunk)
+            chunk = []
+    if chunk:
+        yield from _records(names, chunk)
+
+
+async def aiter_records(queryset, size=None):
+    """
+    iter_records() as an async generator.
+    """
+    size = size or chunk_size()
+    names = [name for name, _ in PROMPT_COLUMNS]
+    # Not aiterator(): it runs values_list() queries on the event loop.
+    rows = export_queryset(queryset).iterator(chunk_size=size)
+    next_chunk = sync_to_async(lambda: _records(names, list(itertools.islice(rows, size))))
+    while True:
+        records = await next_chunk()
+        for record in records:
+            yield record
+        if len(records) < size:
+            break
+
+
+def _records(names, rows):
+    versions = _versions_by_prompt([row[0] for row in rows])
+    records = []
+    for row in rows:
+        record = dict(zip(names, row))
+        record['versions'] = versions.get(record['id'], [])
+        records.append(record)
+    return records
+
+
+def _dumps(value):
+    return json.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def _cell(value, encoder=DjangoJSONEncoder()):
+    # Timestamps look the same as in the NDJSON export.
+    if isinstance(value, datetime.datetime):
+        return encoder.default(value)
+    return value
+
+
+def ndjson_line(record):
+    return _dumps(record) + '\n'
+
+
+class _Line:
+    """
+    File-like object whose write() hands back what csv.writer wrote.
+    """
+
+    def write(self, value):
+        return value
+
+
+_csv_writer = csv.writer(_Line())
+
+
+def csv_header():
+    return _csv_writer.writerow(COLUMNS)
+
+
+def csv_line(record):
+    record['versions'] = _dumps(record['versions'])
+    return _csv_writer.writerow([_cell(record[c]) for c in COLUMNS])
+
+
+# format: (header or None, line per record, content type)
+FORMATS = {
+    'ndjson': (None, ndjson_line, 'application/x-ndjson'),
+    'csv': (csv_header, csv_line, 'text/csv; charset=utf-8'),
+}
+
+
+def stream(queryset, fmt):
+    """
+    (chunk iterator, content type) exporting `queryset` in `fmt`.
+    """
+    header, encode, content_type = FORMATS[fmt]
+
+    def chunks():
+        if header is not None:
+            yield header()
+        for record in iter_records(queryset):
+            yield encode(record)
+    return chunks(), content_type
+
+
+def astream(queryset, fmt):
+    """
+    stream() with an async chunk iterator, for ASGI.
+    """
+    header, encode, content_type = FORMATS[fmt]
+
+    async def chunks():
+        if header is not None:
+            yield header()
+        async for record in aiter_records(queryset):
+            yield encode(record)
+    return chunks(), content_type
+
+
+class _ExportRenderer(BaseRenderer):
+    """
+    Lets DRF's content negotiation pick the export format from `?format=`
+    or the Accept header. Exports themselves are streamed by the view;
+    these only render error bodies, as JSON.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data).encode('utf-8')
+
+
+class NDJSONRenderer(_ExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class CSVRenderer(_ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
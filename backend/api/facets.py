@@ -0,0 +1,163 @@
+# api/facets.py
+"""
+Facet counts behind GET /api/prompts/facets/: how many prompts have each
+category, task type, output format and status.
+
+PromptFacetCount holds one row per combination of the four, with its
+number of prompts. The views move a prompt's count whenever they create,
+save or delete it, and bulk moderation and imports adjust whole batches
+at once. A change to an existing prompt runs inside `locked()`, which
+holds its row lock and re-reads the values it is stored with, so two
+requests changing the same prompt at once (say, two moderators approving
+it) move its count once. Without a search,
+counts are read from the rollup: one row per combination in use, however
+many prompts share it. A search has to group the matching prompts instead, in one
+query.
+
+A facet's counts apply the other facets' filters but not its own, so the
+filter bar can show what picking another value would give.
+`manage.py rebuild_facet_counts` recomputes the rollup from scratch, for
+instance after edits made outside the API.
+"""
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.http import Http404
+
+from .models import FACET_FIELDS, Prompt, PromptFacetCount
+
+
+def key(prompt):
+    return tuple(getattr(prompt, name) for name in FACET_FIELDS)
+
+
+def _lookup(combination):
+    return dict(zip(FACET_FIELDS, combination))
+
+
+# --- maintaining the rollup ---
+
+def adjust(deltas):
+    """
+    Add {combination: delta} to the rollup.
+    """
+    deltas = {combination: n for combination, n in deltas.items() if n}
+    if not deltas:
+        return
+    with transaction.atomic(savepoint=False):
+        PromptFacetCount.objects.bulk_create(
+            [PromptFacetCount(count=0, **_lookup(combination)) for combination in deltas],
+            ignore_conflicts=True,
+        )
+        for combination, n in deltas.items():
+            PromptFacetCount.objects.filter(**_lookup(combination)).update(count=F('count') + n)
+
+
+@contextmanager
+def locked(prompt):
+    """
+    A transaction holding `prompt`'s row lock, with its facet fields and
+    stored values reloaded from the row. Change, save or delete the
+    prompt inside it.
+    """
+    with transaction.atomic():
+        stored = Prompt.objects.select_for_update().filter(pk=prompt.pk).values_list(*FACET_FIELDS).first()
+        if stored is None:
+            raise Http404('No Prompt matches the given query.')
+        for name, value in zip(FACET_FIELDS, stored):
+            setattr(prompt, name, value)
+        prompt._stored_facets = stored
+        yield prompt
+
+
+def saved(prompt):
+    """
+    Count `prompt` under its current values instead of the ones it was
+    loaded with (none, for a new prompt).
+    """
+    before = getattr(prompt, '_stored_facets', None)
+    after = key(prompt)
+    if before != after:
+        deltas = Counter({after: 1})
+        if before is not None:
+            deltas[before] -= 1
+        adjust(deltas)
+    prompt._stored_facets = after
+
+
+def deleted(prompt):
+    adjust({getattr(prompt, '_stored_facets', None) or key(prompt): -1})
+
+
+def status_changed(combinations, status):
+    """
+    Move one prompt per stored combination to `status` (None: deleted).
+    """
+    index = FACET_FIELDS.index('status')
+    deltas = Counter()
+    for combination in combinations:
+        deltas[combination] -= 1
+        if status is not None:
+            deltas[combination[:index] + (status,) + combination[index + 1:]] += 1
+    adjust(deltas)
+
+
+def added(prompts):
+    adjust(Counter(key(prompt) for prompt in prompts))
+
+
+def rebuild():
+    with transaction.atomic():
+        PromptFacetCount.objects.all().delete()
+        PromptFacetCount.objects.bulk_create(
+            PromptFacetCount(count=n, **_lookup(combination))
+            for combination, n in combinations(Prompt.objects.all())
+        )
+
+
+# --- reading counts ---
+
+def combinations(queryset):
+    """
+    (combination, number of prompts) for `queryset`, from one grouped query.
+    """
+    rows = queryset.order_by().values_list(*FACET_FIELDS).annotate(n=Count('id'))
+    return [(row[:-1], row[-1]) for row in rows]
+
+
+def rollup(statuses=None):
+    """
+    (combination, number of prompts) from the rollup, optionally only for
+    some statuses.
+    """
+    rows = PromptFacetCount.objects.filter(count__gt=0)
+    if statuses is not None:
+        rows = rows.filter(status__in=statuses)
+    return [(row[:-1], row[-1]) for row in rows.values_list(*FACET_FIELDS, 'count')]
+
+
+def counts(combinations, selected):
+    """
+    {'total': n, facet: {value: count}} for the given combinations, where
+    `selected` maps facets to the values they are filtered on. `total`
+    matches every filter; each facet's counts match all but its own.
+    Values are ordered by count, highest first.
+    """
+    tallies = {name: Counter() for name in FACET_FIELDS}
+    total = 0
+    for combination, n in combinations:
+        mismatched = [
+            name for name, value in zip(FACET_FIELDS, combination)
+            if name in selected and value not in selected[name]
+        ]
+        if not mismatched:
+            total += n
+        for name, value in zip(FACET_FIELDS, combination):
+            if not mismatched or mismatched == [name]:
+                tallies[name][value] += n
+    result = {'total': total}
+    for name, tally in tallies.items():
+        result[name] = dict(sorted(tally.items(), key=lambda item: (-item[1], item[0])))
+    return result
@@ -0,0 +1,123 @@
+# api/fastpath.py
+"""
+Fast path for prompt listings: rows as `values_list()` tuples instead of
+model instances, turned into dicts by functions compiled once per
+fieldset instead of DRF's per-field to_representation calls.
+
+For every readable serializer field, `CompiledRows` picks a column and a
+conversion:
+- Model fields fetch their column. For fields whose to_representation
+  returns the database value unchanged (char/choice/integer/boolean/JSON,
+  primary keys, ReadOnlyField), the value is used as is. Others (dates)
+  keep calling the bound field's to_representation.
+- Dotted sources such as `user.username` become a join (`user__username`)
+  instead of an attribute traversal per row.
+- The vote and bookmark method fields read the with_vote_stats()
+  annotation their getter would have returned.
+
+A field it can't map raises `Unsupported`, and the view falls back to the
+serializer, so the output is always what PromptSerializer renders.
+Opt in with PROMPT_LIST_FAST_PATH.
+"""
+from django.conf import settings
+from rest_framework import relations
+from rest_framework import serializers
+
+# PromptSerializer's method fields and the annotation each getter returns.
+ANNOTATED_FIELDS = {
+    'vote': 'annotated_vote_count',
+    'vote_count': 'annotated_vote_count',
+    'like_count': 'annotated_like_count',
+    'dislike_count': 'annotated_dislike_count',
+    'user_vote': 'annotated_user_vote',
+    'is_bookmarked': 'annotated_is_bookmarked',
+}
+
+# Fields whose to_representation() of a database value is that value.
+PASSTHROUGH_FIELDS = (
+    serializers.CharField, serializers.ChoiceField, serializers.IntegerField,
+    serializers.BooleanField, serializers.ReadOnlyField, relations.PrimaryKeyRelatedField,
+)
+
+
+def enabled():
+    return getattr(settings, 'PROMPT_LIST_FAST_PATH', False)
+
+
+class Unsupported(Exception):
+    pass
+
+
+class CompiledRows:
+    """
+    Columns and row functions for the readable fields of `serializer`,
+    reading a queryset that has the given annotations.
+    """
+
+    def __init__(self, serializer, annotations):
+        self.model = serializer.Meta.model
+        self.columns = []
+        self._plan = {}
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            column, convert = self._resolve(field, annotations)
+            self._plan[field.field_name] = (self._index(column), convert)
+        # Rows are keyed and paginated on these.
+        for column in ('id', 'updated_at'):
+            self._index(column)
+
+    def _index(self, column):
+        if column not in self.columns:
+            self.columns.append(column)
+        return self.columns.index(column)
+
+    def _resolve(self, field, annotations):
+        """
+        (column, converter or None for passthrough) for one field.
+        """
+        name = field.field_name
+        if isinstance(field, serializers.SerializerMethodField):
+            annotation = ANNOTATED_FIELDS.get(name)
+            if annotation is None or annotation not in annotations:
+                raise Unsupported(name)
+            return annotation, None
+        if field.source == '*':
+            raise Unsupported(name)
+        if isinstance(field, relations.RelatedField):
+            if not isinstance(field, relations.PrimaryKeyRelatedField) or field.pk_field is not None \
+                    or len(field.source_attrs) != 1:
+                raise Unsupported(name)
+            return self.model._meta.get_field(field.source).attname, None
+        column = '__'.join(field.source_attrs)
+        if isinstance(field, PASSTHROUGH_FIELDS) and not isinstance(field, serializers.MultipleChoiceField):
+            return column, None
+        if isinstance(field, serializers.JSONField) and not field.binary:
+            return column, None
+        return column, field.to_representation
+
+    def values(self, queryset, extra=()):
+        """
+        `queryset` as named rows with our columns, plus `extra` ones (the
+        pagination ordering) after them.
+        """
+        extra = [column for column in extra if column not in self.columns]
+        return queryset.values_list(*self.columns, *extra, named=True)
+
+    def function(self, fields):
+        """
+        row -> {name: value} for `fields`, in order, as one generated
+        function: a dict display with an index (and maybe a converter
+        call) per field.
+        """
+        namespace, items = {}, []
+        for field in fields:
+            index, convert = self._plan[field.field_name]
+            value = f'r[{index}]'
+            if convert is not None:
+                namespace[f'c{index}'] = convert
+                value = f'(None if r[{index}] is None else c{index}(r[{index}]))'
+            items.append(f'{field.field_name!r}: {value}')
+        source = f"def row(r):\n    return {{{', '.join(items)}}}\n"
+        exec(compile(source, f'<{self.model.__name__} row>', 'exec'), namespace)
+        return namespace['row']
@@ -0,0 +1,346 @@
+# api/fragments.py
+"""
+Pre-rendered JSON fragments of prompt list rows.
+
+A prompt's row has static fields, which come from the prompt itself, and
+volatile ones (`cache.VOLATILE_FIELDS`: vote counters, `user_vote` and
+`is_bookmarked`). The static fields only change when the prompt is saved,
+which moves its `updated_at`. So their rendered JSON is stored under
+(id, updated_at, fieldset) and can never be stale: an edit simply makes
+new keys. `user_username` counts as static too: renaming a user (in the
+Django admin) moves the `updated_at` of their prompts and bumps the
+catalog generation, see `user_renamed()`.
+
+A list response is then spliced together from bytes: each row's cached
+fragment plus its few volatile fields, with no DRF field machinery for
+the static part. The output is what JSONRenderer would produce for
+PromptListSerializer / PromptSerializer, field order included.
+
+Fragments live in an in-process LRU bounded by total encoded size
+(PROMPT_FRAGMENT_CACHE_BYTES). When PROMPT_FRAGMENT_CACHE_ALIAS names a
+shared cache, it is also a second level behind the LRU: a worker pulls
+what another worker (or `manage.py warm_prompt_fragments`) has already
+rendered with one get_many per page.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework import renderers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+
+from . import cache as response_cache
+from .cache import VOLATILE_FIELDS
+from .models import Prompt
+
+# Rough per-entry cost of the key, tuple and dict slot, added to the
+# encoded size when bounding the LRU.
+ENTRY_OVERHEAD = 200
+
+_json = renderers.JSONRenderer()
+
+
+def encode(value):
+    """
+    `value` as JSONRenderer renders it (which would give b'' for None).
+    """
+    return b'null' if value is None else _json.render(value)
+
+
+def _members(values):
+    # '"a":1,"b":2' for {'a': 1, 'b': 2}.
+    return encode(values)[1:-1] if values else b''
+
+
+class FragmentCache:
+    """
+    Thread-safe LRU of fragments, evicting the least recently used ones
+    once their total size exceeds `max_bytes`.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cost(fragment):
+        return ENTRY_OVERHEAD + sum(len(part) for part in fragment)
+
+    def get(self, key):
+        with self._lock:
+            fragment = self._data.get(key)
+            if fragment is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._data.move_to_end(key)
+            return fragment
+
+    def set(self, key, fragment):
+        cost = self.cost(fragment)
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= self.cost(old)
+            self._data[key] = fragment
+            self.size += cost
+            while self.size > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.size -= self.cost(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+cache = FragmentCache(getattr(settings, 'PROMPT_FRAGMENT_CACHE_BYTES', 64 * 1024 * 1024))
+
+
+def shared_cache():
+    alias = getattr(settings, 'PROMPT_FRAGMENT_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def shared_timeout():
+    return getattr(settings, 'PROMPT_FRAGMENT_CACHE_TIMEOUT', 86400)
+
+
+class RowRenderer:
+    """
+    Renders rows for the fields of one (non-many) prompt serializer, which
+    carries the request for `user_vote` / `is_bookmarked` and may have
+    been narrowed by ?fields= / ?omit=. Rows are prompt instances, or
+    named values_list() rows when given `compiled` (api/fastpath.py).
+
+    The fields form alternating runs of static and volatile ones. A
+    fragment is a tuple with the encoded members of each static run.
+    """
+
+    def __init__(self, serializer, compiled=None):
+        self.runs = []
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            static = field.field_name not in VOLATILE_FIELDS
+            if not self.runs or self.runs[-1][0] != static:
+                self.runs.append((static, []))
+            self.runs[-1][1].append(field)
+        self.static_fields = [f for static, fields in self.runs if static for f in fields]
+        self.volatile_fields = [f for static, fields in self.runs if not static for f in fields]
+        names = ','.join(f.field_name for f in self.static_fields)
+        self.fieldset = hashlib.sha1(names.encode('utf-8')).hexdigest()[:12]
+        self.compiled = compiled
+        if compiled is not None:
+            self._static = compiled.function(self.static_fields)
+            self._volatile = compiled.function(self.volatile_fields)
+        else:
+            self._static = lambda instance: self._values(self.static_fields, instance)
+            self._volatile = lambda instance: self._values(self.volatile_fields, instance)
+
+    def key(self, pk, updated_at):
+        return f'prompts:fragment:{pk}:{updated_at.isoformat()}:{self.fieldset}'
+
+    def key_for(self, instance):
+        return self.key(instance.id, instance.updated_at)
+
+    @staticmethod
+    def _values(fields, instance):
+        # Serializer.to_representation for just these fields.
+        values = {}
+        for field in fields:
+            try:
+                attribute = field.get_attribute(instance)
+            except SkipField:
+                continue
+            check = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+            values[field.field_name] = None if check is None else field.to_representation(attribute)
+        return values
+
+    def render(self, instance):
+        """
+        The fragment of `instance`'s static fields.
+        """
+        values = self._static(instance)
+        return tuple(
+            _members({f.field_name: values[f.field_name] for f in fields if f.field_name in values})
+            for static, fields in self.runs if static
+        )
+
+    def volatile(self, instance):
+        return self._volatile(instance)
+
+    def row(self, fragment, volatile):
+        """
+        One encoded row: the fragment's runs with the volatile values
+        (a dict by field name) spliced in between.
+        """
+        parts, static_runs = [], iter(fragment)
+        for static, fields in self.runs:
+            if static:
+                part = next(static_runs)
+            else:
+                part = _members({f.field_name: volatile[f.field_name] for f in fields if f.field_name in volatile})
+            if part:
+                parts.append(part)
+        return b'{' + b','.join(parts) + b'}'
+
+    # --- lookups ---
+
+    def _local(self, keys):
+        found = {}
+        for key in keys:
+            fragment = cache.get(key)
+            if fragment is not None:
+                found[key] = fragment
+        return found
+
+    def _remember(self, fragments):
+        for key, fragment in fragments.items():
+            cache.set(key, fragment)
+
+    def lookup(self, keys):
+        """
+        {key: fragment} for the keys found in the LRU or the shared cache.
+        """
+        found = self._local(keys)
+        shared = shared_cache()
+        missing = [key for key in keys if key not in found]
+        if shared is not None and missing:
+            pulled = shared.get_many(missing)
+            self._remember(pulled)
+            found.update(pulled)
+        return found
+
+    async def alookup(self, keys):
+        found = self._local(keys)
+        shared = shared_cache()
+        missing = [key for key in keys if key not in found]
+        if shared is not None and missing:
+            pulled = await shared.aget_many(missing)
+            self._remember(pulled)
+            found.update(pulled)
+        return found
+
+    def store(self, fragments):
+        self._remember(fragments)
+        shared = shared_cache()
+        if shared is not None and fragments:
+            shared.set_many(fragments, shared_timeout())
+
+    async def astore(self, fragments):
+        self._remember(fragments)
+        shared = shared_cache()
+        if shared is not None and fragments:
+            await shared.aset_many(fragments, shared_timeout())
+
+    def _fill(self, instances, keys, found):
+        rendered = {}
+        for instance, key in zip(instances, keys):
+            if key not in found:
+                rendered[key] = found[key] = self.render(instance)
+        return rendered
+
+    def fragments(self, instances):
+        """
+        The fragments of `instances`, in order, rendering and storing the
+        ones not cached yet.
+        """
+        keys = [self.key_for(i) for i in instances]
+        found = self.lookup(keys)
+        self.store(self._fill(instances, keys, found))
+        return [found[key] for key in keys]
+
+    async def afragments(self, instances):
+        keys = [self.key_for(i) for i in instances]
+        found = await self.alookup(keys)
+        await self.astore(self._fill(instances, keys, found))
+        return [found[key] for key in keys]
+
+    async def arows(self, instances):
+        """
+        Encoded rows for annotated prompt instances (with_vote_stats()).
+        """
+        fragments = await self.afragments(instances)
+        return [self.row(fragment, self.volatile(i)) for fragment, i in zip(fragments, instances)]
+
+
+# --- renames ---
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def user_renaming(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (update_fields is not None and 'username' not in update_fields):
+        return
+    old = sender._default_manager.filter(pk=instance.pk).values_list('username', flat=True).first()
+    instance._fragments_renamed = old is not None and old != instance.username
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_renamed(sender, instance, **kwargs):
+    """
+    Give the renamed user's prompts new fragment keys, and drop cached
+    pages and details that show the old name.
+    """
+    if not instance.__dict__.pop('_fragments_renamed', False):
+        return
+    Prompt.objects.filter(user_id=instance.pk).update(updated_at=timezone.now())
+    response_cache.bump_generation()
+
+
+class SplicedPage(Mapping):
+    """
+    A page of pre-encoded rows, as `Response` data. JSONRenderer below
+    writes it out as {"next", "previous", "results"} without re-encoding
+    the rows. Read as a mapping (tests, the browsable API), it decodes
+    itself.
+    """
+
+    def __init__(self, next_link, previous_link, rows):
+        self.next = next_link
+        self.previous = previous_link
+        self.rows = rows
+        self._decoded = None
+
+    def encode(self):
+        return b''.join((
+            b'{"next":', encode(self.next),
+            b',"previous":', encode(self.previous),
+            b',"results":[', b','.join(self.rows), b']}',
+        ))
+
+    def _data(self):
+        if self._decoded is None:
+            self._decoded = json.loads(self.encode())
+        return self._decoded
+
+    def __getitem__(self, key):
+        return self._data()[key]
+
+    def __iter__(self):
+        return iter(self._data())
+
+    def __len__(self):
+        return len(self._data())
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, SplicedPage):
+            return data.encode()
+        return super().render(data, accepted_media_type, renderer_context)
@@ -0,0 +1,162 @@
+# api/hashing.py
+"""
+Password hashing off the request thread.
+
+Registering (UserSerializer.create) and logging in (PooledModelBackend,
+behind /api/token/) hash with PBKDF2, hundreds of milliseconds of CPU
+each. Both run in a small process pool instead of the web worker:
+PROMPT_HASH_WORKERS processes per web worker, so a burst of sign-ups
+uses at most that many cores and the GIL stays free for the read
+endpoints. PROMPT_HASH_NICE can lower the pool's CPU priority, but
+defaults to 0: niced hashes on a busy host queue behind everything else,
+time out, and turn registrations and logins into 503s.
+
+The request thread still waits for its hash (future.result); the pool
+moves the CPU work, not the wait. What bounds the wait is admission
+control: at most PROMPT_HASH_MAX_PENDING hashes may be running or queued
+per web worker, so keep it below the worker's thread count to leave
+threads for everything else. Past that, or when a hash takes longer than
+PROMPT_HASH_TIMEOUT, the request fails at once with 503 and a Retry-After
+header rather than waiting in line. PROMPT_HASH_WORKERS = 0 hashes
+inline, as Django does.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth import hashers
+from django.contrib.auth.backends import ModelBackend
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+def workers():
+    return getattr(settings, 'PROMPT_HASH_WORKERS', 2)
+
+
+def max_pending():
+    return getattr(settings, 'PROMPT_HASH_MAX_PENDING', 4)
+
+
+def timeout():
+    return getattr(settings, 'PROMPT_HASH_TIMEOUT', 10)
+
+
+def retry_after():
+    return getattr(settings, 'PROMPT_HASH_RETRY_AFTER', 1)
+
+
+class Overloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many sign-ins right now, please try again shortly.'
+    default_code = 'auth_overloaded'
+
+    def __init__(self):
+        super().__init__()
+        # DRF's exception handler turns this into a Retry-After header.
+        self.wait = retry_after()
+
+
+def _init_worker(niceness):
+    if niceness:
+        os.nice(niceness)
+    if not apps.ready:
+        # Spawned rather than forked: load settings for the hashers.
+        django.setup()
+
+
+def _verify(password, encoded):
+    """
+    (is the password right, its new hash if it must be upgraded).
+    """
+    correct, must_update = hashers.verify_password(password, encoded)
+    return correct, hashers.make_password(password) if correct and must_update else None
+
+
+class HashPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self.pending = 0
+
+    def _get_executor(self):
+        # A pool started before a fork belongs to the parent.
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers(), initializer=_init_worker,
+                initargs=(getattr(settings, 'PROMPT_HASH_NICE', 0),),
+            )
+            self._pid = os.getpid()
+        return self._executor
+
+    def _done(self, future):
+        with self._lock:
+            self.pending -= 1
+
+    def run(self, fn, *args):
+        if not workers():
+            return fn(*args)
+        with self._lock:
+            if self.pending >= max_pending():
+                raise Overloaded()
+            executor = self._get_executor()
+            try:
+                future = executor.submit(fn, *args)
+            except BrokenProcessPool:
+                self._executor = None
+                raise Overloaded()
+            self.pending += 1
+        future.add_done_callback(self._done)
+        try:
+            return future.result(timeout=timeout())
+        except TimeoutError:
+            raise Overloaded()
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            raise Overloaded()
+
+
+pool = HashPool()
+
+
+def make_password(password):
+    return pool.run(hashers.make_password, password)
+
+
+def verify(password, encoded):
+    return pool.run(_verify, password, encoded)
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    ModelBackend with the password check (and any hash upgrade) done in
+    the pool.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway, so unknown usernames take as long (Django #20760).
+            make_password(password)
+            return None
+        correct, upgraded = verify(password, user.password)
+        if upgraded:
+            user.password = upgraded
+            user.save(update_fields=['password'])
+        if correct and self.user_can_authenticate(user):
+            return user
+        return None
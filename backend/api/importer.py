@@ -0,0 +1,228 @@
+# api/importer.py
+"""
+Bulk import of prompts from JSONL, shared by `manage.py import_prompts`
+and POST /api/prompts/import/.
+
+Each line is one JSON object with PromptSerializer's writable fields
+(title, prompt_text, task_type, ...). `field_map` renames source keys and
+`defaults` fills fields a collection lacks. Lines are read in batches.
+Each record is checked with PromptSerializer's rules, and the valid ones
+are written in one go:
+- Postgres (psycopg2) gets a COPY into api_prompt, with ids taken from
+  its sequence up front.
+- Other databases get bulk_create.
+The MinHash signatures and facet counts of a batch are stored with it,
+so later prompts are checked against the imported ones. Cached listings and the
+related-prompts index are updated once, by `finish()`.
+
+A bad record never aborts its batch: it is reported as
+{'line': n, 'errors': {...}} and skipped. If the database rejects a
+batch, its rows are retried one by one to find the culprits. Every batch
+commits on its own. `offset` (lines consumed) after each batch is a
+checkpoint: passing it back as `start` resumes where the import stopped.
+"""
+import io
+import json
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.parsers import BaseParser
+
+from . import cache as response_cache
+from . import facets
+from . import minhash
+from . import ranking
+from . import related as related_index
+from .models import Prompt
+from .serializers import PromptSerializer
+
+# Columns written by the COPY fast path, in order: every api_prompt column
+# but search_vector, which the trigger fills. COPY skips field defaults.
+COPY_COLUMNS = (
+    'id', 'user_id', 'title', 'prompt_description', 'prompt_text', 'guidance',
+    'task_type', 'output_format', 'category', 'status', 'vote', 'like_count',
+    'dislike_count', 'vote_shards', 'hot_score', 'created_at', 'updated_at', 'possible_duplicates',
+)
+
+# The admin endpoint lists at most this many rejected rows.
+MAX_REPORTED_ERRORS = 1000
+
+
+def default_batch_size():
+    return getattr(settings, 'PROMPT_IMPORT_BATCH_SIZE', 1000)
+
+
+@dataclass
+class BatchResult:
+    offset: int
+    imported: int = 0
+    errors: list = field(default_factory=list)
+
+
+class JSONLinesParser(BaseParser):
+    """
+    Raw JSONL request bodies, handed to the view as lines read lazily
+    from the request stream instead of one big string.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return decode_lines(stream or ())
+
+
+def decode_lines(lines):
+    return (line.decode('utf-8', errors='replace') for line in lines)
+
+
+def _copy_value(value):
+    # COPY's text format: \N is NULL; backslash, tab and newlines are escaped.
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if not isinstance(value, str):
+        value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class PromptImporter:
+    def __init__(self, user, status='approved', batch_size=None, field_map=None, defaults=None, use_copy=None):
+        self.user = user
+        self.status = status
+        self.batch_size = batch_size or default_batch_size()
+        self.field_map = field_map or {}
+        self.defaults = defaults or {}
+        if use_copy is None:
+            use_copy = getattr(settings, 'PROMPT_IMPORT_USE_COPY', True)
+        self.use_copy = use_copy and connection.vendor == 'postgresql'
+        self.serializer = PromptSerializer()
+        self.imported = 0
+        # Term-frequency rows of imported approved prompts, merged into the
+        # related-prompts index by finish().
+        self.related_parts = []
+
+    # --- reading and validation ---
+
+    def _record(self, text):
+        record = json.loads(text)
+        if not isinstance(record, dict):
+            raise serializers.ValidationError({'non_field_errors': ['Each line must be a JSON object.']})
+        data = dict(self.defaults)
+        for key, value in record.items():
+            data[self.field_map.get(key, key)] = value
+        return data
+
+    def _validate(self, number, text):
+        """
+        (Prompt, None) for a valid line, (None, error dict) otherwise.
+        """
+        try:
+            values = self.serializer.run_validation(self._record(text))
+        except ValueError as exc:
+            return None, {'line': number, 'errors': {'non_field_errors': [f'Invalid JSON: {exc}']}}
+        except serializers.ValidationError as exc:
+            return None, {'line': number, 'errors': exc.detail}
+        return Prompt(user=self.user, status=self.status, **values), None
+
+    def batches(self, lines, start=0):
+        """
+        Import `lines` from line offset `start`, yielding a BatchResult after
+        each committed batch.
+        """
+        offset = flushed = start
+        pending, errors = [], []
+        for offset, text in enumerate(lines, 1):
+            if offset <= start or not text.strip():
+                continue
+            prompt, error = self._validate(offset, text)
+            if error is not None:
+                errors.append(error)
+            else:
+                pending.append((offset, prompt))
+            if len(pending) + len(errors) >= self.batch_size:
+                yield self._write(offset, pending, errors)
+                pending, errors, flushed = [], [], offset
+        if offset > flushed:
+            yield self._write(offset, pending, errors)
+
+    # --- writing ---
+
+    def _write(self, offset, pending, errors):
+        result = BatchResult(offset=offset, errors=errors)
+        prompts = [prompt for _, prompt in pending]
+        try:
+            with transaction.atomic():
+                self._insert(prompts)
+                self._index(prompts)
+            written = prompts
+        except DatabaseError:
+            written = []
+            for number, prompt in pending:
+                try:
+                    with transaction.atomic():
+                        prompt.pk = None
+                        Prompt.objects.bulk_create([prompt])
+                        self._index([prompt])
+                    written.append(prompt)
+                except DatabaseError as exc:
+                    result.errors.append({'line': number, 'errors': {'non_field_errors': [str(exc)]}})
+            result.errors.sort(key=lambda e: e['line'])
+        result.imported = len(written)
+        self.imported += len(written)
+        approved = [(p.pk, p.title, p.prompt_description, p.prompt_text) for p in written if p.status == 'approved']
+        if approved:
+            self.related_parts.append(related_index.RelatedIndex.build(approved))
+        return result
+
+    def _insert(self, prompts):
+        if not prompts:
+            return
+        if self.use_copy:
+            with connection.cursor() as cursor:
+                if hasattr(cursor.cursor, 'copy_expert'):
+                    self._copy(cursor, prompts)
+                    return
+        Prompt.objects.bulk_create(prompts, batch_size=self.batch_size)
+
+    def _copy(self, cursor, prompts):
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence('api_prompt', 'id')) FROM generate_series(1, %s)",
+            [len(prompts)],
+        )
+        now = timezone.now()
+        buffer = io.StringIO()
+        for prompt, (pk,) in zip(prompts, cursor.fetchall()):
+            prompt.pk = pk
+            prompt.created_at = prompt.updated_at = now
+            prompt.hot_score = ranking.score(prompt.vote, now, now)
+            row = [getattr(prompt, column) for column in COPY_COLUMNS]
+            row[-1] = json.dumps(row[-1])
+            buffer.write('\t'.join(_copy_value(value) for value in row))
+            buffer.write('\n')
+        buffer.seek(0)
+        # The raw psycopg2 cursor bypasses Django's error translation; without
+        # it a rejected row would raise psycopg2.Error, not DatabaseError, and
+        # abort the import instead of being retried row by row.
+        with connection.wrap_database_errors:
+            cursor.cursor.copy_expert(f"COPY api_prompt ({', '.join(COPY_COLUMNS)}) FROM STDIN", buffer)
+
+    def _index(self, prompts):
+        minhash.store_signatures(minhash.signatures_for(
+            [(p.pk, p.title, p.prompt_description, p.prompt_text) for p in prompts]
+        ))
+        facets.added(prompts)
+
+    def finish(self):
+        """
+        Make the imported prompts visible: new cache generation and the
+        approved ones added to the related-prompts index.
+        """
+        if not self.imported:
+            return
+        response_cache.bump_generation()
+        if self.related_parts:
+            related_index.merge_parts(self.related_parts)
+            self.related_parts = []
@@ -0,0 +1,174 @@
+import http.client
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import benchmark
+from api.management.commands.benchmark_servers import free_port, wait_for_port
+
+# Hashing configurations to compare: where PBKDF2 runs during the storm.
+MODES = {
+    'inline': lambda opts: {'PROMPT_HASH_WORKERS': '0'},
+    'pool': lambda opts: {
+        'PROMPT_HASH_WORKERS': str(opts['hash_workers']),
+        'PROMPT_HASH_MAX_PENDING': str(opts['max_pending']),
+        'PROMPT_HASH_NICE': str(opts['nice']),
+    },
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Browse latency while a registration storm hashes passwords: starts gunicorn with "
+        "hashing inline and in the worker pool (api/hashing.py), measures GET /api/prompts/ "
+        "alone and next to N clients registering back to back (honouring Retry-After), and "
+        "prints a JSON report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='*', choices=sorted(MODES), default=['inline', 'pool'])
+        parser.add_argument('--browsers', type=int, default=8, help="Concurrent browsing connections.")
+        parser.add_argument('--registrations', type=int, default=16,
+                            help="Concurrent connections registering new users.")
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds per measurement.")
+        parser.add_argument('--warmup', type=float, default=3.0)
+        parser.add_argument('--workers', type=int, default=2, help="gunicorn worker processes.")
+        parser.add_argument('--threads', type=int, default=8, help="Threads per gunicorn worker.")
+        parser.add_argument('--hash-workers', type=int, default=1, help="Hashing processes per web worker.")
+        parser.add_argument('--max-pending', type=int, default=4,
+                            help="Hashes running or queued per web worker before answering 503.")
+        parser.add_argument('--nice', type=int, default=0, help="Nice level of the hashing processes.")
+        parser.add_argument('--user', help="Username to browse as (default: first bench_user_*).")
+        parser.add_argument('--output', help="Write the JSON report to this file as well.")
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(username=options['user'])
+        else:
+            users = users.filter(username__startswith='bench_user_').order_by('id')
+        user = users.first()
+        if user is None:
+            raise CommandError("No user to browse as; run seed_benchmark_data or pass --user.")
+        token = str(AccessToken.for_user(user))
+        prefix = f'storm{int(time.time())}'
+
+        results = {}
+        try:
+            for mode in options['modes']:
+                results[mode] = self.run_mode(mode, token, f'{prefix}_{mode}', options)
+        finally:
+            User.objects.filter(username__startswith=prefix).delete()
+
+        report = {
+            'environment': benchmark.environment(),
+            'options': {k: options[k] for k in (
+                'browsers', 'registrations', 'duration', 'warmup', 'workers', 'threads', 'hash_workers',
+                'max_pending', 'nice',
+            )},
+            'results': results,
+        }
+        self.stdout.write(benchmark.dump(report, options['output']))
+
+    def run_mode(self, mode, token, prefix, options):
+        port = free_port()
+        env = dict(os.environ, **MODES[mode](options))
+        process = subprocess.Popen([
+            sys.executable, '-m', 'gunicorn', 'prompt_library.wsgi:application',
+            '--bind', f'127.0.0.1:{port}', '--workers', str(options['workers']),
+            '--threads', str(options['threads']), '--log-level', 'warning',
+        ], cwd=settings.BASE_DIR, env=env)
+        try:
+            wait_for_port(port)
+            browse = self.browse_request(token)
+            self.drive(port, {'browse': (browse, options['browsers'])}, options['warmup'])
+            idle = self.drive(port, {'browse': (browse, options['browsers'])}, options['duration'])
+            storm = self.drive(port, {
+                'browse': (browse, options['browsers']),
+                'register': (self.register_request(prefix), options['registrations']),
+            }, options['duration'])
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        result = {'browse_idle': idle['browse'], 'browse_storm': storm['browse'], 'register': storm['register']}
+        self.stdout.write(
+            f"  {mode}: browse p99 {idle['browse']['p99_ms']}ms idle, {storm['browse']['p99_ms']}ms in storm; "
+            f"register {storm['register']['status_codes']}"
+        )
+        return result
+
+    def browse_request(self, token):
+        headers = {'Authorization': f'Bearer {token}', 'Host': '127.0.0.1'}
+        return lambda i: ('GET', '/api/prompts/', None, headers)
+
+    def register_request(self, prefix):
+        headers = {'Content-Type': 'application/json', 'Host': '127.0.0.1'}
+        counter = itertools.count()
+
+        def request(i):
+            body = json.dumps({'username': f'{prefix}_{next(counter)}', 'password': 'storm-password-1'})
+            return 'POST', '/api/register/', body, headers
+        return request
+
+    def drive(self, port, groups, duration):
+        """
+        For each group (request factory, connections), that many threads with
+        one keep-alive connection each, issuing requests back to back until
+        the deadline. Returns a summary per group.
+        """
+        collected = {name: ([], []) for name in groups}
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def client(name, make_request):
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            mine, codes = [], []
+            for i in itertools.count():
+                if time.monotonic() >= deadline:
+                    break
+                method, path, body, headers = make_request(i)
+                started = time.perf_counter()
+                try:
+                    conn.request(method, path, body=body, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                    codes.append(response.status)
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                    codes.append(0)
+                    response = None
+                mine.append(time.perf_counter() - started)
+                retry_after = response is not None and response.getheader('Retry-After')
+                if retry_after:
+                    # Back off like a well-behaved client.
+                    time.sleep(min(float(retry_after), max(deadline - time.monotonic(), 0)))
+            conn.close()
+            with lock:
+                collected[name][0].extend(mine)
+                collected[name][1].extend(codes)
+
+        threads = [
+            threading.Thread(target=client, args=(name, make_request))
+            for name, (make_request, connections) in groups.items()
+            for _ in range(connections)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return {
+            name: benchmark.summarize(latencies, elapsed, statuses=statuses)
+            for name, (latencies, statuses) in collected.items()
+        }
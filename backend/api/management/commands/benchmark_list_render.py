@@ -0,0 +1,91 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api import benchmark, fastpath, fragments
+from api.models import Prompt
+from api.serializers import LARGE_FIELDS, PromptListSerializer, PromptSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare rows per second of building a prompt list page, query included: DRF serializers "
+        "over model instances, fragments rendered from instances, and the values_list() fast path "
+        "(cold and with warm fragments). Checks that all of them produce the same bytes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help="Rows per page.")
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--full', action='store_true',
+                            help="Render the full PromptSerializer row instead of the list row.")
+        parser.add_argument('--user', help="Username to render for (default: first bench_user_*).")
+        parser.add_argument('--output', help="Write the JSON report to this file as well.")
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(username=options['user'])
+        else:
+            users = users.filter(username__startswith='bench_user_').order_by('id')
+        user = users.first()
+        if user is None:
+            raise CommandError("No user to render for; run seed_benchmark_data or pass --user.")
+
+        request = Request(APIRequestFactory().get('/api/prompts/'))
+        request.user = user
+        serializer_class = PromptSerializer if options['full'] else PromptListSerializer
+        serializer = serializer_class(context={'request': request})
+        base = Prompt.objects.with_vote_stats(user).filter(status='approved').order_by('-created_at', '-id')
+        unrendered = [name for name in LARGE_FIELDS if name not in serializer.fields]
+        instances = lambda: list(base.defer('search_vector', *unrendered)[:options['rows']])  # noqa: E731
+
+        def drf(i):
+            page = instances()
+            return JSONRenderer().render(serializer_class(page, many=True, context={'request': request}).data)
+
+        def spliced(rows, queryset, warm=False):
+            def run(i):
+                if not warm:
+                    fragments.cache.clear()
+                page = list(queryset[:options['rows']])
+                return b'[' + b','.join(
+                    rows.row(fragment, rows.volatile(row)) for fragment, row in zip(rows.fragments(page), page)
+                ) + b']'
+            return run
+
+        slow_rows = fragments.RowRenderer(serializer)
+        fast_rows = fragments.RowRenderer(serializer, fastpath.CompiledRows(serializer, base.query.annotations))
+        fast_queryset = fast_rows.compiled.values(base, ['created_at'])
+        variants = {
+            'serializer': drf,
+            'fragments_cold': spliced(slow_rows, base.defer('search_vector', *unrendered)),
+            'fast_path_cold': spliced(fast_rows, fast_queryset),
+            'fast_path_warm': spliced(fast_rows, fast_queryset, warm=True),
+        }
+
+        expected = drf(0)
+        for name, run in variants.items():
+            if run(0) != expected:
+                raise CommandError(f"{name} does not render the same bytes as the serializer.")
+
+        results = {}
+        for name, run in variants.items():
+            summary = benchmark.measure(run, options['iterations'], warmup=options['warmup'])
+            summary['rows_per_s'] = round(summary['throughput_rps'] * options['rows'])
+            results[name] = summary
+            self.stdout.write(f"  {name}: {summary['rows_per_s']} rows/s p50={summary['p50_ms']}ms")
+        baseline = results['serializer']['rows_per_s']
+        for summary in results.values():
+            summary['speedup'] = round(summary['rows_per_s'] / baseline, 2) if baseline else None
+
+        report = {
+            'environment': benchmark.environment(),
+            'options': {k: options[k] for k in ('rows', 'iterations', 'warmup', 'full')},
+            'serializer': serializer_class.__name__,
+            'results': results,
+        }
+        self.stdout.write(benchmark.dump(report, options['output']))
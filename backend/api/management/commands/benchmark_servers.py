@@ -0,0 +1,156 @@
+import http.client
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import benchmark
+from api.models import Prompt
+
+SERVERS = {
+    # The current deployment: gunicorn's WSGI worker processes.
+    'gunicorn': lambda port, opts: [
+        sys.executable, '-m', 'gunicorn', 'prompt_library.wsgi:application',
+        '--bind', f'127.0.0.1:{port}', '--workers', str(opts['workers']),
+        '--threads', str(opts['threads']), '--log-level', 'warning',
+    ],
+    # The async read path served natively.
+    'uvicorn': lambda port, opts: [
+        sys.executable, '-m', 'uvicorn', 'prompt_library.asgi:application',
+        '--host', '127.0.0.1', '--port', str(port), '--workers', str(opts['workers']),
+        '--log-level', 'warning', '--no-access-log',
+    ],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f"Server did not start listening on port {port} within {timeout}s")
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent-connection throughput of the read endpoints under gunicorn "
+        "(WSGI) and uvicorn (ASGI). Starts each server against the configured database, "
+        "drives it with N keep-alive connections and prints a JSON report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', nargs='*', choices=sorted(SERVERS), default=['gunicorn', 'uvicorn'])
+        parser.add_argument('--concurrency', nargs='*', type=int, default=[1, 8, 32, 64])
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds per concurrency level.")
+        parser.add_argument('--workers', type=int, default=2, help="Worker processes per server.")
+        parser.add_argument('--threads', type=int, default=1, help="Threads per gunicorn worker.")
+        parser.add_argument('--warmup', type=float, default=3.0,
+                            help="Seconds of unrecorded load before measuring each server.")
+        parser.add_argument('--user', help="Username to authenticate as (default: first bench_user_*).")
+        parser.add_argument('--output', help="Write the JSON report to this file as well.")
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        prompt_id = (
+            Prompt.objects.filter(status='approved').order_by('-created_at').values_list('id', flat=True).first()
+        )
+        paths = ['/api/prompts/', '/api/categories/', '/api/auth/user/']
+        if prompt_id:
+            paths.insert(1, f'/api/prompts/{prompt_id}/')
+
+        results = {}
+        for server in options['servers']:
+            results[server] = {}
+            port = free_port()
+            process = subprocess.Popen(
+                SERVERS[server](port, options), cwd=settings.BASE_DIR, env=os.environ.copy(),
+            )
+            try:
+                wait_for_port(port)
+                token = str(AccessToken.for_user(user))
+                # Let every worker import, connect and fill its caches first.
+                self.load(port, token, paths, options['workers'] * 2, options['warmup'])
+                for concurrency in options['concurrency']:
+                    self.stdout.write(f"  {server} c={concurrency}...", ending='')
+                    self.stdout.flush()
+                    summary = self.load(port, token, paths, concurrency, options['duration'])
+                    results[server][str(concurrency)] = summary
+                    self.stdout.write(f" {summary['throughput_rps']} req/s p99={summary['p99_ms']}ms")
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+
+        report = {
+            'environment': benchmark.environment(),
+            'options': {k: options[k] for k in ('concurrency', 'duration', 'warmup', 'workers', 'threads')},
+            'paths': paths,
+            'results': results,
+        }
+        self.stdout.write(benchmark.dump(report, options['output']))
+
+    def get_user(self, username):
+        users = User.objects.all()
+        if username:
+            users = users.filter(username=username)
+        else:
+            users = users.filter(username__startswith='bench_user_').order_by('id')
+        user = users.first()
+        if user is None:
+            raise CommandError("No user to authenticate as; run seed_benchmark_data or pass --user.")
+        return user
+
+    def load(self, port, token, paths, concurrency, duration):
+        """
+        `concurrency` threads, each with one keep-alive connection, issuing
+        requests back to back until the deadline.
+        """
+        headers = {'Authorization': f'Bearer {token}', 'Host': '127.0.0.1'}
+        latencies, statuses, lock = [], [], threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def client(offset):
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            mine, codes = [], []
+            for path in itertools.islice(itertools.cycle(paths), offset, None):
+                if time.monotonic() >= deadline:
+                    break
+                started = time.perf_counter()
+                try:
+                    conn.request('GET', path, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                    codes.append(response.status)
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                    codes.append(0)
+                mine.append(time.perf_counter() - started)
+            conn.close()
+            with lock:
+                latencies.extend(mine)
+                statuses.extend(codes)
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return benchmark.summarize(latencies, time.perf_counter() - started, statuses=statuses)
@@ -0,0 +1,53 @@
+import itertools
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from api import minhash
+from api.models import Prompt
+
+
+class Command(BaseCommand):
+    help = "Compute MinHash signatures and LSH buckets for every prompt, in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Size of the process pool hashing the prompts.")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Prompts per worker task and per bulk insert.")
+
+    def batches(self, batch_size):
+        rows = (
+            Prompt.objects.order_by('id')
+            .values_list('id', 'title', 'prompt_description', 'prompt_text')
+            .iterator(chunk_size=batch_size)
+        )
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def handle(self, *args, **options):
+        total = 0
+        batches = self.batches(options['batch_size'])
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            # pool.map() would read and submit the whole corpus up front; keep
+            # two batches per worker in flight instead, stored in order.
+            pending = deque(
+                pool.submit(minhash.signatures_for, batch)
+                for batch in itertools.islice(batches, 2 * options['workers'])
+            )
+            while pending:
+                results = pending.popleft().result()
+                for batch in itertools.islice(batches, 1):
+                    pending.append(pool.submit(minhash.signatures_for, batch))
+                minhash.store_signatures(results)
+                total += len(results)
+                self.stdout.write(f"  {total} prompts hashed")
+        self.stdout.write(self.style.SUCCESS(f"Built MinHash signatures for {total} prompts."))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from api import related
+
+
+class Command(BaseCommand):
+    help = "Rebuild the related-prompts TF-IDF index from all approved prompts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--merge', action='store_true',
+            help="Fold the logged changes into a new version instead of rebuilding from the database.",
+        )
+
+    def handle(self, *args, **options):
+        store = related.get_store()
+        if options['merge']:
+            version = store.merge()
+            if version is None:
+                self.stdout.write("No changes to merge.")
+                return
+        else:
+            related.rebuild()
+        index = store.get()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {len(index)} approved prompts into {store.root} ({store.current_version()})."
+        ))
@@ -0,0 +1,101 @@
+import json
+import os
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importer import PromptImporter
+from api.models import STATUS_CHOICES
+
+
+def pairs(values, option):
+    result = {}
+    for value in values or ():
+        key, sep, rest = value.partition('=')
+        if not sep or not key:
+            raise CommandError(f"{option} expects key=value, got {value!r}")
+        result[key] = rest
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        "Import prompts from a JSONL file in validated batches (COPY on Postgres, "
+        "bulk_create elsewhere). Bad rows are reported and skipped; --checkpoint "
+        "makes an interrupted import resumable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="JSONL file to import, or - for stdin.")
+        parser.add_argument('--user', required=True, help="Username that will own the imported prompts.")
+        parser.add_argument('--status', default='approved', choices=[c for c, _ in STATUS_CHOICES])
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Rows per validation batch and transaction (default PROMPT_IMPORT_BATCH_SIZE).")
+        parser.add_argument('--map', action='append', metavar='SOURCE=FIELD',
+                            help="Read prompt field FIELD from the record key SOURCE. Repeatable.")
+        parser.add_argument('--set', action='append', metavar='FIELD=VALUE',
+                            help="Default for a field the records lack. Repeatable.")
+        parser.add_argument('--start', type=int, default=None,
+                            help="Skip this many lines (default: the checkpoint's offset, else 0).")
+        parser.add_argument('--checkpoint', help="File recording the offset of the last committed batch.")
+        parser.add_argument('--errors', help="Write per-row errors to this JSONL file instead of stderr.")
+        parser.add_argument('--no-copy', action='store_true', help="Use bulk_create even on Postgres.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['user']!r}.")
+
+        start = options['start']
+        checkpoint = options['checkpoint']
+        if start is None:
+            start = self.read_checkpoint(checkpoint) if checkpoint else 0
+
+        importer = PromptImporter(
+            user,
+            status=options['status'],
+            batch_size=options['batch_size'],
+            field_map=pairs(options['map'], '--map'),
+            defaults=pairs(options['set'], '--set'),
+            use_copy=False if options['no_copy'] else None,
+        )
+        errors_out = open(options['errors'], 'a', encoding='utf-8') if options['errors'] else sys.stderr
+        source = sys.stdin if options['path'] == '-' else open(options['path'], encoding='utf-8')
+        started = time.perf_counter()
+        failed = 0
+        try:
+            for batch in importer.batches(source, start=start):
+                for error in batch.errors:
+                    errors_out.write(json.dumps(error) + '\n')
+                failed += len(batch.errors)
+                if checkpoint:
+                    self.write_checkpoint(checkpoint, batch.offset)
+                self.stdout.write(f"  line {batch.offset}: {importer.imported} imported, {failed} rejected")
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if errors_out is not sys.stderr:
+                errors_out.close()
+            importer.finish()
+
+        elapsed = time.perf_counter() - started
+        rate = importer.imported / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {importer.imported} prompts ({failed} rejected) in {elapsed:.1f}s, {rate:.0f} rows/s."
+        ))
+
+    def read_checkpoint(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)['offset']
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, path, offset):
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'offset': offset}, f)
+        os.replace(tmp, path)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api import facets
+from api.models import PromptFacetCount
+
+
+class Command(BaseCommand):
+    help = "Recompute the facet count rollup behind /api/prompts/facets/ from the prompts table."
+
+    def handle(self, *args, **options):
+        facets.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt facet counts: {PromptFacetCount.objects.count()} combinations."
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from api import cache as response_cache
+from api import counters, ranking
+from api.models import Prompt
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-decay the hot scores behind ?ordering=hot for the current time, folding sharded vote "
+        "counters into their prompts first. Run it every few minutes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Prompts per bulk update.")
+
+    def handle(self, *args, **options):
+        sharded = list(Prompt.objects.filter(vote_shards__gt=0).values_list('id', flat=True))
+        for prompt_id in sharded:
+            counters.fold_shards(prompt_id)
+        total = ranking.refresh(options['batch_size'])
+        # Cached hot and top pages keep their old order until the generation moves.
+        response_cache.bump_generation()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rescored {total} prompts ({len(sharded)} sharded prompts folded)."
+        ))
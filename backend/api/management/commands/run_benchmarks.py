@@ -0,0 +1,150 @@
+import random
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.conf import settings
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from api import benchmark
+from api import cache as response_cache
+from api.models import Prompt, PromptVersion
+from api.search import WORD_RE
+
+SCENARIOS = (
+    'list', 'list_deep', 'search', 'retrieve', 'upvote', 'downvote',
+    'bookmark', 'history', 'revert',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure latency percentiles, throughput and SQL query counts of the API's hot "
+        "paths in-process, and print (or save) a JSON report. Seed data first with "
+        "seed_benchmark_data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--only', nargs='*', choices=SCENARIOS, help="Run only these scenarios.")
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--deep-pages', type=int, default=20,
+                            help="How many pages into the list `list_deep` starts.")
+        parser.add_argument('--cold', action='store_true',
+                            help="Clear the response cache before every request.")
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--seed', type=int, default=7)
+        parser.add_argument('--output', help="Write the JSON report to this file as well.")
+
+    def handle(self, *args, **options):
+        # Requests are made in-process by the test client, which uses the
+        # 'testserver' host.
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            self.run(options)
+
+    def run(self, options):
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.cold = options['cold']
+
+        try:
+            self.user = User.objects.filter(
+                username__startswith=f"{options['prefix']}_user_", is_staff=False
+            ).order_by('id')[0]
+            self.admin = User.objects.get(username=f"{options['prefix']}_admin")
+        except (IndexError, User.DoesNotExist):
+            raise CommandError("No benchmark users found; run seed_benchmark_data first.")
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.admin_client = APIClient()
+        self.admin_client.force_authenticate(self.admin)
+
+        self.prompt_ids = list(
+            Prompt.objects.filter(status='approved').order_by('?').values_list('id', flat=True)[:1000]
+        )
+        if not self.prompt_ids:
+            raise CommandError("No approved prompts to benchmark against.")
+        titles = Prompt.objects.filter(pk__in=self.prompt_ids[:200]).values_list('title', flat=True)
+        self.terms = sorted({w.lower() for t in titles for w in WORD_RE.findall(t)}) or ['prompt']
+
+        # The approved prompt with the longest history, for history/revert.
+        self.history_prompt = (
+            Prompt.objects.filter(status='approved').annotate(n=Count('versions')).order_by('-n').first()
+        )
+        self.version_ids = list(
+            PromptVersion.objects.filter(prompt=self.history_prompt).values_list('id', flat=True)
+        )
+
+        results = {}
+        for name in options['only'] or SCENARIOS:
+            self.stdout.write(f"  {name}...", ending='')
+            self.stdout.flush()
+            runner = getattr(self, f'run_{name}')
+            results[name] = benchmark.measure(runner(), options['iterations'], warmup=options['warmup'])
+            self.stdout.write(f" p50={results[name]['p50_ms']}ms p99={results[name]['p99_ms']}ms")
+
+        report = {
+            'environment': benchmark.environment(),
+            'dataset': {
+                'users': User.objects.count(),
+                'prompts': Prompt.objects.count(),
+                'approved_prompts': Prompt.objects.filter(status='approved').count(),
+                'versions': PromptVersion.objects.count(),
+            },
+            'options': {k: options[k] for k in ('iterations', 'warmup', 'page_size', 'deep_pages', 'cold')},
+            'results': results,
+        }
+        self.stdout.write(benchmark.dump(report, options['output']))
+
+    # --- scenarios: each returns fn(i) ---
+
+    def get(self, client, url, **params):
+        if self.cold:
+            response_cache.get_cache().clear()
+        return client.get(url, params)
+
+    def random_prompt(self):
+        return self.rng.choice(self.prompt_ids)
+
+    def run_list(self):
+        return lambda i: self.get(self.client, '/api/prompts/', page_size=self.options['page_size'])
+
+    def run_list_deep(self):
+        url = '/api/prompts/'
+        params = {'page_size': self.options['page_size']}
+        for _ in range(self.options['deep_pages']):
+            data = self.client.get(url, params).data
+            if not data.get('next'):
+                break
+            url, params = data['next'], {}
+        return lambda i: self.get(self.client, url, **params)
+
+    def run_search(self):
+        return lambda i: self.get(
+            self.client, '/api/prompts/', search=self.rng.choice(self.terms), page_size=self.options['page_size'],
+        )
+
+    def run_retrieve(self):
+        return lambda i: self.get(self.client, f'/api/prompts/{self.random_prompt()}/')
+
+    def run_upvote(self):
+        return lambda i: self.client.post(f'/api/prompts/{self.random_prompt()}/upvote/')
+
+    def run_downvote(self):
+        return lambda i: self.client.post(f'/api/prompts/{self.random_prompt()}/downvote/')
+
+    def run_bookmark(self):
+        return lambda i: self.client.post(f'/api/prompts/{self.random_prompt()}/bookmark/')
+
+    def run_history(self):
+        return lambda i: self.get(self.admin_client, f'/api/prompts/{self.history_prompt.pk}/history/')
+
+    def run_revert(self):
+        if not self.version_ids:
+            raise CommandError("The benchmark data has no prompt versions to revert to.")
+        return lambda i: self.admin_client.post(
+            f'/api/prompts/{self.history_prompt.pk}/revert/{self.rng.choice(self.version_ids)}/'
+        )
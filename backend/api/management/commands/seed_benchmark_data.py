@@ -0,0 +1,183 @@
+import datetime
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api import cache as response_cache
+from api import facets
+from api import ranking
+from api import versioning
+from api.models import (
+    CATEGORY_CHOICES, OUTPUT_FORMAT_CHOICES, TASK_TYPE_CHOICES,
+    Bookmark, Prompt, Vote,
+)
+
+VOCABULARY = (
+    "analyse audience brainstorm brand budget campaign checklist churn code customer dashboard "
+    "data deadline debug design document draft email engineer estimate feature feedback forecast "
+    "funnel goal guide hiring incident insight interview invoice launch lead learning market "
+    "meeting metric migrate milestone model onboarding outline persona pipeline plan policy "
+    "presentation pricing priority product prompt proposal prototype python query quarterly "
+    "recruit refactor release report requirement research retention review revenue risk roadmap "
+    "sales schedule scope script security slide sprint stakeholder strategy summary support "
+    "survey table task team template test timeline training trend user vendor workflow write"
+).split()
+
+STATUS_WEIGHTS = (
+    ('approved', 85),
+    ('pending', 8),
+    ('rejected', 5),
+    ('pending_deletion', 2),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a realistic synthetic dataset for run_benchmarks: many users, long prompt "
+        "texts, heavily skewed vote counts and many versions per prompt. Uses bulk inserts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--prompts', type=int, default=5000)
+        parser.add_argument('--mean-versions', type=float, default=4.0,
+                            help="Mean PromptVersion rows per prompt (exponentially distributed).")
+        parser.add_argument('--max-votes', type=int, default=None,
+                            help="Cap on votes per prompt (defaults to the number of users).")
+        parser.add_argument('--text-words', type=int, default=600,
+                            help="Mean length of prompt_text in words.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='bench',
+                            help="Username prefix of generated users; re-running adds more data.")
+
+    def words(self, n):
+        return ' '.join(self.rng.choices(VOCABULARY, k=max(1, n)))
+
+    def sentence_title(self):
+        return ' '.join(self.rng.sample(VOCABULARY, self.rng.randint(2, 6))).capitalize()
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        batch = options['batch_size']
+
+        with transaction.atomic():
+            users = self.create_users(options['users'], options['prefix'], batch)
+            prompts = self.create_prompts(users, options['prompts'], options['text_words'], batch)
+            votes = self.create_votes(users, prompts, options['max_votes'] or len(users), batch)
+            bookmarks = self.create_bookmarks(users, prompts, batch)
+            versions = self.create_versions(users, prompts, options['mean_versions'])
+            facets.added(prompts)
+            ranking.refresh(batch)
+            response_cache.bump_generation()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(users)} users, {len(prompts)} prompts, {votes} votes, "
+            f"{bookmarks} bookmarks, {versions} versions."
+        ))
+        self.stdout.write(
+            "Run `manage.py build_related_index` and `manage.py build_minhash_signatures` "
+            "to index the new prompts."
+        )
+
+    def create_users(self, count, prefix, batch):
+        start = User.objects.filter(username__startswith=f'{prefix}_user_').count()
+        password = make_password('benchmark')  # hash once, not once per user
+        User.objects.bulk_create([
+            User(username=f'{prefix}_user_{start + i}', password=password)
+            for i in range(count)
+        ], batch_size=batch)
+        User.objects.get_or_create(
+            username=f'{prefix}_admin', defaults={'is_staff': True, 'password': password}
+        )
+        return list(User.objects.filter(username__startswith=f'{prefix}_user_').order_by('id'))
+
+    def create_prompts(self, users, count, text_words, batch):
+        statuses = [s for s, _ in STATUS_WEIGHTS]
+        weights = [w for _, w in STATUS_WEIGHTS]
+        rows = []
+        for _ in range(count):
+            rows.append(Prompt(
+                user=self.rng.choice(users),
+                title=self.sentence_title(),
+                prompt_description=self.words(self.rng.randint(10, 60)),
+                prompt_text=self.words(int(self.rng.expovariate(1 / text_words)) + 20),
+                guidance=self.words(self.rng.randint(20, 200)),
+                task_type=self.rng.choice(TASK_TYPE_CHOICES)[0],
+                output_format=self.rng.choice(OUTPUT_FORMAT_CHOICES)[0],
+                category=self.rng.choice(CATEGORY_CHOICES)[0],
+                status=self.rng.choices(statuses, weights)[0],
+            ))
+        prompts = Prompt.objects.bulk_create(rows, batch_size=batch)
+        if prompts and prompts[0].pk is None:
+            # Backends that don't return ids from bulk inserts
+            prompts = list(Prompt.objects.order_by('-id')[:count])[::-1]
+
+        # Spread creation dates over the last year (auto_now_add ignores them on insert).
+        now = timezone.now()
+        for prompt in prompts:
+            prompt.created_at = now - datetime.timedelta(seconds=self.rng.randint(0, 365 * 86400))
+            prompt.updated_at = prompt.created_at
+        Prompt.objects.bulk_update(prompts, ['created_at', 'updated_at'], batch_size=batch)
+        return prompts
+
+    def create_votes(self, users, prompts, max_votes, batch):
+        pending, total = [], 0
+        for prompt in prompts:
+            if prompt.status != 'approved':
+                continue
+            # Pareto-distributed popularity: most prompts get a handful of
+            # votes, a few get a large share of all votes.
+            n = min(int(self.rng.paretovariate(1.1)) - 1, max_votes, len(users))
+            likes = dislikes = 0
+            for voter in self.rng.sample(users, n):
+                value = 1 if self.rng.random() < 0.8 else -1
+                likes += value == 1
+                dislikes += value == -1
+                pending.append(Vote(user=voter, prompt=prompt, value=value))
+            prompt.like_count, prompt.dislike_count = likes, dislikes
+            prompt.vote = likes - dislikes
+            if len(pending) >= batch:
+                Vote.objects.bulk_create(pending, batch_size=batch)
+                total += len(pending)
+                pending = []
+        Vote.objects.bulk_create(pending, batch_size=batch)
+        total += len(pending)
+        Prompt.objects.bulk_update(prompts, ['like_count', 'dislike_count', 'vote'], batch_size=batch)
+        return total
+
+    def create_bookmarks(self, users, prompts, batch):
+        approved = [p for p in prompts if p.status == 'approved']
+        rows = []
+        for user in users:
+            for prompt in self.rng.sample(approved, min(len(approved), self.rng.randint(0, 15))):
+                rows.append(Bookmark(user=user, prompt=prompt))
+        Bookmark.objects.bulk_create(rows, batch_size=batch, ignore_conflicts=True)
+        return len(rows)
+
+    def create_versions(self, users, prompts, mean_versions):
+        # Each snapshot is delta-encoded against the previous one, so these
+        # go through versioning.snapshot() rather than a bulk insert.
+        total = 0
+        for prompt in prompts:
+            text = prompt.prompt_text
+            for _ in range(int(self.rng.expovariate(1 / mean_versions)) if mean_versions else 0):
+                text = self.edit(text)
+                versioning.snapshot(prompt, self.rng.choice(users), prompt_text=text)
+                total += 1
+        return total
+
+    def edit(self, text):
+        """
+        A plausible edit: rewrite a few words somewhere and maybe append a sentence.
+        """
+        words = text.split(' ')
+        start = self.rng.randrange(len(words))
+        words[start:start + self.rng.randint(0, 5)] = self.words(self.rng.randint(1, 6)).split(' ')
+        if self.rng.random() < 0.3:
+            words.append(self.words(self.rng.randint(3, 15)))
+        return ' '.join(words)
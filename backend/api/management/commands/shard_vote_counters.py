@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from api import counters
+from api.models import Prompt
+
+
+class Command(BaseCommand):
+    help = "Spread the vote counters of hot prompts over several rows (or turn it off)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('prompt_ids', nargs='*', type=int,
+                            help="Prompts to (un)shard. Defaults to the --top most voted.")
+        parser.add_argument('--top', type=int, default=0,
+                            help="Shard the N prompts with the most votes.")
+        parser.add_argument('--shards', type=int, default=8,
+                            help="Counter rows per prompt; 0 folds the shards back and disables sharding.")
+
+    def handle(self, *args, **options):
+        ids = list(options['prompt_ids'])
+        if options['top']:
+            ids += list(
+                Prompt.objects.order_by(F('like_count') + F('dislike_count')).reverse()
+                .values_list('id', flat=True)[:options['top']]
+            )
+        for pk in dict.fromkeys(ids):
+            counters.set_shards(pk, options['shards'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Set {options['shards']} vote counter shards on {len(set(ids))} prompts."
+        ))
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import fragments
+from api.models import Prompt
+from api.serializers import LARGE_FIELDS, PromptListSerializer, PromptSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the list-row fragments of approved prompts, newest first, into the shared "
+        "fragment cache (PROMPT_FRAGMENT_CACHE_ALIAS) so workers start with them warm."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None,
+                            help="Only the N newest approved prompts (default: all).")
+        parser.add_argument('--full', action='store_true',
+                            help="Also the full representation that ?fields= picks from.")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Prompts per query and per set_many.")
+
+    def handle(self, *args, **options):
+        if fragments.shared_cache() is None:
+            raise CommandError(
+                "No shared fragment cache: each worker's LRU is private, so there is nothing to warm "
+                "from here. Set PROMPT_CACHE_URL to a redis:// or file:// cache."
+            )
+        serializers = [PromptListSerializer()]
+        if options['full']:
+            serializers.append(PromptSerializer())
+
+        started = time.perf_counter()
+        for serializer in serializers:
+            rows = fragments.RowRenderer(serializer)
+            unrendered = [name for name in LARGE_FIELDS if name not in serializer.fields]
+            prompts = (
+                Prompt.objects.filter(status='approved').select_related('user')
+                .defer('search_vector', *unrendered).order_by('-created_at', '-id')
+            )
+            if options['limit'] is not None:
+                prompts = prompts[:options['limit']]
+            total = 0
+            batch = []
+            for prompt in prompts.iterator(chunk_size=options['batch_size']):
+                batch.append(prompt)
+                if len(batch) == options['batch_size']:
+                    total += self.warm(rows, batch)
+                    batch = []
+            total += self.warm(rows, batch)
+            self.stdout.write(f"  {type(serializer).__name__}: {total} fragments")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Warmed prompt fragments in {time.perf_counter() - started:.1f}s."
+        ))
+
+    def warm(self, rows, prompts):
+        rows.store({rows.key_for(prompt): rows.render(prompt) for prompt in prompts})
+        return len(prompts)
@@ -0,0 +1,374 @@
+# api/metrics.py
+"""
+Per-endpoint request metrics in the Prometheus text format.
+
+`MetricsMiddleware` times every request and, through
+`connection.execute_wrapper`, counts the SQL queries it issues and the time
+spent in them. Series are labelled with the resolved URL name, the DRF
+action (`list`, `upvote`, `history`, ...) and the HTTP method; status codes
+get their own counter. Streamed bodies (the export) are measured when
+they finish streaming, queries issued while iterating included.
+
+Each process aggregates into an in-memory `Registry`. When
+settings.PROMPT_METRICS_DIR is set, every worker also writes its snapshot
+there (at most every PROMPT_METRICS_FLUSH_INTERVAL seconds, via an atomic
+rename) and `/api/metrics/` merges the files of all workers. Clear the
+directory when the server is restarted, as with prometheus_client's
+multiprocess mode.
+"""
+import atexit
+import contextlib
+import copy
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def metrics_dir():
+    return getattr(settings, 'PROMPT_METRICS_DIR', None)
+
+
+def flush_interval():
+    return getattr(settings, 'PROMPT_METRICS_FLUSH_INTERVAL', 5.0)
+
+
+def _empty_series():
+    return {
+        'count': 0,
+        'seconds': 0.0,
+        'latency_buckets': [0] * len(LATENCY_BUCKETS),
+        'queries': 0,
+        'query_buckets': [0] * len(QUERY_BUCKETS),
+        'db_seconds': 0.0,
+        'bytes': 0,
+        'statuses': {},
+    }
+
+
+def _bucket_index(buckets, value):
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            return i
+    return None  # only counted in +Inf
+
+
+class Registry:
+    """
+    Thread-safe per-process aggregates, keyed by (view, action, method).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.series = {}
+        self.file_name = f'metrics-{os.getpid()}-{time.time_ns()}.json'
+        self._last_flush = 0.0
+
+    def observe(self, labels, status, seconds, queries, db_seconds, size):
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = _empty_series()
+            series['count'] += 1
+            series['seconds'] += seconds
+            i = _bucket_index(LATENCY_BUCKETS, seconds)
+            if i is not None:
+                series['latency_buckets'][i] += 1
+            series['queries'] += queries
+            i = _bucket_index(QUERY_BUCKETS, queries)
+            if i is not None:
+                series['query_buckets'][i] += 1
+            series['db_seconds'] += db_seconds
+            series['bytes'] += size
+            status = str(status)
+            series['statuses'][status] = series['statuses'].get(status, 0) + 1
+
+        directory = metrics_dir()
+        if directory and time.monotonic() - self._last_flush >= flush_interval():
+            self.flush(directory)
+
+    def snapshot(self):
+        with self._lock:
+            return [
+                {'labels': list(labels), **copy.deepcopy(series)}
+                for labels, series in self.series.items()
+            ]
+
+    def flush(self, directory=None):
+        directory = directory or metrics_dir()
+        if not directory:
+            return
+        self._last_flush = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(self.snapshot(), fh)
+        os.replace(tmp, os.path.join(directory, self.file_name))
+
+    def reset(self):
+        with self._lock:
+            self.series = {}
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+
+def merge(snapshots):
+    """
+    Sum a list of snapshots into {labels: series}.
+    """
+    merged = {}
+    for snapshot in snapshots:
+        for entry in snapshot:
+            labels = tuple(entry['labels'])
+            series = merged.setdefault(labels, _empty_series())
+            for key in ('count', 'seconds', 'queries', 'db_seconds', 'bytes'):
+                series[key] += entry[key]
+            for key in ('latency_buckets', 'query_buckets'):
+                series[key] = [a + b for a, b in zip(series[key], entry[key])]
+            for status, n in entry['statuses'].items():
+                series['statuses'][status] = series['statuses'].get(status, 0) + n
+    return merged
+
+
+def collect():
+    """
+    Merged series of every worker (or of this process only, when no
+    metrics directory is configured).
+    """
+    directory = metrics_dir()
+    if not directory:
+        return merge([registry.snapshot()])
+    registry.flush(directory)
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        try:
+            with open(path) as fh:
+                snapshots.append(json.load(fh))
+        except (OSError, ValueError):
+            continue  # a worker exiting mid-read
+    return merge(snapshots)
+
+
+# --- exposition ---
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+LABEL_NAMES = ('view', 'action', 'method')
+
+
+def render(merged):
+    lines = []
+
+    def header(name, kind, help_text):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    def histogram(name, buckets, counts_key, sum_key):
+        for labels, series in sorted(merged.items()):
+            cumulative = 0
+            for bound, n in zip(buckets, series[counts_key]):
+                cumulative += n
+                lines.append(f'{name}_bucket{_labels(LABEL_NAMES, labels, le=_number(bound))} {cumulative}')
+            lines.append(f'{name}_bucket{_labels(LABEL_NAMES, labels, le="+Inf")} {series["count"]}')
+            lines.append(f'{name}_sum{_labels(LABEL_NAMES, labels)} {_number(series[sum_key])}')
+            lines.append(f'{name}_count{_labels(LABEL_NAMES, labels)} {series["count"]}')
+
+    def counter(name, key):
+        for labels, series in sorted(merged.items()):
+            lines.append(f'{name}{_labels(LABEL_NAMES, labels)} {_number(series[key])}')
+
+    header('prompt_http_request_duration_seconds', 'histogram', 'Request latency.')
+    histogram('prompt_http_request_duration_seconds', LATENCY_BUCKETS, 'latency_buckets', 'seconds')
+
+    header('prompt_http_requests_total', 'counter', 'Requests by response status.')
+    for labels, series in sorted(merged.items()):
+        for status, n in sorted(series['statuses'].items()):
+            lines.append(f'prompt_http_requests_total{_labels(LABEL_NAMES, labels, status=status)} {n}')
+
+    header('prompt_db_queries_per_request', 'histogram', 'SQL queries issued per request.')
+    histogram('prompt_db_queries_per_request', QUERY_BUCKETS, 'query_buckets', 'queries')
+
+    header('prompt_db_query_seconds_total', 'counter', 'Time spent executing SQL.')
+    counter('prompt_db_query_seconds_total', 'db_seconds')
+
+    header('prompt_http_response_bytes_total', 'counter', 'Response body bytes.')
+    counter('prompt_http_response_bytes_total', 'bytes')
+
+    return '\n'.join(lines) + '\n'
+
+
+# --- middleware ---
+
+class _QueryTimer:
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+def _view_labels(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return ('unmatched', '', request.method)
+    func = match.func
+    actions = getattr(func, 'actions', None)  # ViewSet.as_view() mapping
+    if actions:
+        action = actions.get(request.method.lower(), '')
+    else:
+        action = request.method.lower()
+    return (match.url_name or match.view_name or '', action, request.method)
+
+
+class MetricsMiddleware:
+    """
+    Records latency, SQL query count/time, response size and status for
+    every request. Put it first in MIDDLEWARE so the latency covers the
+    whole stack. Works in both sync (WSGI) and async (ASGI) mode.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timer = _QueryTimer()
+        started = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            _install(stack, timer)
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = _Streamed(
+                response.streaming_content, timer, self._finisher(request, response, timer, started),
+            )
+        else:
+            self._observe(request, response, timer, time.perf_counter() - started, len(response.content))
+        return response
+
+    async def __acall__(self, request):
+        timer = _QueryTimer()
+        started = time.perf_counter()
+        # The ORM runs in the request's thread-sensitive executor thread,
+        # whose connection objects are the ones that need the wrapper.
+        stack = contextlib.ExitStack()
+        await sync_to_async(_install)(stack, timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        if response.streaming:
+            streamed = _AsyncStreamed if response.is_async else _Streamed
+            response.streaming_content = streamed(
+                response.streaming_content, timer, self._finisher(request, response, timer, started),
+            )
+        else:
+            self._observe(request, response, timer, time.perf_counter() - started, len(response.content))
+        return response
+
+    def _finisher(self, request, response, timer, started):
+        # A streamed body is produced after the middleware has returned, so
+        # latency, size and queries are recorded once it is exhausted or
+        # closed.
+        def finish(size):
+            self._observe(request, response, timer, time.perf_counter() - started, size)
+        return finish
+
+    def _observe(self, request, response, timer, elapsed, size):
+        registry.observe(
+            _view_labels(request), response.status_code, elapsed, timer.queries, timer.seconds, size,
+        )
+
+
+class _Streamed:
+    """
+    Streaming content that keeps counting queries while each chunk is
+    produced and calls `finish(size)` once, when iteration ends or the
+    response is closed.
+    """
+
+    def __init__(self, content, timer, finish):
+        self.content = content
+        self.timer = timer
+        self.finish = finish
+        self.size = 0
+        self.done = False
+
+    def __iter__(self):
+        iterator = iter(self.content)
+        try:
+            while True:
+                # Installed per chunk: a suspended generator must not leave
+                # the wrapper on the connection between chunks.
+                with contextlib.ExitStack() as stack:
+                    _install(stack, self.timer)
+                    chunk = next(iterator, None)
+                if chunk is None:
+                    break
+                self.size += len(chunk)
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        if not self.done:
+            self.done = True
+            self.finish(self.size)
+
+
+class _AsyncStreamed(_Streamed):
+    __iter__ = None  # so StreamingHttpResponse treats it as async
+
+    async def __aiter__(self):
+        # One thread hop to install (and one to remove) the wrapper rather
+        # than two per chunk; ASGI iterates the body within the request's
+        # thread-sensitive context.
+        stack = contextlib.ExitStack()
+        await sync_to_async(_install)(stack, self.timer)
+        try:
+            async for chunk in self.content:
+                self.size += len(chunk)
+                yield chunk
+        finally:
+            await sync_to_async(stack.close)()
+            self.close()
+
+
+def _install(stack, timer):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(timer))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 01:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_alter_vote_value'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prompt',
+            index=models.Index(fields=['-created_at', '-id'], name='prompt_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prompt',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='prompt_status_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-18 01:56
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# The trigger keeps search_vector current on every INSERT/UPDATE, including
+# bulk_create() and queryset.update(), which bypass Model.save().
+CREATE_SQL = """
+CREATE OR REPLACE FUNCTION api_prompt_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.prompt_description, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.prompt_text, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_prompt_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, prompt_description, prompt_text
+    ON api_prompt
+    FOR EACH ROW EXECUTE FUNCTION api_prompt_search_vector_update();
+
+UPDATE api_prompt SET title = title;
+
+CREATE INDEX IF NOT EXISTS api_prompt_search_vector_gin
+    ON api_prompt USING gin (search_vector);
+"""
+
+DROP_SQL = """
+DROP INDEX IF EXISTS api_prompt_search_vector_gin;
+DROP TRIGGER IF EXISTS api_prompt_search_vector_trigger ON api_prompt;
+DROP FUNCTION IF EXISTS api_prompt_search_vector_update();
+"""
+
+
+def install_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_SQL)
+
+
+def remove_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_prompt_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prompt',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(install_search_trigger, remove_search_trigger),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, transaction
+
+
+def install_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # CREATE EXTENSION needs elevated privileges on some hosts. If it fails,
+    # /api/prompts/suggest/ falls back to its in-process trigram index.
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except Exception:
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS api_prompt_title_trgm '
+        'ON api_prompt USING gin (title gin_trgm_ops)'
+    )
+
+
+def remove_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS api_prompt_title_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_prompt_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_trigram_index, remove_trigram_index),
+    ]
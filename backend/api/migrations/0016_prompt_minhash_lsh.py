@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_prompt_title_trigram_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PromptSignature',
+            fields=[
+                ('prompt', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='api.prompt')),
+                ('minhash', models.BinaryField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='prompt',
+            name='possible_duplicates',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.CreateModel(
+            name='PromptLSHBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.SmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('prompt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_buckets', to='api.prompt')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['band', 'bucket'], name='lsh_band_bucket_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:03
+
+from django.db import migrations, models
+
+
+def create_catalog_state(apps, schema_editor):
+    CatalogState = apps.get_model('api', 'CatalogState')
+    CatalogState.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_prompt_vote_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generation', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_catalog_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,147 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:12
+
+import difflib
+import hashlib
+import json
+import re
+import zlib
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# The api.versioning codec as of this migration.
+BODY_FIELDS = ('prompt_description', 'prompt_text', 'guidance')
+TOKEN_RE = re.compile(r'\w+|\W')
+
+
+def encode_body(values):
+    return json.dumps([values.get(f) for f in BODY_FIELDS], ensure_ascii=False, separators=(',', ':'))
+
+
+def body_digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def make_delta(base, text):
+    a, b = TOKEN_RE.findall(base), TOKEN_RE.findall(text)
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b).get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append(''.join(b[j1:j2]))
+    return ops
+
+
+def apply_delta(base, ops):
+    tokens = TOKEN_RE.findall(base)
+    return ''.join(op if isinstance(op, str) else ''.join(tokens[op[0]:op[1]]) for op in ops)
+
+
+def pack(payload):
+    return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def unpack(data):
+    return json.loads(zlib.decompress(bytes(data)).decode('utf-8'))
+
+
+def store_body(PromptContent, text, base, base_text):
+    digest = body_digest(text)
+    existing = PromptContent.objects.filter(digest=digest).first()
+    if existing is not None:
+        return existing
+    full = pack(text)
+    fields = {'base': None, 'depth': 0, 'data': full, 'size': len(text)}
+    if base is not None and base.depth + 1 < getattr(settings, 'PROMPT_VERSION_KEYFRAME_INTERVAL', 16):
+        delta = pack(make_delta(base_text, text))
+        if len(delta) < len(full):
+            fields.update(base=base, depth=base.depth + 1, data=delta)
+    return PromptContent.objects.create(digest=digest, **fields)
+
+
+def load_body(PromptContent, content):
+    chain = [content]
+    while chain[-1].base_id is not None:
+        chain.append(PromptContent.objects.get(pk=chain[-1].base_id))
+    text = None
+    for row in reversed(chain):
+        payload = unpack(row.data)
+        text = payload if row.base_id is None else apply_delta(text, payload)
+    return dict(zip(BODY_FIELDS, json.loads(text)))
+
+
+def compress_versions(apps, schema_editor):
+    """
+    Move every version's description/text/guidance into PromptContent,
+    delta-chained per prompt in edit order.
+    """
+    PromptVersion = apps.get_model('api', 'PromptVersion')
+    PromptContent = apps.get_model('api', 'PromptContent')
+    prompt_ids = PromptVersion.objects.order_by().values_list('prompt_id', flat=True).distinct()
+    for prompt_id in list(prompt_ids):
+        base = base_text = None
+        versions = PromptVersion.objects.filter(prompt_id=prompt_id).order_by('version_created_at', 'id')
+        for version in versions:
+            text = encode_body({f: getattr(version, f) for f in BODY_FIELDS})
+            content = store_body(PromptContent, text, base, base_text)
+            PromptVersion.objects.filter(pk=version.pk).update(content=content)
+            base, base_text = content, text
+
+
+def expand_versions(apps, schema_editor):
+    PromptVersion = apps.get_model('api', 'PromptVersion')
+    PromptContent = apps.get_model('api', 'PromptContent')
+    for version in PromptVersion.objects.select_related('content').exclude(content=None):
+        PromptVersion.objects.filter(pk=version.pk).update(**load_body(PromptContent, version.content))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_catalog_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PromptContent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('depth', models.PositiveSmallIntegerField(default=0)),
+                ('data', models.BinaryField()),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('base', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.promptcontent')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='promptversion',
+            name='content',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='versions', to='api.promptcontent'),
+        ),
+        migrations.RunPython(compress_versions, expand_versions),
+        # A default lets the column be re-added on existing rows when unapplying.
+        migrations.AlterField(
+            model_name='promptversion',
+            name='prompt_text',
+            field=models.TextField(default=''),
+        ),
+        migrations.RemoveField(
+            model_name='promptversion',
+            name='guidance',
+        ),
+        migrations.RemoveField(
+            model_name='promptversion',
+            name='prompt_description',
+        ),
+        migrations.RemoveField(
+            model_name='promptversion',
+            name='prompt_text',
+        ),
+        migrations.AlterField(
+            model_name='promptversion',
+            name='content',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='versions', to='api.promptcontent'),
+        ),
+    ]
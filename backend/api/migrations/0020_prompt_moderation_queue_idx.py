@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_prompt_content'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prompt',
+            index=models.Index(condition=models.Q(('status__in', ('pending', 'pending_deletion'))), fields=['created_at', 'id'], name='prompt_moderation_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:00
+
+from django.db import migrations, models
+from django.db.models import Count
+
+FACET_FIELDS = ('category', 'task_type', 'output_format', 'status')
+
+
+def fill_facet_counts(apps, schema_editor):
+    Prompt = apps.get_model('api', 'Prompt')
+    PromptFacetCount = apps.get_model('api', 'PromptFacetCount')
+    PromptFacetCount.objects.bulk_create(
+        PromptFacetCount(count=row.pop('n'), **row)
+        for row in Prompt.objects.order_by().values(*FACET_FIELDS).annotate(n=Count('id'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_prompt_moderation_queue_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PromptFacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=50)),
+                ('task_type', models.CharField(max_length=50)),
+                ('output_format', models.CharField(max_length=50)),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('category', 'task_type', 'output_format', 'status'), name='unique_prompt_facet_combination')],
+            },
+        ),
+        migrations.RunPython(fill_facet_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:05
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def score_prompts(apps, schema_editor):
+    # api.ranking.score() as of this migration.
+    Prompt = apps.get_model('api', 'Prompt')
+    gravity = getattr(settings, 'PROMPT_HOT_GRAVITY', 1.8)
+    now = timezone.now()
+    prompts = []
+    for pk, votes, created_at in Prompt.objects.exclude(vote=0).values_list('id', 'vote', 'created_at'):
+        hours = max((now - created_at).total_seconds(), 0) / 3600
+        prompts.append(Prompt(pk=pk, hot_score=votes / (hours + 2) ** gravity))
+    Prompt.objects.bulk_update(prompts, ['hot_score'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_prompt_facet_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prompt',
+            name='hot_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='prompt',
+            index=models.Index(fields=['status', '-hot_score', '-id'], name='prompt_status_hot_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prompt',
+            index=models.Index(fields=['status', '-vote', '-id'], name='prompt_status_vote_id_idx'),
+        ),
+        migrations.RunPython(score_prompts, migrations.RunPython.noop),
+    ]
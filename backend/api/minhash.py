@@ -0,0 +1,202 @@
+# api/minhash.py
+"""
+Near-duplicate detection for submitted prompts with MinHash + LSH.
+
+Each prompt is reduced to a set of word 3-gram shingles, summarised as a
+128-value MinHash signature (PromptSignature) and split into 32 bands of
+4 values. Every band is hashed to a bucket (PromptLSHBucket). Two prompts
+land in the same bucket of at least one band with high probability when
+their Jaccard similarity is high, so finding candidates is an indexed
+lookup on (band, bucket) instead of a scan of every prompt. Candidates are
+then checked against the configured threshold using their signatures.
+
+The hashing helpers at the top are pure NumPy so the bulk management
+command can run them in a process pool.
+"""
+import hashlib
+import re
+
+import numpy as np
+from django.conf import settings
+
+NUM_PERM = 128
+BANDS = 32
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+WORD_RE = re.compile(r'[^\W_]+')
+
+# Fixed seed: signatures must be comparable across processes and deploys.
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, np.iinfo(np.int64).max, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+_B = _rng.randint(0, np.iinfo(np.int64).max, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+
+
+def shingles(text):
+    words = WORD_RE.findall((text or '').lower())
+    if len(words) < SHINGLE_SIZE:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def prompt_text(title, description, text):
+    return ' '.join(part for part in (title, description, text) if part)
+
+
+def signature(text):
+    """
+    MinHash signature of `text` as a uint32 array of NUM_PERM values.
+    """
+    grams = shingles(text)
+    if not grams:
+        return np.full(NUM_PERM, MAX_HASH, dtype=np.uint32)
+    hashed = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(g.encode('utf-8'), digest_size=4).digest(), 'little') for g in grams),
+        dtype=np.uint64,
+        count=len(grams),
+    )
+    # (a * x + b) mod p, one row per permutation; uint64 wrap-around is fine
+    # here, it only needs to behave like a random hash family.
+    with np.errstate(over='ignore'):
+        permuted = (np.outer(_A, hashed) + _B[:, None]) % MERSENNE_PRIME
+    return (permuted & MAX_HASH).min(axis=1).astype(np.uint32)
+
+
+def band_buckets(sig):
+    """
+    One signed 64-bit bucket id per band.
+    """
+    buckets = []
+    for band in range(BANDS):
+        chunk = sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes()
+        digest = hashlib.blake2b(chunk, digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, 'little', signed=True))
+    return buckets
+
+
+def similarity(sig_a, sig_b):
+    """
+    Estimated Jaccard similarity of the shingle sets behind two signatures.
+    """
+    return float(np.count_nonzero(sig_a == sig_b)) / NUM_PERM
+
+
+def signatures_for(rows):
+    """
+    [(id, title, description, text), ...] -> [(id, signature bytes), ...].
+    Used by the process pool in `build_minhash_signatures`.
+    """
+    return [(pk, signature(prompt_text(t, d, x)).tobytes()) for pk, t, d, x in rows]
+
+
+def from_bytes(raw):
+    return np.frombuffer(bytes(raw), dtype=np.uint32)
+
+
+# --- database side ---
+
+def threshold():
+    return getattr(settings, 'PROMPT_DUPLICATE_THRESHOLD', 0.8)
+
+
+def find_duplicates(sig, exclude=None, min_similarity=None, limit=5):
+    """
+    Existing prompts whose estimated Jaccard similarity with `sig` is at
+    least `min_similarity`, best first, as {'id', 'title', 'status',
+    'similarity'} dicts.
+    """
+    from django.db.models import Q
+    from .models import PromptLSHBucket, PromptSignature
+
+    if min_similarity is None:
+        min_similarity = threshold()
+    condition = Q()
+    for band, bucket in enumerate(band_buckets(sig)):
+        condition |= Q(band=band, bucket=bucket)
+    candidates = PromptLSHBucket.objects.filter(condition)
+    if exclude is not None:
+        candidates = candidates.exclude(prompt_id=exclude)
+    candidate_ids = set(candidates.values_list('prompt_id', flat=True))
+    if not candidate_ids:
+        return []
+
+    matches = []
+    rows = PromptSignature.objects.filter(prompt_id__in=candidate_ids).values_list(
+        'prompt_id', 'prompt__title', 'prompt__status', 'minhash'
+    )
+    for pk, title, status, raw in rows:
+        score = similarity(sig, from_bytes(raw))
+        if score >= min_similarity:
+            matches.append({'id': pk, 'title': title, 'status': status, 'similarity': round(score, 3)})
+    matches.sort(key=lambda m: (-m['similarity'], m['id']))
+    return matches[:limit]
+
+
+def store_signature(prompt_id, sig):
+    from django.db import transaction
+    from .models import PromptLSHBucket, PromptSignature
+
+    with transaction.atomic():
+        PromptSignature.objects.update_or_create(prompt_id=prompt_id, defaults={'minhash': sig.tobytes()})
+        PromptLSHBucket.objects.filter(prompt_id=prompt_id).delete()
+        PromptLSHBucket.objects.bulk_create([
+            PromptLSHBucket(prompt_id=prompt_id, band=band, bucket=bucket)
+            for band, bucket in enumerate(band_buckets(sig))
+        ])
+
+
+def store_signatures(results):
+    """
+    Bulk version of store_signature for [(prompt id, signature bytes), ...]
+    as returned by `signatures_for`.
+    """
+    from django.db import transaction
+    from .models import PromptLSHBucket, PromptSignature
+
+    ids = [pk for pk, _ in results]
+    with transaction.atomic():
+        PromptSignature.objects.filter(prompt_id__in=ids).delete()
+        PromptLSHBucket.objects.filter(prompt_id__in=ids).delete()
+        PromptSignature.objects.bulk_create([
+            PromptSignature(prompt_id=pk, minhash=raw) for pk, raw in results
+        ])
+        _insert_buckets([
+            (pk, band, bucket)
+            for pk, raw in results
+            for band, bucket in enumerate(band_buckets(from_bytes(raw)))
+        ])
+
+
+def _insert_buckets(rows):
+    """
+    Insert (prompt id, band, bucket) rows without building a model instance
+    per row (there are BANDS of them per prompt): one array INSERT on
+    Postgres, an executemany elsewhere.
+    """
+    from django.db import connection
+    from .models import PromptLSHBucket
+
+    if not rows:
+        return
+    table = connection.ops.quote_name(PromptLSHBucket._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"INSERT INTO {table} (prompt_id, band, bucket) "
+                "SELECT * FROM unnest(%s::bigint[], %s::smallint[], %s::bigint[])",
+                [list(column) for column in zip(*rows)],
+            )
+        else:
+            cursor.executemany(f"INSERT INTO {table} (prompt_id, band, bucket) VALUES (%s, %s, %s)", rows)
+
+
+def check_prompt(prompt):
+    """
+    Index `prompt` and return the existing prompts it nearly duplicates.
+    """
+    sig = signature(prompt_text(prompt.title, prompt.prompt_description, prompt.prompt_text))
+    duplicates = find_duplicates(sig, exclude=prompt.pk)
+    store_signature(prompt.pk, sig)
+    return duplicates
@@ -2,7 +2,13 @@ from django.db import models
 
 from django.conf import settings
 
-from django.db.models import UniqueConstraint
+from django.db.models import UniqueConstraint, Case, Exists, F, OuterRef, Q, Subquery, Sum, Value, When
+
+from django.db.models.functions import Coalesce
+
+from django.contrib.postgres.search import SearchVectorField
+
+from django.utils.functional import cached_property
  
 # These choices are for your dropdowns
 
@@ -81,8 +87,89 @@ STATUS_CHOICES = [
     ('pending_deletion', 'Pending Deletion'),
 
 ]
+
+# Statuses waiting for an admin (see the moderation queue in api/views.py).
+
+MODERATION_STATUSES = ('pending', 'pending_deletion')
+
+# Columns GET /api/prompts/facets/ counts by (see api/facets.py).
+
+FACET_FIELDS = ('category', 'task_type', 'output_format', 'status')
  
  
+class PromptQuerySet(models.QuerySet):
+
+    def with_vote_stats(self, user=None):
+
+        """
+
+        Annotate every row with what PromptSerializer needs, so a list is a
+
+        single query instead of ~6 queries per prompt:
+
+        vote totals, like/dislike counts, and (for an authenticated user)
+
+        their own vote and bookmark state. Also joins the author row.
+
+        """
+
+        # Totals are the counter columns plus, for sharded hot prompts, the sum
+
+        # of their shard rows. Neither depends on how many votes a prompt has.
+
+        shards = PromptVoteShard.objects.filter(prompt=OuterRef('pk')).order_by().values('prompt')
+
+        def counter(field):
+
+            shard_sum = Subquery(shards.annotate(total=Sum(field)).values('total')[:1])
+
+            return Case(
+
+                When(vote_shards=0, then=F(field)),
+
+                default=F(field) + Coalesce(shard_sum, Value(0)),
+
+                output_field=models.IntegerField(),
+
+            )
+
+        qs = self.select_related('user').annotate(
+
+            annotated_vote_count=counter('vote'),
+
+            annotated_like_count=counter('like_count'),
+
+            annotated_dislike_count=counter('dislike_count'),
+
+        )
+
+        if user is not None and user.is_authenticated:
+
+            qs = qs.annotate(
+
+                annotated_user_vote=Coalesce(
+
+                    Subquery(
+
+                        Vote.objects.filter(prompt=OuterRef('pk'), user_id=user.pk).values('value')[:1]
+
+                    ),
+
+                    Value(0),
+
+                ),
+
+                annotated_is_bookmarked=Exists(
+
+                    Bookmark.objects.filter(prompt=OuterRef('pk'), user_id=user.pk)
+
+                ),
+
+            )
+
+        return qs
+
+
 class Prompt(models.Model):
 
     user = models.ForeignKey(
@@ -131,9 +218,59 @@ class Prompt(models.Model):
 
     dislike_count = models.IntegerField(default=0)
 
+    # 0: vote counters live in the three columns above. N > 0: votes are spread
+
+    # over N PromptVoteShard rows, summed on read (see api/counters.py).
+
+    vote_shards = models.PositiveSmallIntegerField(default=0)
+
+    # Time-decayed vote score behind ?ordering=hot (see api/ranking.py).
+
+    hot_score = models.FloatField(default=0)
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     updated_at = models.DateTimeField(auto_now=True)
+
+    # Weighted tsvector (title > description > text) kept current by a Postgres
+
+    # trigger and indexed with GIN; unused on SQLite (see api/search.py).
+
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Near-duplicates found by MinHash/LSH when this prompt was last saved
+
+    # through the API: [{id, title, status, similarity}, ...] (see api/minhash.py)
+
+    possible_duplicates = models.JSONField(default=list, blank=True, editable=False)
+
+    objects = PromptQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The facet values as stored, so a save can move this row's count in
+        # the facet rollup (see api/facets.py).
+        instance._stored_facets = tuple(instance.__dict__.get(name) for name in FACET_FIELDS)
+        return instance
+
+    class Meta:
+
+        # Backing indexes for the keyset-paginated list (see api/pagination.py)
+
+        indexes = [
+
+            models.Index(fields=['-created_at', '-id'], name='prompt_created_id_idx'),
+
+            models.Index(fields=['status', '-created_at', '-id'], name='prompt_status_created_id_idx'),
+            # The moderation queue, oldest first; only covers the rows waiting for review.
+            models.Index(fields=['created_at', 'id'], name='prompt_moderation_queue_idx',
+                         condition=Q(status__in=MODERATION_STATUSES)),
+            # ?ordering=hot and ?ordering=top over the approved library.
+            models.Index(fields=['status', '-hot_score', '-id'], name='prompt_status_hot_id_idx'),
+            models.Index(fields=['status', '-vote', '-id'], name='prompt_status_vote_id_idx'),
+
+        ]
  
     def __str__(self):
 
@@ -216,6 +353,31 @@ class Bookmark(models.Model):
         return f"user={self.user_id} prompt={self.prompt_id}"
  
  
+class PromptContent(models.Model):
+
+    """
+
+    Content-addressed, compressed body of a PromptVersion (see api/versioning.py):
+
+    a full keyframe when `base` is empty, otherwise a delta against `base`.
+
+    """
+
+    digest = models.CharField(max_length=64, unique=True)
+
+    base = models.ForeignKey("self", on_delete=models.PROTECT, null=True, blank=True, related_name="+")
+
+    depth = models.PositiveSmallIntegerField(default=0)
+
+    data = models.BinaryField()
+
+    size = models.PositiveIntegerField(default=0)
+ 
+    def __str__(self):
+
+        return f"content {self.digest[:12]} (depth {self.depth})"
+ 
+ 
 class PromptVersion(models.Model):
 
     """
@@ -224,6 +386,10 @@ class PromptVersion(models.Model):
 
     This creates an audit trail.
 
+    The small fields are stored inline; the description, text and guidance
+
+    live in a shared PromptContent and are rebuilt on first access.
+
     """
 
     prompt = models.ForeignKey(
@@ -252,18 +418,14 @@ class PromptVersion(models.Model):
 
     title = models.CharField(max_length=255)
 
-    prompt_description = models.TextField(blank=True, null=True)
-
-    prompt_text = models.TextField()
-
-    guidance = models.TextField(blank=True, null=True)
-
     task_type = models.CharField(max_length=50, choices=TASK_TYPE_CHOICES)
 
     output_format = models.CharField(max_length=50, choices=OUTPUT_FORMAT_CHOICES)
 
     category = models.CharField(max_length=50)
 
+    content = models.ForeignKey(PromptContent, on_delete=models.PROTECT, related_name="versions")
+
     class Meta:
 
         ordering = ['-version_created_at']
@@ -272,4 +434,155 @@ class PromptVersion(models.Model):
 
         return f"{self.prompt.title} (Version @ {self.version_created_at.strftime('%Y-%m-%d %H:%M')})"
 
- 
\ No newline at end of file
+    @cached_property
+    def body(self):
+
+        from .versioning import load_body
+
+        return load_body(self.content)
+
+    @property
+    def prompt_description(self):
+
+        return self.body['prompt_description']
+
+    @property
+    def prompt_text(self):
+
+        return self.body['prompt_text']
+
+    @property
+    def guidance(self):
+
+        return self.body['guidance']
+ 
+ 
+class PromptSignature(models.Model):
+
+    """
+
+    MinHash signature of a prompt's text (NUM_PERM uint32 values as bytes).
+
+    """
+
+    prompt = models.OneToOneField(Prompt, on_delete=models.CASCADE, primary_key=True, related_name="signature")
+
+    minhash = models.BinaryField()
+ 
+    def __str__(self):
+
+        return f"signature prompt={self.prompt_id}"
+ 
+ 
+class PromptLSHBucket(models.Model):
+
+    """
+
+    One row per (prompt, LSH band): prompts sharing a (band, bucket) pair are
+
+    near-duplicate candidates.
+
+    """
+
+    prompt = models.ForeignKey(Prompt, on_delete=models.CASCADE, related_name="lsh_buckets")
+
+    band = models.SmallIntegerField()
+
+    bucket = models.BigIntegerField()
+ 
+    class Meta:
+
+        indexes = [
+
+            models.Index(fields=['band', 'bucket'], name='lsh_band_bucket_idx'),
+
+        ]
+ 
+    def __str__(self):
+
+        return f"prompt={self.prompt_id} band={self.band} bucket={self.bucket}"
+ 
+ 
+class PromptVoteShard(models.Model):
+
+    """
+
+    One of N counter rows for a hot prompt. The prompt's visible counts are
+
+    its own columns plus the sum over its shards.
+
+    """
+
+    prompt = models.ForeignKey(Prompt, on_delete=models.CASCADE, related_name="vote_counter_shards")
+
+    shard = models.PositiveSmallIntegerField()
+
+    like_count = models.IntegerField(default=0)
+
+    dislike_count = models.IntegerField(default=0)
+
+    vote = models.IntegerField(default=0)
+ 
+    class Meta:
+
+        constraints = [
+
+            UniqueConstraint(fields=["prompt", "shard"], name="unique_prompt_vote_shard")
+
+        ]
+ 
+    def __str__(self):
+
+        return f"prompt={self.prompt_id} shard={self.shard}"
+ 
+ 
+class PromptFacetCount(models.Model):
+
+    """
+
+    Rollup of how many prompts share each (category, task type, output
+
+    format, status) combination, kept current by api/facets.py so facet
+
+    counts read one row per combination instead of scanning api_prompt.
+
+    """
+
+    category = models.CharField(max_length=50)
+
+    task_type = models.CharField(max_length=50)
+
+    output_format = models.CharField(max_length=50)
+
+    status = models.CharField(max_length=20)
+
+    count = models.IntegerField(default=0)
+ 
+    class Meta:
+
+        constraints = [
+
+            UniqueConstraint(fields=list(FACET_FIELDS), name="unique_prompt_facet_combination")
+
+        ]
+ 
+    def __str__(self):
+
+        return f"{'/'.join(getattr(self, name) for name in FACET_FIELDS)}: {self.count}"
+ 
+ 
+class CatalogState(models.Model):
+
+    """
+
+    Single row (pk=1) holding the catalog generation: bumped whenever the
+
+    approved library changes, and part of every response-cache key.
+
+    """
+
+    generation = models.BigIntegerField(default=0)
+ 
+    def __str__(self):
+
+        return f"catalog generation {self.generation}"
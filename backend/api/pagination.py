@@ -0,0 +1,211 @@
+# api/pagination.py
+import base64
+import datetime
+import decimal
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Keyset ("seek") pagination over a fixed, unique ordering.
+
+    The cursor stores the ordering values of the last row we returned, so the
+    next page is a `WHERE (created_at, id) < (...)` range scan instead of an
+    OFFSET. Page N costs the same as page 1.
+
+    The ordering must end in a unique column (usually `id`) so that rows
+    sharing the same `created_at` are never skipped or repeated.
+    Views can override the ordering per request with `get_cursor_ordering()`.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = getattr(settings, 'PROMPT_PAGE_SIZE', 20)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'PROMPT_MAX_PAGE_SIZE', 100)
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self._page_queryset(queryset, request, view)
+        return self._set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self._page_queryset(queryset, request, view)
+        return self._set_page([row async for row in queryset])
+
+    def _page_queryset(self, queryset, request, view):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(view)
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            self.cursor_values, self.reverse = self.decode_cursor(encoded)
+        else:
+            self.cursor_values, self.reverse = None, False
+
+        if self.reverse:
+            queryset = queryset.order_by(*[self._flip(f) for f in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if self.cursor_values is not None:
+            queryset = queryset.filter(self._seek_filter(self.cursor_values, self.reverse))
+
+        # Fetch one extra row to know whether there is a page beyond this one.
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if self.reverse:
+            rows.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor_values is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        raw = request.query_params.get(self.page_size_query_param)
+        if raw is None:
+            return self.page_size
+        try:
+            size = int(raw)
+        except (TypeError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, view):
+        if view is not None and hasattr(view, 'get_cursor_ordering'):
+            return tuple(view.get_cursor_ordering())
+        return tuple(self.ordering)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Walked past the end; the previous page starts from the top again.
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self._link(self.page[0], reverse=True)
+
+    # --- cursor encoding ---
+
+    def encode_cursor(self, values, reverse):
+        payload = {'v': [self._json_value(v) for v in values]}
+        if reverse:
+            payload['r'] = 1
+        raw = json.dumps(payload, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, encoded):
+        try:
+            raw = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8')
+            payload = json.loads(raw)
+            values = payload['v']
+            reverse = bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    # --- helpers ---
+
+    def _link(self, row, reverse):
+        values = [getattr(row, self._field(f)) for f in self.ordering]
+        cursor = self.encode_cursor(values, reverse)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    @staticmethod
+    def _json_value(value):
+        # Full-precision isoformat: DjangoJSONEncoder truncates microseconds,
+        # which would make the cursor skip rows created in the same millisecond.
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            return value.isoformat()
+        if isinstance(value, decimal.Decimal):
+            return str(value)
+        return value
+
+    @staticmethod
+    def _field(ordering):
+        return ordering.lstrip('-')
+
+    @staticmethod
+    def _flip(ordering):
+        return ordering[1:] if ordering.startswith('-') else '-' + ordering
+
+    def _seek_filter(self, values, reverse):
+        """
+        Expand the row-value comparison `(a, b, c) < (x, y, z)` into
+        `a < x OR (a = x AND b < y) OR (a = x AND b = y AND c < z)`,
+        honouring the direction of every ordering column.
+        """
+        condition = Q()
+        for i, ordering in enumerate(self.ordering):
+            descending = ordering.startswith('-')
+            if reverse:
+                descending = not descending
+            lookup = 'lt' if descending else 'gt'
+            clause = Q(**{f'{self._field(ordering)}__{lookup}': values[i]})
+            for j in range(i):
+                clause &= Q(**{self._field(self.ordering[j]): values[j]})
+            condition |= clause
+        return condition
+
+
+class VersionCursorPagination(KeysetCursorPagination):
+    """
+    Keyset pagination for a prompt's edit history, newest first.
+    """
+    ordering = ('-version_created_at', '-id')
+
+    def get_ordering(self, view):
+        return tuple(type(self).ordering)
+
+
+class ModerationCursorPagination(KeysetCursorPagination):
+    """
+    Keyset pagination for the moderation queue, oldest submission first.
+    """
+    ordering = ('created_at', 'id')
+
+    def get_ordering(self, view):
+        return tuple(type(self).ordering)
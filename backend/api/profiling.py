@@ -0,0 +1,315 @@
+# api/profiling.py
+"""
+On-demand request profiler.
+
+`ProfilerMiddleware` runs the view under cProfile and records every SQL
+statement with its duration when
+
+  * an authenticated staff user sends the `X-Profile: 1` header, or
+  * the request is picked by sampling (settings.PROMPT_PROFILE_SAMPLE_RATE
+    = N profiles one request in N; 0 disables sampling).
+
+Statements slower than PROMPT_PROFILE_EXPLAIN_MS are explained after the
+view returns: `EXPLAIN (ANALYZE, BUFFERS)` for SELECTs on Postgres, a plain
+EXPLAIN for anything that would modify data or take locks, and `EXPLAIN
+QUERY PLAN` on SQLite. ANALYZE is skipped for statements with side effects
+even when they read (nextval/setval, data-modifying CTEs).
+
+Bind parameters are kept in memory for EXPLAIN but only written to the
+report when PROMPT_PROFILE_CAPTURE_PARAMS is set, and never for statements
+on auth_user (password hashes).
+
+Each profile is written as a bundle to PROMPT_PROFILE_DIR/<id>/:
+report.json (request, timings, SQL, plans), profile.pstats (for snakeviz
+and friends) and profile.txt (top functions by cumulative time). Only the
+newest PROMPT_PROFILE_KEEP bundles are kept. Admins list and read them at
+/api/profiles/.
+
+The middleware hooks in through `process_view`, so it wraps any view
+(PromptViewSet, BookmarkToggleView, ...) without the view knowing. It must
+be last in MIDDLEWARE.
+"""
+import contextlib
+import cProfile
+import datetime
+import io
+import itertools
+import json
+import os
+import pstats
+import re
+import shutil
+import time
+import uuid
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+HEADER = 'HTTP_X_PROFILE'
+REPORT_ID_RE = re.compile(r'^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$')
+
+_counter = itertools.count(1)
+
+
+def profile_dir():
+    return getattr(settings, 'PROMPT_PROFILE_DIR', os.path.join(settings.BASE_DIR, 'var', 'profiles'))
+
+
+def sample_rate():
+    return getattr(settings, 'PROMPT_PROFILE_SAMPLE_RATE', 0)
+
+
+def explain_threshold_ms():
+    return getattr(settings, 'PROMPT_PROFILE_EXPLAIN_MS', 100)
+
+
+def keep():
+    return getattr(settings, 'PROMPT_PROFILE_KEEP', 200)
+
+
+def capture_params():
+    return getattr(settings, 'PROMPT_PROFILE_CAPTURE_PARAMS', False)
+
+
+def _requested_by_staff(request):
+    """
+    Authenticate the request the way DRF will (JWT), since Django's
+    AuthenticationMiddleware only knows about sessions.
+    """
+    if request.META.get(HEADER, '').lower() not in ('1', 'true', 'yes'):
+        return False
+    drf_request = Request(
+        request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    )
+    try:
+        user = drf_request.user
+    except APIException:
+        return False
+    return bool(user and user.is_staff)
+
+
+def _sampled():
+    rate = sample_rate()
+    return bool(rate) and next(_counter) % rate == 0
+
+
+# --- SQL capture ---
+
+class QueryRecorder:
+    def __init__(self, alias):
+        self.alias = alias
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': self.alias,
+                'sql': sql,
+                'params': None if many else params,  # raw, for EXPLAIN
+                'many': many,
+                'ms': round((time.perf_counter() - started) * 1000, 3),
+            })
+
+
+_SENSITIVE_RE = re.compile(r'\bauth_user\b', re.IGNORECASE)
+
+
+def reported(query):
+    """
+    The query as written to report.json: parameters JSON-encoded, or
+    redacted unless capture is enabled.
+    """
+    params = query['params']
+    if params is not None and (not capture_params() or _SENSITIVE_RE.search(query['sql'])):
+        params = '[redacted]'
+    else:
+        params = _jsonable(params)
+    return {**query, 'params': params}
+
+
+def _jsonable(params):
+    if params is None:
+        return None
+    try:
+        json.dumps(params)
+        return params
+    except TypeError:
+        return [repr(p) for p in params] if isinstance(params, (list, tuple)) else repr(params)
+
+
+_READ_ONLY_RE = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+_LOCKING_RE = re.compile(r'\bFOR\s+(NO\s+KEY\s+)?(UPDATE|SHARE)\b', re.IGNORECASE)
+_SIDE_EFFECT_RE = re.compile(r'\b(nextval|setval)\s*\(', re.IGNORECASE)
+_MODIFYING_RE = re.compile(r'\b(INSERT|UPDATE|DELETE|MERGE)\b', re.IGNORECASE)
+
+
+def _analyzable(sql):
+    if not _READ_ONLY_RE.match(sql) or _LOCKING_RE.search(sql) or _SIDE_EFFECT_RE.search(sql):
+        return False
+    # WITH ... AS (DELETE ... RETURNING ...) SELECT ... would really run.
+    return not (sql.lstrip()[:4].upper() == 'WITH' and _MODIFYING_RE.search(sql))
+
+
+def explain(query):
+    """
+    Plan of a captured statement, as text. Only read-only statements are
+    re-executed (EXPLAIN ANALYZE); the rest are merely planned. executemany
+    batches have no single parameter set and are not explained.
+    """
+    if query['many']:
+        return None
+    connection = connections[query['alias']]
+    sql, params = query['sql'], query['params']
+    if connection.vendor == 'postgresql':
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS) ' if _analyzable(sql) else 'EXPLAIN '
+    elif connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    else:
+        prefix = 'EXPLAIN '
+    try:
+        with transaction.atomic(using=query['alias']), connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            rows = cursor.fetchall()
+    except (DatabaseError, TypeError, ValueError) as exc:
+        return f'EXPLAIN failed: {exc}'
+    return '\n'.join(' '.join(str(col) for col in row) for row in rows)
+
+
+# --- bundles ---
+
+def _new_report_id():
+    return f"{datetime.datetime.now(datetime.timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+
+def write_bundle(report, profiler):
+    directory = os.path.join(profile_dir(), report['id'])
+    os.makedirs(directory, exist_ok=True)
+    profiler.dump_stats(os.path.join(directory, 'profile.pstats'))
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(50)
+    with open(os.path.join(directory, 'profile.txt'), 'w') as fh:
+        fh.write(text.getvalue())
+    with open(os.path.join(directory, 'report.json'), 'w') as fh:
+        json.dump(report, fh, indent=2, default=str)
+    prune()
+    return directory
+
+
+def prune():
+    ids = sorted(list_report_ids(), reverse=True)
+    for report_id in ids[keep():]:
+        shutil.rmtree(os.path.join(profile_dir(), report_id), ignore_errors=True)
+
+
+def list_report_ids():
+    try:
+        names = os.listdir(profile_dir())
+    except FileNotFoundError:
+        return []
+    return [name for name in names if REPORT_ID_RE.match(name)]
+
+
+def load_report(report_id):
+    if not REPORT_ID_RE.match(report_id):
+        return None
+    try:
+        with open(os.path.join(profile_dir(), report_id, 'report.json')) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def summary(report):
+    return {
+        key: report.get(key)
+        for key in ('id', 'created_at', 'method', 'path', 'view', 'user', 'trigger',
+                    'status', 'duration_ms', 'query_count', 'sql_ms', 'slow_queries')
+    }
+
+
+def recent_reports(limit=50):
+    reports = []
+    for report_id in sorted(list_report_ids(), reverse=True)[:limit]:
+        report = load_report(report_id)
+        if report is not None:
+            reports.append(summary(report))
+    return reports
+
+
+# --- middleware ---
+
+class ProfilerMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if _requested_by_staff(request):
+            trigger = 'header'
+        elif _sampled():
+            trigger = 'sample'
+        else:
+            return None
+        return self.profile(request, view_func, view_args, view_kwargs, trigger)
+
+    def profile(self, request, view_func, view_args, view_kwargs, trigger):
+        recorders = [QueryRecorder(alias) for alias in connections]
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            for recorder in recorders:
+                stack.enter_context(connections[recorder.alias].execute_wrapper(recorder))
+            if iscoroutinefunction(view_func):
+                # Async views run on the event loop; only their sync parts
+                # (ORM calls) are seen by cProfile, which is per-thread.
+                view_func = async_to_sync(view_func)
+            profiler.enable()
+            try:
+                response = view_func(request, *view_args, **view_kwargs)
+                if hasattr(response, 'render') and callable(response.render):
+                    response = response.render()
+            finally:
+                profiler.disable()
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        queries = [q for r in recorders for q in r.queries]
+        threshold = explain_threshold_ms()
+        for query in queries:
+            if query['ms'] >= threshold:
+                query['explain'] = explain(query)
+
+        user = getattr(request, 'user', None)
+        match = request.resolver_match
+        report = {
+            'id': _new_report_id(),
+            'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': match.view_name if match else None,
+            'user': user.get_username() if user is not None and user.is_authenticated else None,
+            'trigger': trigger,
+            'status': response.status_code,
+            'duration_ms': round(duration_ms, 3),
+            'query_count': len(queries),
+            'sql_ms': round(sum(q['ms'] for q in queries), 3),
+            'slow_queries': sum(1 for q in queries if 'explain' in q),
+            'explain_threshold_ms': threshold,
+            'queries': [reported(q) for q in queries],
+        }
+        write_bundle(report, profiler)
+        response['X-Profile-Id'] = report['id']
+        return response
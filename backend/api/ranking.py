@@ -0,0 +1,75 @@
+# api/ranking.py
+"""
+"Hot" ranking for ?ordering=hot: a prompt's net votes divided by
+(age in hours + 2) ** PROMPT_HOT_GRAVITY, as on Hacker News.
+
+The score is materialized in Prompt.hot_score, indexed with status and id,
+so the hot feed is an index range scan like the newest-first one. A vote
+rewrites the score in the same UPDATE that moves the counters (see
+counters.apply_vote), with the prompt's age at that moment. Everyone
+else's score keeps the age of its last vote, so `manage.py
+refresh_hot_scores` re-decays the whole table and should run every few
+minutes.
+
+Sharded prompts (see api/counters.py) don't touch the Prompt row on a
+vote, so the command first folds their shard totals back into it: their
+`vote` column and score lag by at most one refresh.
+"""
+import datetime
+
+from django.conf import settings
+from django.db.models import ExpressionWrapper, FloatField, Value
+from django.utils import timezone
+
+from .models import Prompt
+
+
+def gravity():
+    return getattr(settings, 'PROMPT_HOT_GRAVITY', 1.8)
+
+
+def decay(created_at, now=None):
+    """
+    What a prompt created at `created_at` divides its votes by.
+    """
+    age = (now or timezone.now()) - created_at
+    hours = max(age, datetime.timedelta(0)).total_seconds() / 3600
+    return (hours + 2) ** gravity()
+
+
+def score(votes, created_at, now=None):
+    return votes / decay(created_at, now)
+
+
+def score_expression(votes, created_at):
+    """
+    `votes` (an expression, e.g. F('vote') + 1) scored in SQL, so the score
+    is written by the same UPDATE as the vote.
+    """
+    return ExpressionWrapper(votes / Value(decay(created_at)), output_field=FloatField())
+
+
+def refresh(batch_size=1000):
+    """
+    Recompute every score for the current time. Returns the number of
+    prompts rescored.
+    """
+    now = timezone.now()
+    # Unvoted prompts score 0 at any age.
+    rows = (
+        Prompt.objects.exclude(vote=0, hot_score=0).order_by('id')
+        .values_list('id', 'vote', 'created_at').iterator(chunk_size=batch_size)
+    )
+    batch, total = [], 0
+    for pk, votes, created_at in rows:
+        batch.append(Prompt(pk=pk, hot_score=score(votes, created_at, now)))
+        if len(batch) == batch_size:
+            total += _write(batch)
+            batch = []
+    return total + _write(batch)
+
+
+def _write(batch):
+    # bulk_update leaves updated_at alone, so cached row fragments stay valid.
+    Prompt.objects.bulk_update(batch, ['hot_score'])
+    return len(batch)
@@ -0,0 +1,671 @@
+# api/related.py
+"""
+"Related prompts" from a local TF-IDF index. No external embedding service.
+
+Every approved prompt is a row in a sparse CSR matrix of hashed term
+frequencies over title, description and prompt text (title words count
+triple, description words double). IDF weights are applied at query time
+from a document-frequency vector, so adding or removing one prompt only
+touches its own row and the df counts, never the rest of the matrix.
+
+The matrix is persisted as plain .npy files in a versioned directory under
+settings.PROMPT_RELATED_INDEX_DIR. Workers memory-map the current version
+instead of rebuilding at boot, and pick up a new version when the CURRENT
+pointer file changes.
+
+Approvals, edits and deletions don't rewrite the arrays: they append the
+prompt's new row (or its removal) to the version's change log, an O(1)
+write. Readers keep the version memory-mapped, read the log's new lines
+and answer from both (LayeredIndex). Once the log outgrows
+PROMPT_RELATED_MERGE_BYTES it is folded into a new version in a background
+thread; `manage.py build_related_index --merge` does the same on demand.
+"""
+import fcntl
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+
+WORD_RE = re.compile(r'[^\W_]{2,}')
+STOP_WORDS = frozenset(
+    'a an and are as at be by for from has have in is it its of on or that the '
+    'this to was were will with you your'.split()
+)
+FIELD_WEIGHTS = (3, 2, 1)  # title, description, prompt_text
+DEFAULT_FEATURES = 2 ** 18
+ARRAYS = ('ids', 'indptr', 'indices', 'data', 'df')
+CHANGE_LOG = 'changes.jsonl'
+
+
+def tokenize(text):
+    return [w for w in WORD_RE.findall((text or '').lower()) if w not in STOP_WORDS]
+
+
+def term_frequencies(title, description, text, n_features):
+    """
+    Return (indices, values) of the hashed, log-scaled term frequencies of
+    one prompt, indices sorted ascending.
+    """
+    counts = Counter()
+    for weight, field in zip(FIELD_WEIGHTS, (title, description, text)):
+        for word in tokenize(field):
+            counts[zlib.crc32(word.encode('utf-8')) % n_features] += weight
+    if not counts:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+    indices = np.fromiter(sorted(counts), dtype=np.int32, count=len(counts))
+    values = np.array([1.0 + math.log(counts[i]) for i in indices], dtype=np.float32)
+    return indices, values
+
+
+def idf_weights(n, df):
+    return (np.log((1.0 + n) / (1.0 + df)) + 1.0).astype(np.float32)
+
+
+def query_vector(title, description, text, idf, n_features):
+    """
+    The normalised TF-IDF vector of a query, or None if it has no terms.
+    """
+    indices, tf = term_frequencies(title, description, text, n_features)
+    if not len(indices):
+        return None
+    query = np.zeros(n_features, dtype=np.float32)
+    query[indices] = tf * idf[indices]
+    query /= np.linalg.norm(query) or 1.0
+    return query
+
+
+def top_matches(ids, scores, k):
+    """
+    Up to k (id, score) pairs with the highest positive scores, best first.
+    """
+    k = min(k, len(scores))
+    if not k:
+        return []
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return [(int(ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+
+class RelatedIndex:
+    """
+    CSR rows of term frequencies plus per-feature document frequencies.
+    Removed prompts leave a tombstone (id -1) until the next compaction.
+    """
+
+    def __init__(self, ids, indptr, indices, data, df, n_features=DEFAULT_FEATURES):
+        self.ids = ids
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.df = df
+        self.n_features = n_features
+        self._rows = None
+        self._weights = None
+
+    @classmethod
+    def empty(cls, n_features=DEFAULT_FEATURES):
+        return cls(
+            ids=np.zeros(0, dtype=np.int64),
+            indptr=np.zeros(1, dtype=np.int64),
+            indices=np.zeros(0, dtype=np.int32),
+            data=np.zeros(0, dtype=np.float32),
+            df=np.zeros(n_features, dtype=np.int32),
+            n_features=n_features,
+        )
+
+    @classmethod
+    def build(cls, rows, n_features=DEFAULT_FEATURES):
+        """
+        Build from an iterable of (id, title, description, prompt_text).
+        """
+        return cls.from_vectors(
+            ((pk, term_frequencies(title, description, text, n_features)) for pk, title, description, text in rows),
+            n_features,
+        )
+
+    @classmethod
+    def from_vectors(cls, rows, n_features=DEFAULT_FEATURES):
+        """
+        Build from an iterable of (id, (indices, values)) term frequencies.
+        """
+        ids, lengths, all_indices, all_values = [], [], [], []
+        for pk, (indices, values) in rows:
+            ids.append(pk)
+            lengths.append(len(indices))
+            all_indices.append(indices)
+            all_values.append(values)
+        index = cls.empty(n_features)
+        if not ids:
+            return index
+        index.ids = np.array(ids, dtype=np.int64)
+        index.indptr = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+        index.indices = np.concatenate(all_indices).astype(np.int32)
+        index.data = np.concatenate(all_values).astype(np.float32)
+        index.df = np.bincount(index.indices, minlength=n_features).astype(np.int32)
+        return index
+
+    # --- bookkeeping ---
+
+    def __len__(self):
+        return int(np.count_nonzero(self.ids >= 0))
+
+    def __contains__(self, pk):
+        return pk in self.rows
+
+    @property
+    def rows(self):
+        if self._rows is None:
+            self._rows = {int(pk): i for i, pk in enumerate(self.ids) if pk >= 0}
+        return self._rows
+
+    def vectors(self):
+        """
+        (id, (indices, values)) for every row, as from_vectors() takes them.
+        """
+        for pk, row in self.rows.items():
+            start, end = self.indptr[row], self.indptr[row + 1]
+            yield pk, (self.indices[start:end], self.data[start:end])
+
+    def _changed(self):
+        self._rows = None
+        self._weights = None
+
+    # --- incremental updates ---
+
+    def remove(self, pk):
+        row = self.rows.get(pk)
+        if row is None:
+            return False
+        start, end = self.indptr[row], self.indptr[row + 1]
+        df = np.array(self.df)
+        np.subtract.at(df, self.indices[start:end], 1)
+        ids = np.array(self.ids)
+        ids[row] = -1
+        self.df, self.ids = df, ids
+        self._changed()
+        if len(self.ids) and np.count_nonzero(ids < 0) > len(ids) // 5:
+            self.compact()
+        return True
+
+    def discard(self, pks):
+        """
+        Remove many prompts at once; ids that are not indexed are ignored.
+        """
+        rows = [self.rows[pk] for pk in pks if pk in self.rows]
+        if not rows:
+            return
+        dropped = np.zeros(len(self.ids), dtype=bool)
+        dropped[rows] = True
+        removed = self.indices[np.repeat(dropped, np.diff(self.indptr))]
+        self.df = self.df - np.bincount(removed, minlength=self.n_features).astype(np.int32)
+        self.ids = np.where(dropped, -1, self.ids)
+        self.compact()
+
+    def upsert(self, pk, title, description, text):
+        self.remove(pk)
+        indices, values = term_frequencies(title, description, text, self.n_features)
+        df = np.array(self.df)
+        np.add.at(df, indices, 1)
+        self.df = df
+        self.ids = np.append(self.ids, np.int64(pk))
+        self.indptr = np.append(self.indptr, self.indptr[-1] + len(indices))
+        self.indices = np.concatenate((self.indices, indices))
+        self.data = np.concatenate((self.data, values))
+        self._changed()
+
+    def merge(self, other):
+        """
+        Upsert every row of `other` (an index built with the same n_features)
+        at once; cheaper than one upsert() per row for large batches.
+        """
+        self.discard(other.ids.tolist())
+        if not len(other):
+            return
+        other.compact()
+        self.df = self.df + other.df
+        self.ids = np.concatenate((self.ids, other.ids))
+        self.indptr = np.concatenate((self.indptr, self.indptr[-1] + other.indptr[1:]))
+        self.indices = np.concatenate((self.indices, other.indices))
+        self.data = np.concatenate((self.data, other.data))
+        self._changed()
+
+    def compact(self):
+        keep = self.ids >= 0
+        lengths = np.diff(self.indptr)
+        nnz_keep = np.repeat(keep, lengths)
+        self.ids = self.ids[keep]
+        self.indptr = np.concatenate(([0], np.cumsum(lengths[keep]))).astype(np.int64)
+        self.indices = self.indices[nnz_keep]
+        self.data = self.data[nnz_keep]
+        self._changed()
+
+    # --- querying ---
+
+    def idf(self):
+        return idf_weights(len(self), self.df)
+
+    def weights(self, idf=None):
+        """
+        L2-normalised TF-IDF values aligned with self.indices, the row
+        number of every stored value, and the IDF used. With the index's own
+        IDF the result is cached until the index changes.
+        """
+        if idf is not None:
+            return self._normalise(idf)
+        if self._weights is None:
+            self._weights = self._normalise(self.idf())
+        return self._weights
+
+    def _normalise(self, idf):
+        values = self.data * idf[self.indices]
+        row_of = np.repeat(np.arange(len(self.ids)), np.diff(self.indptr))
+        norms = np.sqrt(np.bincount(row_of, weights=values * values, minlength=len(self.ids)))
+        norms[norms == 0] = 1.0
+        return (values / norms[row_of]).astype(np.float32), row_of, idf
+
+    def scores(self, query, weights):
+        """
+        Cosine similarity of `query` to every row (0 for tombstones): one
+        batch dot product against every stored value.
+        """
+        values, row_of, _ = weights
+        scores = np.bincount(row_of, weights=values * query[self.indices], minlength=len(self.ids))
+        scores[self.ids < 0] = 0.0
+        return scores
+
+    def related(self, title, description, text, k=10, exclude=None):
+        """
+        Return up to k (id, score) pairs most similar to the given text,
+        best first. Scores are cosine similarities in (0, 1].
+        """
+        if not len(self):
+            return []
+        weights = self.weights()
+        query = query_vector(title, description, text, weights[2], self.n_features)
+        if query is None:
+            return []
+        scores = self.scores(query, weights)
+        if exclude is not None and exclude in self.rows:
+            scores[self.rows[exclude]] = 0.0
+        return top_matches(self.ids, scores, k)
+
+    # --- persistence ---
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(getattr(self, name)))
+        with open(os.path.join(directory, 'meta.json'), 'w') as fh:
+            json.dump({'n_features': self.n_features}, fh)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        with open(os.path.join(directory, 'meta.json')) as fh:
+            meta = json.load(fh)
+        mode = 'r' if mmap else None
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mode) for name in ARRAYS}
+        return cls(n_features=meta['n_features'], **arrays)
+
+
+class LayeredIndex:
+    """
+    A published version plus the changes logged after it, queried as one
+    index. `changes` maps prompt ids to their current (indices, values), or
+    None once removed. The version's rows for those ids are masked out and
+    their new rows kept in a small in-memory RelatedIndex, so the version's
+    arrays are only read, and can stay memory-mapped.
+    """
+
+    def __init__(self, base, changes):
+        self.base = base
+        self.changes = changes
+        self.n_features = base.n_features
+        self.delta = RelatedIndex.from_vectors(
+            ((pk, row) for pk, row in changes.items() if row is not None), base.n_features,
+        )
+        self.hidden = np.array([base.rows[pk] for pk in changes if pk in base.rows], dtype=np.int64)
+        hidden_terms = [base.indices[base.indptr[row]:base.indptr[row + 1]] for row in self.hidden]
+        self.df = base.df + self.delta.df
+        if hidden_terms:
+            self.df = self.df - np.bincount(np.concatenate(hidden_terms), minlength=self.n_features).astype(np.int32)
+        self._weights = None
+
+    def __len__(self):
+        return len(self.base) - len(self.hidden) + len(self.delta)
+
+    def __contains__(self, pk):
+        if pk in self.changes:
+            return self.changes[pk] is not None
+        return pk in self.base
+
+    @property
+    def rows(self):
+        return [pk for pk in self.base.rows if pk not in self.changes] + list(self.delta.rows)
+
+    def related(self, title, description, text, k=10, exclude=None):
+        if not len(self):
+            return []
+        if self._weights is None:
+            idf = idf_weights(len(self), self.df)
+            self._weights = self.base.weights(idf), self.delta.weights(idf)
+        base_weights, delta_weights = self._weights
+        query = query_vector(title, description, text, base_weights[2], self.n_features)
+        if query is None:
+            return []
+        base_scores = self.base.scores(query, base_weights)
+        base_scores[self.hidden] = 0.0
+        ids = np.concatenate((self.base.ids, self.delta.ids))
+        scores = np.concatenate((base_scores, self.delta.scores(query, delta_weights)))
+        if exclude is not None:
+            scores[ids == exclude] = 0.0
+        return top_matches(ids, scores, k)
+
+    def folded(self):
+        """
+        A plain RelatedIndex with the changes applied.
+        """
+        index = RelatedIndex(
+            self.base.ids, self.base.indptr, self.base.indices, self.base.data, self.base.df, self.n_features,
+        )
+        index.discard(list(self.changes))
+        index.merge(self.delta)
+        return index
+
+
+def read_changes(path, changes, offset=0, end=None):
+    """
+    Apply the complete lines of a change log from byte `offset` (up to
+    `end`) to `changes`; returns the offset after the last line read.
+    """
+    try:
+        with open(path, 'rb') as fh:
+            fh.seek(offset)
+            data = fh.read() if end is None else fh.read(max(end - offset, 0))
+    except FileNotFoundError:
+        return offset
+    complete = data[:data.rfind(b'\n') + 1]
+    for line in complete.splitlines():
+        record = json.loads(line)
+        if record.get('removed'):
+            changes[record['id']] = None
+        else:
+            changes[record['id']] = (
+                np.array(record['indices'], dtype=np.int32), np.array(record['values'], dtype=np.float32),
+            )
+    return offset + len(complete)
+
+
+def change_line(pk, row):
+    if row is None:
+        return json.dumps({'id': pk, 'removed': True}) + '\n'
+    indices, values = row
+    return json.dumps({'id': pk, 'indices': indices.tolist(), 'values': values.tolist()}) + '\n'
+
+
+class RelatedIndexStore:
+    """
+    Versioned on-disk home of the index, shared by all workers on a host.
+
+        <root>/CURRENT                  name of the live version directory
+        <root>/v<N>/*.npy               the arrays of version N
+        <root>/v<N>/changes.jsonl       changes logged since N was published
+        <root>/.lock                    flock() serialising writers
+    """
+    keep_versions = 2
+
+    def __init__(self, root):
+        self.root = str(root)
+        self._local = threading.Lock()
+        self._reading = threading.Lock()
+        self._merging = threading.Lock()
+        self._base = None
+        self._version = None
+        self._changes = {}
+        self._offset = 0
+        self._index = None
+
+    @property
+    def current_path(self):
+        return os.path.join(self.root, 'CURRENT')
+
+    def current_version(self):
+        try:
+            with open(self.current_path) as fh:
+                return fh.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def log_path(self, version):
+        return os.path.join(self.root, version, CHANGE_LOG)
+
+    @contextmanager
+    def write_lock(self):
+        os.makedirs(self.root, exist_ok=True)
+        with self._local, open(os.path.join(self.root, '.lock'), 'w') as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def get(self, build=None):
+        """
+        Return the live index, memory-mapping a newer version if another
+        worker published one and applying the changes logged since. If
+        nothing is on disk yet, `build()` is called to produce the first
+        version.
+        """
+        version = self.current_version()
+        if version is None:
+            if build is None:
+                return RelatedIndex.empty()
+            with self.write_lock():
+                if self.current_version() is None:
+                    self.publish(build())
+            version = self.current_version()
+        with self._reading:
+            if version != self._version:
+                self._base = RelatedIndex.load(os.path.join(self.root, version))
+                self._version, self._changes, self._offset, self._index = version, {}, 0, None
+            offset = read_changes(self.log_path(version), self._changes, self._offset)
+            if offset != self._offset or self._index is None:
+                self._offset = offset
+                self._index = LayeredIndex(self._base, dict(self._changes)) if self._changes else self._base
+            return self._index
+
+    def publish(self, index):
+        """
+        Write `index` as a new version, with an empty change log, and point
+        CURRENT at it. Callers must hold write_lock().
+        """
+        current = self.current_version()
+        number = int(current[1:]) + 1 if current else 1
+        name = f'v{number}'
+        path = os.path.join(self.root, name)
+        # Left over if a publish or merge died before switching to it.
+        shutil.rmtree(path, ignore_errors=True)
+        index.save(path)
+        self._switch(name)
+
+    def _switch(self, name):
+        tmp = self.current_path + '.tmp'
+        with open(tmp, 'w') as fh:
+            fh.write(name)
+        os.replace(tmp, self.current_path)
+        self._prune(int(name[1:]))
+
+    def _prune(self, number):
+        for entry in os.listdir(self.root):
+            if entry.startswith('v') and entry[1:].isdigit() and int(entry[1:]) <= number - self.keep_versions:
+                shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
+
+    def log(self, changes, build=None):
+        """
+        Record {id: (indices, values) or None for removed} as changes to the
+        live version: one append to its log. Returns the log's size. With
+        nothing published yet, `build()` produces the first version instead
+        (it reads the changes from the database).
+        """
+        lines = ''.join(change_line(pk, row) for pk, row in changes.items())
+        with self.write_lock():
+            version = self.current_version()
+            if version is None:
+                self.publish(build() if build is not None else RelatedIndex.empty())
+                return 0
+            with open(self.log_path(version), 'a') as fh:
+                fh.write(lines)
+                return fh.tell()
+
+    def merge(self):
+        """
+        Fold the change log into a new version. The write lock is held only
+        to note where the log ends and to switch versions, so changes logged
+        meanwhile carry over to the new version instead of waiting.
+        Returns the new version's name, or None if there was nothing to
+        merge or another merge got there first.
+        """
+        with self.write_lock():
+            version = self.current_version()
+            if version is None:
+                return None
+            log = self.log_path(version)
+            end = os.path.getsize(log) if os.path.exists(log) else 0
+        if not end:
+            return None
+        changes = {}
+        read_changes(log, changes, end=end)
+        folded = LayeredIndex(RelatedIndex.load(os.path.join(self.root, version)), changes).folded()
+        name = f'v{int(version[1:]) + 1}'
+        staging = os.path.join(self.root, f'.{name}-{os.getpid()}-{threading.get_ident()}')
+        folded.save(staging)
+        with self.write_lock():
+            if self.current_version() != version:
+                shutil.rmtree(staging, ignore_errors=True)
+                return None
+            with open(log, 'rb') as src, open(os.path.join(staging, CHANGE_LOG), 'wb') as dst:
+                src.seek(end)
+                shutil.copyfileobj(src, dst)
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+            os.rename(staging, os.path.join(self.root, name))
+            self._switch(name)
+        return name
+
+    def merge_in_background(self):
+        """
+        merge() in a daemon thread, unless this process is already merging.
+        """
+        if not self._merging.acquire(blocking=False):
+            return None
+
+        def run():
+            try:
+                self.merge()
+            finally:
+                self._merging.release()
+        thread = threading.Thread(target=run, name='related-index-merge', daemon=True)
+        thread.start()
+        return thread
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    root = str(settings.PROMPT_RELATED_INDEX_DIR)
+    if _store is None or _store.root != root:
+        _store = RelatedIndexStore(root)
+    return _store
+
+
+def merge_bytes():
+    return getattr(settings, 'PROMPT_RELATED_MERGE_BYTES', 4 * 1024 * 1024)
+
+
+def approved_rows():
+    from .models import Prompt
+
+    return (
+        Prompt.objects.filter(status='approved')
+        .values_list('id', 'title', 'prompt_description', 'prompt_text')
+        .iterator(chunk_size=2000)
+    )
+
+
+def build_index():
+    return RelatedIndex.build(approved_rows())
+
+
+def rebuild():
+    store = get_store()
+    with store.write_lock():
+        store.publish(build_index())
+
+
+def log_changes(changes):
+    """
+    Append changes to the shared index, starting a background merge once
+    the log has grown past PROMPT_RELATED_MERGE_BYTES.
+    """
+    if not changes:
+        return
+    store = get_store()
+    if store.log(changes, build=build_index) > merge_bytes():
+        store.merge_in_background()
+
+
+def sync_prompt(prompt):
+    """
+    Bring the index in line with one prompt after it changed: approved
+    prompts are (re)indexed, anything else is dropped.
+    """
+    row = None
+    if prompt.status == 'approved':
+        row = term_frequencies(prompt.title, prompt.prompt_description, prompt.prompt_text, DEFAULT_FEATURES)
+    log_changes({prompt.pk: row})
+
+
+def merge_parts(parts, removed=()):
+    """
+    Add the rows of several partial indexes (RelatedIndex.build over new or
+    newly approved prompts) to the shared index and drop the `removed` ids,
+    in one update.
+    """
+    changes = dict.fromkeys(removed)
+    for part in parts:
+        changes.update(part.vectors())
+    log_changes(changes)
+
+
+def sync_prompts(approved=(), removed=()):
+    """
+    Bulk sync_prompt: index the `approved` ids (those still approved) and
+    drop the `removed` ones, in one update.
+    """
+    from .models import Prompt
+
+    rows = (
+        Prompt.objects.filter(pk__in=list(approved), status='approved')
+        .values_list('id', 'title', 'prompt_description', 'prompt_text')
+    )
+    merge_parts([RelatedIndex.build(rows)], removed=removed)
+
+
+def remove_prompt(pk):
+    log_changes({pk: None})
+
+
+def related_prompt_ids(prompt, k=10):
+    index = get_store().get(build=build_index)
+    matches = index.related(
+        prompt.title, prompt.prompt_description, prompt.prompt_text, k=k, exclude=prompt.pk
+    )
+    return [pk for pk, _ in matches]
@@ -0,0 +1,176 @@
+# api/search.py
+"""
+Full-text search over prompts.
+
+On Postgres, `Prompt.search_vector` is a weighted tsvector
+(title > description > text) maintained by a trigger (see migration 0014)
+and backed by a GIN index, so a search is an index lookup ranked with
+ts_rank. SQLite dev setups get a simple icontains backend with the same
+interface and a rough rank, so the API behaves the same everywhere.
+
+Query syntax:
+    foo bar        both words must match
+    "foo bar"      phrase: the words must appear next to each other
+    foo*           prefix: matches foo, food, football...
+"""
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast
+from django.utils.module_loading import import_string
+from rest_framework.filters import BaseFilterBackend
+
+TOKEN_RE = re.compile(r'"([^"]*)"?|(\S+)')
+WORD_RE = re.compile(r'\w+')
+
+
+class Term:
+    WORD = 'word'
+    PREFIX = 'prefix'
+    PHRASE = 'phrase'
+
+    def __init__(self, kind, words):
+        self.kind = kind
+        self.words = words
+
+    def __repr__(self):
+        return f'Term({self.kind!r}, {self.words!r})'
+
+    def __eq__(self, other):
+        return isinstance(other, Term) and (self.kind, self.words) == (other.kind, other.words)
+
+
+def parse_query(raw):
+    """
+    Split a user query into Terms. Anything that is not a word character is
+    dropped, so the result is always safe to splice into a tsquery.
+    """
+    terms = []
+    for phrase, token in TOKEN_RE.findall(raw or ''):
+        if phrase:
+            words = WORD_RE.findall(phrase.lower())
+            if len(words) == 1:
+                terms.append(Term(Term.WORD, words))
+            elif words:
+                terms.append(Term(Term.PHRASE, words))
+            continue
+        words = WORD_RE.findall(token.lower())
+        if not words:
+            continue
+        if len(words) > 1:
+            # "foo-bar" style tokens behave like a phrase
+            terms.append(Term(Term.PHRASE, words))
+        elif token.endswith('*'):
+            terms.append(Term(Term.PREFIX, words))
+        else:
+            terms.append(Term(Term.WORD, words))
+    return terms
+
+
+class BaseSearchBackend:
+    """
+    A search backend filters a Prompt queryset down to the matches for `raw`
+    and annotates every row with a float `search_rank` (higher is better).
+    """
+
+    def search(self, queryset, raw):
+        terms = parse_query(raw)
+        if not terms:
+            return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+        return self.search_terms(queryset, terms)
+
+    def search_terms(self, queryset, terms):
+        raise NotImplementedError
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    # The configuration the trigger from migration 0014 builds search_vector
+    # with; queries have to use the same one. Changing it takes a migration
+    # that replaces the trigger function and rewrites every vector.
+    config = 'english'
+
+    def to_tsquery(self, terms):
+        parts = []
+        for term in terms:
+            if term.kind == Term.PHRASE:
+                parts.append('(' + ' <-> '.join(term.words) + ')')
+            elif term.kind == Term.PREFIX:
+                parts.append(term.words[0] + ':*')
+            else:
+                parts.append(term.words[0])
+        return ' & '.join(parts)
+
+    def search_terms(self, queryset, terms):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        query = SearchQuery(self.to_tsquery(terms), config=self.config, search_type='raw')
+        # ts_rank returns float4; cast to float8 so the value survives the
+        # round trip through a pagination cursor exactly.
+        rank = Cast(SearchRank(F('search_vector'), query), FloatField())
+        return queryset.filter(search_vector=query).annotate(search_rank=rank)
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """
+    Fallback for databases without tsvector support. Same matching rules,
+    but implemented with icontains, so it scans the table.
+    """
+    weights = (
+        ('title', 1.0),
+        ('prompt_description', 0.4),
+        ('prompt_text', 0.1),
+    )
+
+    def search_terms(self, queryset, terms):
+        rank = Value(0.0, output_field=FloatField())
+        for term in terms:
+            needle = ' '.join(term.words)
+            condition = Q()
+            for field, weight in self.weights:
+                lookup = {f'{field}__icontains': needle}
+                condition |= Q(**lookup)
+                rank = rank + Case(
+                    When(Q(**lookup), then=Value(weight)),
+                    default=Value(0.0),
+                    output_field=FloatField(),
+                )
+            queryset = queryset.filter(condition)
+        return queryset.annotate(search_rank=rank)
+
+
+def get_search_backend(using='default'):
+    path = getattr(settings, 'PROMPT_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connections[using].vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return SimpleSearchBackend()
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """
+    Drop-in replacement for DRF's SearchFilter on PromptViewSet.
+    Uses the same `?search=` parameter; results carry a `search_rank`
+    annotation that the view orders by.
+    """
+    search_param = 'search'
+
+    def get_search_term(self, request):
+        return request.query_params.get(self.search_param, '').strip()
+
+    def filter_queryset(self, request, queryset, view):
+        term = self.get_search_term(request)
+        if not term:
+            return queryset
+        return get_search_backend(queryset.db).search(queryset, term)
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Full-text search. Supports "quoted phrases" and prefix* terms.',
+            'schema': {'type': 'string'},
+        }]
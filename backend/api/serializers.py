@@ -1,13 +1,51 @@
 # api/serializers.py
 from rest_framework import serializers
 from .models import Prompt
-from django.db.models import Sum
 from .models import (Prompt, PromptVersion, TASK_TYPE_CHOICES,
     OUTPUT_FORMAT_CHOICES,)
 from django.contrib.auth.models import User
+from django.db import transaction
+from .counters import shard_totals
+from . import hashing
 
-class PromptSerializer(serializers.ModelSerializer):
+# Prompt columns that can be kilobytes each; list views defer the ones the
+# serializer won't render.
+LARGE_FIELDS = ('prompt_description', 'prompt_text', 'guidance', 'possible_duplicates')
+
+
+def requested_fields(request):
+    """
+    (fields to keep or None for all, fields to omit) from ?fields= / ?omit=.
+    """
+    def parse(name):
+        raw = request.query_params.get(name, '')
+        return {part.strip() for part in raw.split(',') if part.strip()}
+
+    return parse('fields') or None, parse('omit')
+
+
+class SparseFieldsetsMixin:
+    """
+    Sparse fieldsets for reads: ?fields=a,b renders only those fields and
+    ?omit=c,d drops fields, when the serializer has the request in its
+    context. `id` is always kept, since clients and the response cache key
+    rows on it. Writes are unaffected.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return
+        keep, omit = requested_fields(request)
+        for name in list(self.fields):
+            if name != 'id' and ((keep is not None and name not in keep) or name in omit):
+                self.fields.pop(name)
+
+
+class PromptSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     user_username = serializers.ReadOnlyField(source='user.username')
+    vote = serializers.SerializerMethodField()
     vote_count = serializers.SerializerMethodField()
     like_count = serializers.SerializerMethodField()
     dislike_count = serializers.SerializerMethodField()
@@ -33,6 +71,7 @@ class PromptSerializer(serializers.ModelSerializer):
             'like_count',  
             'dislike_count',  
             'user_vote','is_bookmarked',
+            'possible_duplicates',
             'created_at', 
             'updated_at'
         ]
@@ -46,30 +85,78 @@ class PromptSerializer(serializers.ModelSerializer):
             'vote','is_bookmarked',    
             'vote_count', 'user_vote','like_count',    
             'dislike_count',
+            'possible_duplicates',
         ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The duplicate report names other users' pending and rejected
+        # prompts, so only moderators get it.
+        request = self.context.get('request')
+        if request is not None and not request.user.is_staff:
+            self.fields.pop('possible_duplicates', None)
+
+    # Each getter prefers the value annotated by Prompt.objects.with_vote_stats()
+    # and only falls back to a query for instances loaded without it.
+    # Vote totals come from the counter columns (plus shards for hot prompts),
+    # which _handle_vote keeps current.
+    def _counter(self, obj, field):
+        value = getattr(obj, field)
+        if obj.vote_shards:
+            value += shard_totals(obj.pk)[field]
+        return value
+
+    def get_vote(self, obj):
+        if hasattr(obj, 'annotated_vote_count'):
+            return obj.annotated_vote_count
+        return self._counter(obj, 'vote')
+
     def get_vote_count(self, obj):
-        agg = obj.votes.aggregate(total=Sum('value'))
-        return agg['total'] or 0
+        if hasattr(obj, 'annotated_vote_count'):
+            return obj.annotated_vote_count
+        return self._counter(obj, 'vote')
 
     def get_user_vote(self, obj):
         request = self.context.get('request', None)
         if not request or not request.user or not request.user.is_authenticated:
             return 0
-        v = obj.votes.filter(user=request.user).first()
+        if hasattr(obj, 'annotated_user_vote'):
+            return obj.annotated_user_vote
+        v = obj.votes.filter(user_id=request.user.pk).first()
         return v.value if v else 0
     
     def get_like_count(self, obj):
-        return obj.votes.filter(value=1).count()
+        if hasattr(obj, 'annotated_like_count'):
+            return obj.annotated_like_count
+        return self._counter(obj, 'like_count')
 
     def get_dislike_count(self, obj):
-        return obj.votes.filter(value=-1).count()
+        if hasattr(obj, 'annotated_dislike_count'):
+            return obj.annotated_dislike_count
+        return self._counter(obj, 'dislike_count')
     
     def get_is_bookmarked(self, obj):
         request = self.context.get('request', None)
         if not request or not request.user or not request.user.is_authenticated:
             return False
+        if hasattr(obj, 'annotated_is_bookmarked'):
+            return obj.annotated_is_bookmarked
         # This does an efficient existence check
-        return obj.bookmarks.filter(user=request.user).exists()
+        return obj.bookmarks.filter(user_id=request.user.pk).exists()
+
+class PromptListSerializer(PromptSerializer):
+    """
+    Default row of the prompt list: what the card grid shows, without the
+    prompt text, guidance and duplicate report (fetch the prompt, or ask for
+    them with ?fields=).
+    """
+
+    class Meta(PromptSerializer.Meta):
+        fields = [
+            f for f in PromptSerializer.Meta.fields
+            if f not in ('prompt_text', 'guidance', 'possible_duplicates')
+        ]
+
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -82,12 +169,15 @@ class UserSerializer(serializers.ModelSerializer):
         """
         Create and return a new user with a hashed password.
         """
-        # We use create_user to handle password hashing
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data.get('email', ''), # email is optional
-            password=validated_data['password']
-        )
+        # Hashed in the worker pool (see api/hashing.py) before anything is
+        # written, so an overloaded pool leaves no half-made user behind.
+        encoded = hashing.make_password(validated_data['password'])
+        with transaction.atomic():
+            user = User.objects.create_user(
+                validated_data['username'], validated_data.get('email', ''), password=None, # email is optional
+            )
+            user.password = encoded
+            user.save(update_fields=['password'])
         return user
 
 class PromptVersionSerializer(serializers.ModelSerializer):
@@ -117,4 +207,39 @@ class PromptVersionSerializer(serializers.ModelSerializer):
         return dict(TASK_TYPE_CHOICES).get(obj.task_type, obj.task_type)
 
     def get_output_format_label(self, obj):
-        return dict(OUTPUT_FORMAT_CHOICES).get(obj.output_format, obj.output_format)
\ No newline at end of file
+        return dict(OUTPUT_FORMAT_CHOICES).get(obj.output_format, obj.output_format)
+
+
+class PromptVersionSummarySerializer(PromptVersionSerializer):
+    """
+    History entry without the (delta-compressed) bodies, so listing them
+    never has to rebuild any text.
+    """
+    size = serializers.ReadOnlyField(source='content.size')
+
+    class Meta(PromptVersionSerializer.Meta):
+        fields = [
+            f for f in PromptVersionSerializer.Meta.fields
+            if f not in ("prompt_text", "prompt_description", "guidance")
+        ] + ["size"]
+
+class ModerationQueueSerializer(serializers.ModelSerializer):
+    """
+    One row of the moderation queue: what a moderator scans to decide,
+    without the prompt body or any vote lookups.
+    """
+    user_username = serializers.ReadOnlyField(source='user.username')
+
+    # Loaded with .only() by the queue view; keep the two in step.
+    QUERY_FIELDS = (
+        'id', 'user', 'user__username', 'title', 'task_type', 'output_format',
+        'category', 'status', 'possible_duplicates', 'created_at', 'updated_at',
+    )
+
+    class Meta:
+        model = Prompt
+        fields = [
+            'id', 'user', 'user_username', 'title', 'task_type', 'output_format',
+            'category', 'status', 'possible_duplicates', 'created_at', 'updated_at',
+        ]
+        read_only_fields = fields
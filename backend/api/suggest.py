@@ -0,0 +1,156 @@
+# api/suggest.py
+"""
+Typo-tolerant title autocomplete for /api/prompts/suggest/.
+
+On Postgres with pg_trgm the lookup is a `title %> q` match served by the
+GIN trigram index from migration 0015, ordered by word similarity.
+Without pg_trgm (SQLite, or a database where the extension could not be
+created) an in-process trigram index over approved titles is used instead.
+It is rebuilt lazily when the catalog generation (api/cache.py) moves,
+which every approval, edit and deletion bumps.
+"""
+import re
+import threading
+from collections import Counter
+from heapq import nlargest
+
+from django.conf import settings
+from django.db import connections
+
+from . import cache as response_cache
+from .models import Prompt
+
+WORD_RE = re.compile(r'[^\W_]+')
+
+
+def trigrams(text):
+    """
+    pg_trgm-style trigrams: lowercase, split into words, pad each word with
+    two leading spaces and one trailing space.
+    """
+    grams = set()
+    for word in WORD_RE.findall((text or '').lower()):
+        padded = f'  {word} '
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+class TrigramIndex:
+    """
+    Inverted index from trigram to the ids of the titles that contain it.
+    """
+
+    def __init__(self, rows=()):
+        self.titles = {}
+        self.sizes = {}
+        self.postings = {}
+        for pk, title in rows:
+            self.add(pk, title)
+
+    def add(self, pk, title):
+        grams = trigrams(title)
+        self.titles[pk] = title
+        self.sizes[pk] = len(grams)
+        for gram in grams:
+            self.postings.setdefault(gram, []).append(pk)
+
+    def search(self, query, limit=10, threshold=0.3):
+        wanted = trigrams(query)
+        if not wanted:
+            return []
+        shared = Counter()
+        for gram in wanted:
+            shared.update(self.postings.get(gram, ()))
+
+        # Rank by how much of the query a title covers (like word_similarity),
+        # then by plain Jaccard similarity so shorter, closer titles win ties.
+        def score(item):
+            pk, n = item
+            return (n / len(wanted), n / (len(wanted) + self.sizes[pk] - n), -pk)
+
+        candidates = (item for item in shared.items() if item[1] / len(wanted) >= threshold)
+        return [
+            {'id': pk, 'title': self.titles[pk]}
+            for pk, _ in nlargest(limit, candidates, key=score)
+        ]
+
+
+class InProcessSuggestBackend:
+    _lock = threading.Lock()
+    _index = None
+    _stamp = None
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+
+    @classmethod
+    def clear(cls):
+        cls._index = cls._stamp = None
+
+    def get_index(self, queryset):
+        # A one-row lookup, where scanning the approved set would be O(N)
+        # per keystroke.
+        stamp = response_cache.catalog_generation()
+        cls = type(self)
+        if cls._index is None or cls._stamp != stamp:
+            with cls._lock:
+                if cls._index is None or cls._stamp != stamp:
+                    cls._index = TrigramIndex(queryset.values_list('id', 'title').iterator())
+                    cls._stamp = stamp
+        return cls._index
+
+    def suggest(self, queryset, query, limit):
+        return self.get_index(queryset).search(query, limit=limit, threshold=self.threshold)
+
+
+class PostgresTrigramSuggestBackend:
+    """
+    `title %> q` is what the GIN trigram index can answer; its cut-off is the
+    server's pg_trgm.word_similarity_threshold rather than our setting.
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+
+    def suggest(self, queryset, query, limit):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        rows = (
+            queryset
+            .filter(title__trigram_word_similar=query)
+            .annotate(similarity=TrigramWordSimilarity(query, 'title'))
+            .order_by('-similarity', 'id')
+            .values('id', 'title')[:limit]
+        )
+        return list(rows)
+
+
+_pg_trgm_available = {}
+
+
+def pg_trgm_available(using='default'):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return False
+    if using not in _pg_trgm_available:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _pg_trgm_available[using] = cursor.fetchone() is not None
+    return _pg_trgm_available[using]
+
+
+def get_suggest_backend(using='default'):
+    threshold = getattr(settings, 'PROMPT_SUGGEST_THRESHOLD', 0.3)
+    if pg_trgm_available(using):
+        return PostgresTrigramSuggestBackend(threshold)
+    return InProcessSuggestBackend(threshold)
+
+
+def suggest_titles(query, limit=10):
+    """
+    Return up to `limit` approved prompts as {'id', 'title'} dicts whose
+    titles best match `query`, tolerating typos and partial words.
+    """
+    queryset = Prompt.objects.filter(status='approved')
+    return get_suggest_backend(queryset.db).suggest(queryset, query, limit)
@@ -1,3 +1,1762 @@
-from django.test import TestCase
+import csv
+import datetime
+import importlib
+import io
+import json
+import os
+import tempfile
+import time
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connection
+from django.http import Http404
+from django.utils import timezone
+from django.utils.http import http_date
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import cache as response_cache
+from . import authentication, benchmark, counters, diffs, export, facets, fastpath, fragments, hashing, importer, metrics, minhash, profiling, ranking, related, versioning
+from .models import Bookmark, Prompt, PromptContent, PromptFacetCount, PromptLSHBucket, PromptSignature, PromptVersion, Vote
+from .search import PostgresSearchBackend, Term, parse_query
+from .serializers import PromptListSerializer, PromptSerializer
+from .suggest import InProcessSuggestBackend, TrigramIndex
+
+
+class PromptAPITestCase(TestCase):
+    def setUp(self):
+        # Cached listings are keyed by catalog generation, which restarts at 0
+        # in every test; don't let one test read another's entries.
+        caches['prompts'].clear()
+        fragments.cache.clear()
+        InProcessSuggestBackend.clear()
+
+
+def make_prompt(user, **kwargs):
+    defaults = {
+        'title': 'Prompt',
+        'prompt_text': 'Write something useful.',
+        'task_type': 'create_content',
+        'output_format': 'text',
+        'category': 'engineering',
+        'status': 'approved',
+    }
+    defaults.update(kwargs)
+    return Prompt.objects.create(user=user, **defaults)
+
+
+class PromptPaginationTests(PromptAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.prompts = [make_prompt(self.user, title=f'Prompt {i}') for i in range(7)]
+        # Same created_at for several rows: the cursor has to break ties on id.
+        Prompt.objects.filter(id__in=[p.id for p in self.prompts[2:5]]).update(
+            created_at=self.prompts[2].created_at
+        )
+
+    def walk(self, url):
+        ids = []
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, 200)
+            ids.extend(row['id'] for row in res.data['results'])
+            url = res.data['next']
+        return ids
+
+    def test_pages_cover_every_prompt_once(self):
+        ids = self.walk('/api/prompts/?page_size=2')
+        expected = list(
+            Prompt.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_previous_link_returns_the_prior_page(self):
+        first = self.client.get('/api/prompts/?page_size=3').data
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual(
+            [r['id'] for r in back['results']],
+            [r['id'] for r in first['results']],
+        )
+
+    def test_filters_apply_before_pagination(self):
+        make_prompt(self.user, title='Design one', category='design')
+        res = self.client.get('/api/prompts/?category=design&page_size=5')
+        self.assertEqual([r['title'] for r in res.data['results']], ['Design one'])
+        res = self.client.get('/api/prompts/?search=Design&page_size=5')
+        self.assertEqual([r['title'] for r in res.data['results']], ['Design one'])
+
+    def test_multiple_values_and_per_user_filters(self):
+        make_prompt(self.user, title='Design one', category='design')
+        make_prompt(self.user, title='Sales one', category='sales')
+        bob = User.objects.create_user(username='bob', password='pw')
+        pending = make_prompt(bob, title='Bob pending', category='sales', status='pending')
+        res = self.client.get('/api/prompts/?category=design,sales')
+        self.assertEqual([r['title'] for r in res.data['results']], ['Sales one', 'Design one'])
+
+        Bookmark.objects.create(user=self.user, prompt=self.prompts[0])
+        res = self.client.get('/api/prompts/?bookmarked=true')
+        self.assertEqual([r['id'] for r in res.data['results']], [self.prompts[0].id])
+        self.assertNotIn('X-Cache', res)
+
+        self.client.force_authenticate(bob)
+        self.assertEqual(self.client.get('/api/prompts/?owned=true').data['results'], [])
+        res = self.client.get('/api/prompts/?mine=1&owned=true')
+        self.assertEqual([r['id'] for r in res.data['results']], [pending.id])
+
+    def test_page_size_is_capped(self):
+        res = self.client.get('/api/prompts/?page_size=100000')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.data['results']), 7)
+
+    def test_invalid_cursor_is_404(self):
+        res = self.client.get('/api/prompts/?cursor=not-a-cursor')
+        self.assertEqual(res.status_code, 404)
+
+
+class PromptListQueryCountTests(PromptAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.other = User.objects.create_user(username='bob', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.other_client = APIClient()
+        self.other_client.force_authenticate(self.other)
+
+    def seed(self, n):
+        # Votes go through the endpoints, which maintain the counter columns.
+        for i in range(n):
+            prompt = make_prompt(self.other, title=f'Prompt {i}')
+            self.other_client.post(f'/api/prompts/{prompt.id}/upvote/')
+            if i % 2:
+                self.client.post(f'/api/prompts/{prompt.id}/downvote/')
+                Bookmark.objects.create(user=self.user, prompt=prompt)
+
+    def test_list_query_count_does_not_grow_with_rows(self):
+        # Catalog generation, then the page itself.
+        self.seed(5)
+        with self.assertNumQueries(2):
+            self.client.get('/api/prompts/?page_size=100')
+        self.seed(95)
+        response_cache.bump_generation()
+        with self.assertNumQueries(2):
+            res = self.client.get('/api/prompts/?page_size=100')
+        self.assertEqual(len(res.data['results']), 100)
+
+    def test_annotated_values_match_per_row_queries(self):
+        self.seed(4)
+        res = self.client.get('/api/prompts/')
+        for row in res.data['results']:
+            prompt = Prompt.objects.get(pk=row['id'])
+            mine = prompt.votes.filter(user=self.user).first()
+            self.assertEqual(row['user_username'], 'bob')
+            self.assertEqual(row['like_count'], prompt.votes.filter(value=1).count())
+            self.assertEqual(row['dislike_count'], prompt.votes.filter(value=-1).count())
+            self.assertEqual(row['vote_count'], row['like_count'] - row['dislike_count'])
+            self.assertEqual(row['user_vote'], mine.value if mine else 0)
+            self.assertEqual(row['is_bookmarked'], prompt.bookmarks.filter(user=self.user).exists())
+
+
+class PromptSearchTests(PromptAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        make_prompt(self.user, title='Quarterly sales report', prompt_text='Summarise the numbers.')
+        make_prompt(self.user, title='Bug triage', prompt_description='Sort the sales backlog.')
+        make_prompt(self.user, title='Release notes', prompt_text='Write notes for the sales team.')
+        make_prompt(self.user, title='Onboarding plan', prompt_text='Plan the first week.')
+
+    def titles(self, query):
+        res = self.client.get('/api/prompts/', {'search': query})
+        self.assertEqual(res.status_code, 200)
+        return [row['title'] for row in res.data['results']]
+
+    def test_parse_query(self):
+        self.assertEqual(parse_query('Sales "release notes" plan* -'), [
+            Term(Term.WORD, ['sales']),
+            Term(Term.PHRASE, ['release', 'notes']),
+            Term(Term.PREFIX, ['plan']),
+        ])
+        self.assertEqual(
+            PostgresSearchBackend().to_tsquery(parse_query('"release notes" plan*')),
+            '(release <-> notes) & plan:*',
+        )
+
+    def test_queries_use_the_triggers_configuration(self):
+        trigger = importlib.import_module('api.migrations.0014_prompt_search_vector').CREATE_SQL
+        self.assertEqual(trigger.count(f"to_tsvector('{PostgresSearchBackend.config}'"), 3)
+
+    def test_results_are_ranked_title_first(self):
+        self.assertEqual(
+            self.titles('sales'),
+            ['Quarterly sales report', 'Bug triage', 'Release notes'],
+        )
+
+    def test_phrase_and_prefix(self):
+        self.assertEqual(self.titles('"notes for the"'), ['Release notes'])
+        self.assertEqual(self.titles('onboard*'), ['Onboarding plan'])
+
+    def test_ranked_results_paginate(self):
+        first = self.client.get('/api/prompts/', {'search': 'sales', 'page_size': 2}).data
+        second = self.client.get(first['next']).data
+        self.assertEqual(
+            [r['title'] for r in first['results'] + second['results']],
+            self.titles('sales'),
+        )
+
+
+class PromptSuggestTests(PromptAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.sales = make_prompt(self.user, title='Quarterly sales report')
+        make_prompt(self.user, title='Onboarding plan')
+        make_prompt(self.user, title='Sales pitch draft', status='pending')
+
+    def test_trigram_index_tolerates_typos(self):
+        index = TrigramIndex([(1, 'Quarterly sales report'), (2, 'Onboarding plan')])
+        self.assertEqual(index.search('quartrly', limit=5)[0]['id'], 1)
+        self.assertEqual(index.search('onboa', limit=5)[0]['id'], 2)
+        self.assertEqual(index.search('zzzz', limit=5), [])
+
+    def test_suggest_returns_ids_and_titles_of_approved_prompts(self):
+        res = self.client.get('/api/prompts/suggest/', {'q': 'sals'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data, [{'id': self.sales.id, 'title': 'Quarterly sales report'}])
+
+    def test_index_picks_up_newly_approved_prompts(self):
+        self.client.get('/api/prompts/suggest/', {'q': 'pitch'})
+        Prompt.objects.filter(title='Sales pitch draft').update(status='approved')
+        self.assertEqual(self.client.get('/api/prompts/suggest/', {'q': 'pitch'}).data, [])
+        response_cache.bump_generation()
+        with self.assertNumQueries(2):
+            res = self.client.get('/api/prompts/suggest/', {'q': 'pitch'})
+        self.assertEqual([r['title'] for r in res.data], ['Sales pitch draft'])
+
+    def test_empty_query(self):
+        self.assertEqual(self.client.get('/api/prompts/suggest/').data, [])
+
+
+class RelatedIndexTests(TestCase):
+    docs = [
+        (1, 'Sales email', 'Cold outreach', 'Write a cold sales email to a prospect.'),
+        (2, 'Sales follow-up', 'Outreach', 'Write a follow-up sales email after a demo.'),
+        (3, 'Unit tests', 'Testing', 'Generate pytest unit tests for a Python module.'),
+    ]
+
+    def test_related_ranks_by_cosine_similarity(self):
+        index = related.RelatedIndex.build(self.docs)
+        matches = index.related(*self.docs[0][1:], k=3, exclude=1)
+        self.assertEqual([pk for pk, _ in matches], [2])
+        self.assertTrue(0 < matches[0][1] <= 1)
+
+    def test_incremental_updates_match_a_full_build(self):
+        index = related.RelatedIndex.build(self.docs[:2])
+        index.upsert(3, *self.docs[2][1:])
+        index.upsert(2, 'Python tests', '', 'More pytest unit tests.')
+        index.remove(1)
+        rebuilt = related.RelatedIndex.build([self.docs[2], (2, 'Python tests', '', 'More pytest unit tests.')])
+        query = ('pytest', '', 'unit tests for python')
+        self.assertEqual(
+            [pk for pk, _ in index.related(*query)],
+            [pk for pk, _ in rebuilt.related(*query)],
+        )
+        self.assertEqual(len(index), 2)
+        self.assertTrue((index.df == rebuilt.df).all())
+
+    def test_merge_matches_a_full_build(self):
+        index = related.RelatedIndex.build(self.docs[:2])
+        index.merge(related.RelatedIndex.build([self.docs[2], (2, 'Python tests', '', 'More pytest unit tests.')]))
+        rebuilt = related.RelatedIndex.build([self.docs[0], self.docs[2], (2, 'Python tests', '', 'More pytest unit tests.')])
+        query = ('pytest', '', 'unit tests for python')
+        self.assertEqual(index.related(*query), rebuilt.related(*query))
+        self.assertEqual(len(index), 3)
+        self.assertTrue((index.df == rebuilt.df).all())
+
+    def test_logged_changes_match_a_full_build_and_merge(self):
+        edited = (2, 'Python tests', '', 'More pytest unit tests.')
+        rebuilt = related.RelatedIndex.build([self.docs[2], edited])
+        query = ('pytest', '', 'unit tests for python')
+        with tempfile.TemporaryDirectory() as tmp:
+            store = related.RelatedIndexStore(tmp)
+            with store.write_lock():
+                store.publish(related.RelatedIndex.build(self.docs[:2]))
+            store.log({3: related.term_frequencies(*self.docs[2][1:], related.DEFAULT_FEATURES)})
+            store.log({2: related.term_frequencies(*edited[1:], related.DEFAULT_FEATURES), 1: None})
+
+            index = store.get()
+            self.assertIsInstance(index.base.data, related.np.memmap)
+            self.assertEqual(index.related(*query), rebuilt.related(*query))
+            self.assertEqual(sorted(index.rows), [2, 3])
+            self.assertNotIn(1, index)
+            self.assertTrue((index.df == rebuilt.df).all())
+
+            self.assertEqual(store.merge(), 'v2')
+            merged = store.get()
+            self.assertIsInstance(merged, related.RelatedIndex)
+            self.assertEqual(merged.related(*query), rebuilt.related(*query))
+            store.log({3: None})
+            self.assertEqual(sorted(store.get().rows), [2])
+            self.assertEqual(store.merge(), 'v3')
+            self.assertIsNone(store.merge())
+
+    def test_save_and_memory_map(self):
+        index = related.RelatedIndex.build(self.docs)
+        with tempfile.TemporaryDirectory() as tmp:
+            index.save(tmp)
+            loaded = related.RelatedIndex.load(tmp)
+            self.assertEqual(loaded.related(*self.docs[2][1:]), index.related(*self.docs[2][1:]))
+
+
+class RelatedPromptsEndpointTests(PromptAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        override = override_settings(PROMPT_RELATED_INDEX_DIR=self.tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.admin = User.objects.create_user(username='admin', password='pw', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.email = make_prompt(self.admin, title='Sales email', prompt_text='Write a cold sales email.')
+        self.follow = make_prompt(self.admin, title='Sales follow-up', prompt_text='Write a sales follow-up email.')
+        self.tests = make_prompt(self.admin, title='Unit tests', prompt_text='Generate pytest unit tests.')
+
+    def related_titles(self, prompt):
+        res = self.client.get(f'/api/prompts/{prompt.id}/related/')
+        self.assertEqual(res.status_code, 200)
+        return [row['title'] for row in res.data]
+
+    def test_related_prompts(self):
+        self.assertEqual(self.related_titles(self.email), ['Sales follow-up'])
+
+    def test_index_follows_moderation(self):
+        self.related_titles(self.email)  # builds the index
+        draft = make_prompt(self.admin, title='Sales email draft', prompt_text='Cold sales email.', status='pending')
+        self.assertNotIn('Sales email draft', self.related_titles(self.email))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/prompts/{draft.id}/approve/')
+        self.assertIn('Sales email draft', self.related_titles(self.email))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/prompts/{self.follow.id}/reject/')
+        self.assertEqual(self.related_titles(self.email), ['Sales email draft'])
+
+
+class DuplicateDetectionTests(PromptAPITestCase):
+    text = (
+        'You are a senior sales manager. Write a short cold email to a prospect '
+        'introducing our analytics product, mention one customer success story, '
+        'and end with a clear call to action for a twenty minute demo next week.'
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, title, text):
+        return self.client.post('/api/prompts/', {
+            'title': title,
+            'prompt_text': text,
+            'task_type': 'create_content',
+            'output_format': 'text',
+            'category': 'sales',
+        }, format='json')
+
+    def test_bulk_command_streams_batches(self):
+        prompts = [make_prompt(self.user, prompt_text=f'{self.text} Variant {i}.') for i in range(7)]
+        out = io.StringIO()
+        call_command('build_minhash_signatures', workers=1, batch_size=2, stdout=out)
+        self.assertEqual(PromptSignature.objects.filter(prompt__in=prompts).count(), 7)
+        self.assertEqual(PromptLSHBucket.objects.filter(prompt__in=prompts).count(), 7 * minhash.BANDS)
+        self.assertIn('  7 prompts hashed', out.getvalue())
+
+    def test_signature_similarity_tracks_jaccard(self):
+        near = self.text.replace('next week', 'this week')
+        a = minhash.signature(self.text)
+        self.assertEqual(minhash.similarity(a, minhash.signature(self.text)), 1.0)
+        self.assertGreater(minhash.similarity(a, minhash.signature(near)), 0.7)
+        self.assertLess(minhash.similarity(a, minhash.signature('Plan a team offsite agenda.')), 0.1)
+
+    def duplicates(self, pk):
+        return Prompt.objects.get(pk=pk).possible_duplicates
+
+    def test_create_flags_near_duplicates(self):
+        original = self.create('Cold email', self.text).data
+        self.assertEqual(self.duplicates(original['id']), [])
+        self.assertEqual(PromptLSHBucket.objects.filter(prompt_id=original['id']).count(), minhash.BANDS)
+
+        copy = self.create('Cold email (copy)', self.text + ' Keep it friendly.').data
+        flagged = self.duplicates(copy['id'])
+        self.assertEqual([d['id'] for d in flagged], [original['id']])
+        self.assertGreaterEqual(flagged[0]['similarity'], 0.8)
+
+        other = self.create('Offsite', 'Plan a two day engineering offsite with workshops.').data
+        self.assertEqual(self.duplicates(other['id']), [])
+
+        # the flag is kept, so the admin list shows it later
+        self.client.force_authenticate(User.objects.create_user(username='admin', password='pw', is_staff=True))
+        detail = self.client.get(f'/api/prompts/{copy["id"]}/').data
+        self.assertEqual(detail['possible_duplicates'], flagged)
+
+    def test_only_staff_see_duplicates(self):
+        self.create('Cold email', self.text)
+        copy = self.create('Cold email (copy)', self.text + ' Keep it friendly.')
+        self.assertNotIn('possible_duplicates', copy.data)
+        self.assertTrue(self.duplicates(copy.data['id']))
+        pk = copy.data['id']
+        for res in (
+            self.client.get(f'/api/prompts/{pk}/', {'mine': '1'}),
+            self.client.get(f'/api/prompts/{pk}/', {'mine': '1', 'fields': 'title,possible_duplicates'}),
+            self.client.patch(f'/api/prompts/{pk}/?mine=1', {'title': 'Cold email (edited)'}, format='json'),
+        ):
+            self.assertEqual(res.status_code, 200)
+            self.assertNotIn('possible_duplicates', res.data)
+        for params in ({'mine': '1'}, {'mine': '1', 'fields': 'title,possible_duplicates'}):
+            for row in self.client.get('/api/prompts/', params).data['results']:
+                self.assertNotIn('possible_duplicates', row)
+
+
+class VoteCounterTests(PromptAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user(username='author', password='pw')
+        self.prompt = make_prompt(self.author)
+        self.clients = []
+        for i in range(4):
+            client = APIClient()
+            client.force_authenticate(User.objects.create_user(username=f'u{i}', password='pw'))
+            self.clients.append(client)
+
+    def vote(self, i, direction):
+        res = self.clients[i].post(f'/api/prompts/{self.prompt.id}/{direction}/')
+        self.assertEqual(res.status_code, 200)
+        return res.data
+
+    def assert_counts(self, data, likes, dislikes):
+        self.assertEqual((data['like_count'], data['dislike_count']), (likes, dislikes))
+        self.assertEqual(data['vote'], likes - dislikes)
+        self.assertEqual(data['vote_count'], likes - dislikes)
+        self.assertEqual(Vote.objects.filter(prompt=self.prompt, value=1).count(), likes)
+        self.assertEqual(Vote.objects.filter(prompt=self.prompt, value=-1).count(), dislikes)
+
+    def run_toggles(self):
+        self.assert_counts(self.vote(0, 'upvote'), 1, 0)
+        self.assert_counts(self.vote(1, 'upvote'), 2, 0)
+        self.assert_counts(self.vote(2, 'downvote'), 2, 1)
+        self.assert_counts(self.vote(0, 'downvote'), 1, 2)   # switch
+        self.assert_counts(self.vote(1, 'upvote'), 0, 2)     # un-vote
+        data = self.vote(3, 'upvote')
+        self.assertEqual(data['user_vote'], 1)
+        self.assert_counts(data, 1, 2)
+
+    def test_vote_deltas(self):
+        self.assertEqual(counters.vote_deltas(0, 1), (1, 0, 1))
+        self.assertEqual(counters.vote_deltas(1, -1), (-1, 1, -2))
+        self.assertEqual(counters.vote_deltas(-1, 0), (0, -1, 1))
+
+    def test_vote_toggles_apply_deltas(self):
+        self.run_toggles()
+        self.prompt.refresh_from_db()
+        self.assertEqual((self.prompt.like_count, self.prompt.dislike_count, self.prompt.vote), (1, 2, -1))
+
+    def test_vote_query_count_is_constant(self):
+        for client in self.clients[:3]:
+            client.post(f'/api/prompts/{self.prompt.id}/upvote/')
+        with self.assertNumQueries(7):
+            self.vote(3, 'upvote')
+
+    def test_sharded_counters(self):
+        self.vote(0, 'upvote')
+        counters.set_shards(self.prompt.id, 4)
+        self.prompt.refresh_from_db()
+        self.assertEqual(self.prompt.vote_shards, 4)
+        self.vote(0, 'upvote')  # un-vote lands on a shard
+        self.run_toggles()
+        # Folding the shards back keeps the totals
+        counters.set_shards(self.prompt.id, 0)
+        self.prompt.refresh_from_db()
+        self.assertEqual((self.prompt.like_count, self.prompt.dislike_count, self.prompt.vote), (1, 2, -1))
+
+
+class RankingTests(PromptAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user(username='alice', password='pw')
+        now = timezone.now()
+        # (title, net votes, age in hours)
+        self.prompts = {}
+        for title, votes, hours in (('Fresh', 0, 0), ('Rising', 1, 1), ('Classic', 3, 48)):
+            prompt = make_prompt(self.alice, title=title)
+            Prompt.objects.filter(pk=prompt.pk).update(vote=votes, created_at=now - datetime.timedelta(hours=hours))
+            self.prompts[title] = prompt
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def titles(self, ordering):
+        titles, url, params = [], '/api/prompts/', {'ordering': ordering, 'page_size': 1}
+        while url:
+            res = self.client.get(url, params)
+            self.assertEqual(res.status_code, 200)
+            titles += [row['title'] for row in res.data['results']]
+            url, params = res.data['next'], None
+        return titles
+
+    def test_orderings(self):
+        out = io.StringIO()
+        call_command('refresh_hot_scores', stdout=out)
+        self.assertIn('Rescored 2 prompts', out.getvalue())
+        self.assertEqual(self.titles('hot'), ['Rising', 'Classic', 'Fresh'])
+        self.assertEqual(self.titles('top'), ['Classic', 'Rising', 'Fresh'])
+        self.assertEqual(self.titles('new'), ['Fresh', 'Rising', 'Classic'])
+        res = self.client.get('/api/prompts/', {'ordering': 'vote'})
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('ordering', res.data)
+
+    def test_vote_rescores_in_the_same_update(self):
+        prompt = self.prompts['Classic']
+        self.client.post(f'/api/prompts/{prompt.id}/upvote/')
+        prompt.refresh_from_db()
+        self.assertAlmostEqual(prompt.hot_score, ranking.score(4, prompt.created_at), places=6)
+        self.assertGreater(prompt.hot_score, 0)
+
+    def test_refresh_folds_sharded_counters(self):
+        prompt = self.prompts['Fresh']
+        counters.set_shards(prompt.id, 2)
+        self.client.post(f'/api/prompts/{prompt.id}/upvote/')
+        prompt.refresh_from_db()
+        self.assertEqual((prompt.vote, prompt.hot_score), (0, 0))
+        call_command('refresh_hot_scores', stdout=io.StringIO())
+        prompt.refresh_from_db()
+        self.assertEqual(prompt.vote, 1)
+        self.assertGreater(prompt.hot_score, 0)
+        self.assertEqual(counters.shard_totals(prompt.id)['vote'], 0)
+        row = self.client.get(f'/api/prompts/{prompt.id}/').data
+        self.assertEqual((row['vote'], row['like_count']), (1, 1))
+
+
+class ResponseCacheTests(PromptAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(username='admin', password='pw', is_staff=True)
+        self.alice = User.objects.create_user(username='alice', password='pw')
+        self.bob = User.objects.create_user(username='bob', password='pw')
+        self.prompt = make_prompt(self.admin, title='Cached prompt')
+        self.clients = {}
+        for user in (self.admin, self.alice, self.bob):
+            client = APIClient()
+            client.force_authenticate(user)
+            self.clients[user.username] = client
+
+    def get(self, who, url='/api/prompts/'):
+        res = self.clients[who].get(url)
+        self.assertEqual(res.status_code, 200)
+        return res
+
+    def test_hits_merge_per_user_fields(self):
+        first = self.get('alice')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.clients['bob'].post(f'/api/prompts/{self.prompt.id}/upvote/')
+        self.clients['bob'].post(f'/api/prompts/{self.prompt.id}/bookmark/')
+
+        for who, user_vote, bookmarked in (('alice', 0, False), ('bob', 1, True)):
+            res = self.get(who)
+            self.assertEqual(res['X-Cache'], 'HIT')
+            row = res.data['results'][0]
+            self.assertEqual((row['user_vote'], row['is_bookmarked']), (user_vote, bookmarked))
+            self.assertEqual((row['like_count'], row['vote_count'], row['vote']), (1, 1, 1))
+            self.assertEqual(list(row), list(first.data['results'][0]))
+
+        detail = f'/api/prompts/{self.prompt.id}/'
+        self.assertEqual(self.get('bob', detail)['X-Cache'], 'MISS')
+        res = self.get('alice', detail)
+        self.assertEqual(res['X-Cache'], 'HIT')
+        self.assertEqual(res.data['user_vote'], 0)
+
+    def test_moderation_invalidates(self):
+        self.get('alice')
+        self.clients['admin'].post(f'/api/prompts/{self.prompt.id}/reject/')
+        res = self.get('alice')
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'], [])
+
+    def test_staff_listings_bypass_the_cache(self):
+        self.get('admin')
+        self.assertNotIn('X-Cache', self.get('admin'))
+
+    def test_stats(self):
+        self.get('alice')
+        self.get('bob')
+        stats = self.get('admin', '/api/cache/stats/').data
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_ratio']), (1, 1, 0.5))
+        self.assertEqual(self.clients['alice'].get('/api/cache/stats/').status_code, 403)
+
+
+class ConditionalGetTests(PromptAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user(username='alice', password='pw')
+        self.bob = User.objects.create_user(username='bob', password='pw')
+        self.prompt = make_prompt(self.alice, title='Conditional')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.bob_client = APIClient()
+        self.bob_client.force_authenticate(self.bob)
+
+    def revalidate(self, url, **headers):
+        return self.client.get(url, **headers)
+
+    def test_list_304_and_invalidation(self):
+        first = self.client.get('/api/prompts/')
+        etag = first['ETag']
+        self.assertTrue(etag.startswith('"'))
+        self.assertNotIn('Last-Modified', first)
+        # The catalog generation and the page's volatile values; no aggregate over the list.
+        with self.assertNumQueries(2):
+            res = self.revalidate('/api/prompts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res['ETag'], etag)
+
+        # Another user's vote changes the counts in the body
+        self.bob_client.post(f'/api/prompts/{self.prompt.id}/upvote/')
+        res = self.revalidate('/api/prompts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        etag = res['ETag']
+
+        # ...and so does the requesting user's own bookmark
+        self.client.post(f'/api/prompts/{self.prompt.id}/bookmark/')
+        res = self.revalidate('/api/prompts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        etag = res['ETag']
+
+        # A prompt leaving the list, which moves no timestamp the page shows
+        make_prompt(self.alice, title='Older')
+        Prompt.objects.filter(title='Older').update(created_at=self.prompt.created_at - datetime.timedelta(days=1))
+        etag = self.client.get('/api/prompts/')['ETag']
+        admin = APIClient()
+        admin.force_authenticate(User.objects.create_user(username='admin', password='pw', is_staff=True))
+        admin.post(f'/api/prompts/{self.prompt.id}/reject/')
+        res = self.revalidate('/api/prompts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([row['title'] for row in res.data['results']], ['Older'])
+
+    def test_list_etag_depends_on_query(self):
+        a = self.client.get('/api/prompts/')['ETag']
+        b = self.client.get('/api/prompts/?category=design')['ETag']
+        self.assertNotEqual(a, b)
+
+    def test_detail_etag(self):
+        url = f'/api/prompts/{self.prompt.id}/'
+        first = self.client.get(url)
+        self.assertNotIn('Last-Modified', first)
+        res = self.revalidate(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(self.client.get('/api/prompts/999999/').status_code, 404)
+
+    def test_detail_changes_with_other_users_votes(self):
+        url = f'/api/prompts/{self.prompt.id}/'
+        first = self.client.get(url)
+        self.assertEqual(first.data['vote_count'], 0)
+        self.bob_client.post(f'/api/prompts/{self.prompt.id}/upvote/')
+        # A date-only revalidation can't tell, so it gets the full body.
+        res = self.revalidate(url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual((res.status_code, res.data['vote_count']), (200, 1))
+        res = self.revalidate(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual((res.status_code, res.data['vote_count']), (200, 1))
+
+    def test_history(self):
+        url = f'/api/prompts/{self.prompt.id}/history/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.revalidate(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        versioning.snapshot(self.prompt, self.alice, title='Old', prompt_text='old')
+        self.assertEqual(self.revalidate(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_percentile(self):
+        self.assertEqual(benchmark.percentile([1, 2, 3, 4, 5], 50), 3)
+        self.assertAlmostEqual(benchmark.percentile([0, 10], 90), 9)
+        self.assertIsNone(benchmark.percentile([], 50))
+
+    def test_seed_and_run(self):
+        call_command('seed_benchmark_data', users=5, prompts=30, text_words=20, stdout=io.StringIO())
+        self.assertEqual(Prompt.objects.count(), 30)
+
+        out = io.StringIO()
+        call_command('run_benchmarks', iterations=2, warmup=0, only=['list', 'retrieve', 'upvote'], stdout=out)
+        report = json.loads(out.getvalue()[out.getvalue().index('\n{') + 1:])
+        self.assertEqual(report['dataset']['prompts'], 30)
+        self.assertEqual(set(report['results']), {'list', 'retrieve', 'upvote'})
+        self.assertEqual(report['results']['list']['status_codes'], {'200': 2})
+        self.assertIn('queries_mean', report['results']['retrieve'])
+
+
+class MetricsTests(PromptAPITestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.registry.reset()
+        self.alice = User.objects.create_user(username='alice', password='pw')
+        self.admin = User.objects.create_user(username='admin', password='pw', is_staff=True)
+        self.prompt = make_prompt(self.alice)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def scrape(self):
+        self.client.force_authenticate(self.admin)
+        res = self.client.get('/api/metrics/')
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return res.content.decode()
+
+    def test_records_per_action(self):
+        self.client.get('/api/prompts/')
+        self.client.post(f'/api/prompts/{self.prompt.id}/upvote/')
+        self.client.get('/api/prompts/999999/')
+        text = self.scrape()
+
+        self.assertIn(
+            'prompt_http_requests_total{view="prompt-list",action="list",method="GET",status="200"} 1', text
+        )
+        self.assertIn(
+            'prompt_http_requests_total{view="prompt-upvote",action="upvote",method="POST",status="200"} 1', text
+        )
+        self.assertIn('action="retrieve",method="GET",status="404"} 1', text)
+        self.assertIn(
+            'prompt_http_request_duration_seconds_count{view="prompt-list",action="list",method="GET"} 1', text
+        )
+        list_queries = metrics.registry.series[('prompt-list', 'list', 'GET')]['queries']
+        self.assertGreater(list_queries, 0)
+        self.assertIn(
+            f'prompt_db_queries_per_request_sum{{view="prompt-list",action="list",method="GET"}} {list_queries}',
+            text,
+        )
+
+    def test_admin_only(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+    def test_streamed_response_measured_when_consumed(self):
+        make_prompt(self.alice, title='Second')
+        self.client.force_authenticate(self.admin)
+        labels = ('prompt-export', 'export', 'GET')
+        with override_settings(PROMPT_EXPORT_CHUNK_SIZE=1):
+            res = self.client.get('/api/prompts/export/')
+            self.assertNotIn(labels, metrics.registry.series)
+            body = b''.join(res.streaming_content)
+        series = metrics.registry.series[labels]
+        self.assertEqual(series['count'], 1)
+        self.assertEqual(series['bytes'], len(body))
+        # The prompts query plus one versions query per (one-prompt) chunk.
+        self.assertGreaterEqual(series['queries'], 3)
+
+    async def test_async_streamed_response_measured_when_consumed(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.admin)}'}
+        res = await AsyncClient().get('/api/prompts/export/', headers=headers)
+        self.assertTrue(res.is_async)
+        body = b''.join([chunk async for chunk in res.streaming_content])
+        series = metrics.registry.series[('prompt-export', 'export', 'GET')]
+        self.assertEqual(series['count'], 1)
+        self.assertEqual(series['bytes'], len(body))
+        self.assertGreater(series['queries'], 0)
+
+    def test_merges_worker_files(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(PROMPT_METRICS_DIR=directory):
+            other = metrics.Registry()
+            other.observe(('prompt-list', 'list', 'GET'), 200, 0.02, 3, 0.001, 100)
+            other.flush(directory)
+            self.client.get('/api/prompts/')
+            text = self.scrape()
+        self.assertIn(
+            'prompt_http_requests_total{view="prompt-list",action="list",method="GET",status="200"} 2', text
+        )
+
+
+class ProfilerTests(PromptAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        overrides = override_settings(PROMPT_PROFILE_DIR=self.tmp.name, PROMPT_PROFILE_EXPLAIN_MS=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        self.alice = User.objects.create_user(username='alice', password='pw')
+        self.admin = User.objects.create_user(username='admin', password='pw', is_staff=True)
+        self.prompt = make_prompt(self.alice)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_header_profiles_staff_requests(self):
+        res = self.client.get('/api/prompts/', HTTP_X_PROFILE='1')
+        self.assertEqual(res.status_code, 200)
+        report_id = res['X-Profile-Id']
+
+        listing = self.client.get('/api/profiles/').json()
+        self.assertEqual([r['id'] for r in listing], [report_id])
+        self.assertEqual(listing[0]['view'], 'prompt-list')
+
+        report = self.client.get(f'/api/profiles/{report_id}/').json()
+        self.assertGreater(report['query_count'], 0)
+        # threshold 0: every SELECT gets a plan
+        self.assertTrue(all(q.get('explain') for q in report['queries'] if q['sql'].startswith('SELECT')))
+        for name in ('report.json', 'profile.pstats', 'profile.txt'):
+            self.assertTrue(os.path.exists(os.path.join(self.tmp.name, report_id, name)))
+
+        # bookmark toggling is wrapped too, without touching the view
+        res = self.client.post(f'/api/prompts/{self.prompt.id}/bookmark/', HTTP_X_PROFILE='1')
+        self.assertIn('X-Profile-Id', res)
+
+    def test_header_ignored_for_non_staff(self):
+        self.client.force_authenticate(self.alice)
+        res = self.client.get('/api/prompts/', HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', res)
+        self.assertEqual(profiling.list_report_ids(), [])
+        self.assertEqual(self.client.get('/api/profiles/').status_code, 403)
+
+    def test_sampling(self):
+        with override_settings(PROMPT_PROFILE_SAMPLE_RATE=1):
+            res = self.client.get(f'/api/prompts/{self.prompt.id}/')
+        self.assertIn('X-Profile-Id', res)
+        self.assertEqual(profiling.load_report(res['X-Profile-Id'])['trigger'], 'sample')
+        self.assertEqual(self.client.get('/api/profiles/nope/').status_code, 404)
+
+    def test_params_redacted_unless_captured(self):
+        report_id = self.client.get('/api/prompts/', HTTP_X_PROFILE='1')['X-Profile-Id']
+        report = profiling.load_report(report_id)
+        self.assertTrue(any(q['params'] for q in report['queries']))
+        self.assertTrue(all(q['params'] in (None, '[redacted]') for q in report['queries']))
+
+        since = timezone.now()
+        query = {'alias': 'default', 'sql': 'SELECT 1 WHERE %s < %s', 'params': (since, Decimal('1.5')), 'many': False}
+        with override_settings(PROMPT_PROFILE_CAPTURE_PARAMS=True):
+            self.assertEqual(profiling.reported(query)['params'], [repr(since), repr(Decimal('1.5'))])
+            password = {**query, 'sql': 'UPDATE "auth_user" SET "password" = %s', 'params': ('pbkdf2$...',)}
+            self.assertEqual(profiling.reported(password)['params'], '[redacted]')
+
+    def test_explain_uses_raw_params(self):
+        recorder = profiling.QueryRecorder('default')
+        with connection.execute_wrapper(recorder), connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM api_prompt WHERE %s IS NOT NULL', [b'\x00'])
+        query = recorder.queries[-1]
+        self.assertEqual(query['params'], [b'\x00'])
+        self.assertFalse(profiling.explain(query).startswith('EXPLAIN failed'))
+        self.assertIsNone(profiling.explain({**query, 'many': True}))
+
+    def test_analyze_skips_side_effects(self):
+        self.assertTrue(profiling._analyzable('SELECT "id" FROM "api_prompt"'))
+        self.assertTrue(profiling._analyzable('WITH t AS (SELECT 1) SELECT * FROM t'))
+        self.assertFalse(profiling._analyzable('SELECT "id" FROM "api_prompt" FOR UPDATE'))
+        self.assertFalse(profiling._analyzable("SELECT nextval('api_prompt_id_seq')"))
+        self.assertFalse(profiling._analyzable('WITH d AS (DELETE FROM "api_vote" RETURNING 1) SELECT count(*) FROM d'))
+        self.assertFalse(profiling._analyzable('DELETE FROM "api_vote"'))
+
+
+class VersionStorageTests(PromptAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user(username='alice', password='pw')
+        self.admin = User.objects.create_user(username='admin', password='pw', is_staff=True)
+        self.text = ' '.join(f'line {i}: explain the quarterly report.\n' for i in range(200))
+        self.prompt = make_prompt(self.alice, prompt_text=self.text, guidance='Be brief.')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def edit(self, **data):
+        res = self.client.patch(f'/api/prompts/{self.prompt.id}/', data, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.prompt.refresh_from_db()
+
+    def test_delta_roundtrip(self):
+        base = 'Hello, world!\nSecond  line \u00e9t\u00e9.'
+        for text in ('', base, base + ' more', 'Hello there!\nSecond line', 'x' * 10):
+            self.assertEqual(versioning.apply_delta(base, versioning.make_delta(base, text)), text)
+
+    def test_edits_store_deltas_and_dedupe(self):
+        self.edit(title='Renamed')  # body unchanged
+        self.edit(prompt_text=self.text + ' And a conclusion.')
+        self.edit(title='Renamed again')
+
+        versions = list(PromptVersion.objects.filter(prompt=self.prompt).order_by('id'))
+        self.assertEqual(len(versions), 3)
+        # the first two snapshots share one body
+        self.assertEqual(versions[0].content_id, versions[1].content_id)
+        delta = versions[2].content
+        self.assertEqual(delta.base_id, versions[1].content_id)
+        self.assertLess(len(delta.data), 200)
+        self.assertEqual(PromptVersion.objects.get(pk=versions[2].pk).prompt_text, self.text + ' And a conclusion.')
+
+    def test_keyframes(self):
+        with override_settings(PROMPT_VERSION_KEYFRAME_INTERVAL=3):
+            for i in range(7):
+                self.edit(prompt_text=f'{self.text} edit {i}')
+        depths = [v.content.depth for v in PromptVersion.objects.filter(prompt=self.prompt).order_by('id')]
+        self.assertEqual(depths, [0, 1, 2, 0, 1, 2, 0])
+
+    def test_history_pagination_and_summary(self):
+        for i in range(5):
+            self.edit(prompt_text=f'{self.text} edit {i}')
+        url = f'/api/prompts/{self.prompt.id}/history/'
+
+        page = self.client.get(url, {'page_size': 2}).json()
+        self.assertEqual(len(page['results']), 2)
+        self.assertEqual(page['results'][0]['prompt_text'], f'{self.text} edit 3')
+        rest = self.client.get(page['next']).json()
+        self.assertEqual(len(rest['results']), 2)
+
+        summary = self.client.get(url, {'summary': 1}).json()['results']
+        self.assertEqual(len(summary), 5)
+        self.assertNotIn('prompt_text', summary[0])
+        self.assertEqual(summary[0]['size'], len(versioning.encode_body({
+            'prompt_text': f'{self.text} edit 3', 'guidance': 'Be brief.', 'prompt_description': None,
+        })))
+
+    def test_revert_is_exact(self):
+        original = self.text + ' \u2713  doubled  spaces'
+        self.edit(prompt_text=original, prompt_description='')
+        for i in range(4):
+            self.edit(prompt_text=f'{self.text} edit {i}', guidance=None)
+        first = PromptVersion.objects.filter(prompt=self.prompt).order_by('id')[1]
+
+        res = self.client.post(f'/api/prompts/{self.prompt.id}/revert/{first.id}/')
+        self.assertEqual(res.status_code, 200)
+        self.prompt.refresh_from_db()
+        self.assertEqual(self.prompt.prompt_text, original)
+        self.assertEqual(self.prompt.prompt_description, '')
+        self.assertEqual(self.prompt.guidance, 'Be brief.')
+
+    def test_corrupt_content_is_detected(self):
+        self.edit(title='Renamed')
+        version = PromptVersion.objects.get(prompt=self.prompt)
+        PromptContent.objects.filter(pk=version.content_id).update(digest='0' * 64)
+        with self.assertRaises(ValueError):
+            PromptVersion.objects.get(pk=version.pk).prompt_text
+
+    def test_migration_codec_matches_versioning(self):
+        # 0019 carries its own copy of the codec; what it stored must stay readable.
+        migration = importlib.import_module('api.migrations.0019_prompt_content')
+        base_text = migration.encode_body({'prompt_text': self.text, 'guidance': 'Be brief.'})
+        text = migration.encode_body({'prompt_text': self.text + ' edit', 'guidance': 'Be brief.'})
+        base = migration.store_body(PromptContent, base_text, None, None)
+        content = migration.store_body(PromptContent, text, base, base_text)
+        self.assertEqual(content.base_id, base.pk)
+        self.assertEqual(versioning.load_body(content), migration.load_body(PromptContent, content))
+        self.assertEqual(versioning.load_body(content)['prompt_text'], self.text + ' edit')
+
+
+class VersionDiffTests(PromptAPITestCase):
+    def setUp(self):
+        super().setUp()
+        diffs.cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='pw')
+        self.bob = User.objects.create_user(username='bob', password='pw')
+        self.prompt = make_prompt(self.alice, prompt_text='one\ntwo\nthree\n', guidance='Be brief.')
+        self.old = versioning.snapshot(self.prompt, self.alice)
+        self.new = versioning.snapshot(self.prompt, self.alice, prompt_text='one\n2\nthree\nfour\n')
+        self.url = f'/api/prompts/{self.prompt.id}/history/{self.old.id}/diff/{self.new.id}/'
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def get_json(self, url, **params):
+        res = self.client.get(url, params)
+        self.assertEqual(res.status_code, 200)
+        return res, json.loads(b''.join(res.streaming_content))
+
+    def test_line_diff(self):
+        res, data = self.get_json(self.url)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        text = data['fields']['prompt_text']
+        self.assertEqual(text['ops'], [['=', 'one\n'], ['-', 'two\n'], ['+', '2\n'], ['=', 'three\n'], ['+', 'four\n']])
+        self.assertEqual(text['stats'], {'insertions': 2, 'deletions': 1})
+        self.assertEqual(data['fields']['guidance']['ops'], [['=', 'Be brief.']])
+        self.assertEqual(data['fields']['prompt_description']['ops'], [])
+
+        res, again = self.get_json(self.url)
+        self.assertEqual(res['X-Cache'], 'HIT')
+        self.assertEqual(again, data)
+
+    def test_word_diff(self):
+        _, data = self.get_json(self.url, granularity='word')
+        self.assertIn(['-', 'two'], data['fields']['prompt_text']['ops'])
+        self.assertEqual(self.client.get(self.url, {'granularity': 'char'}).status_code, 400)
+
+    def test_large_word_diff_falls_back_to_lines(self):
+        with override_settings(PROMPT_DIFF_MAX_TOKENS=10):
+            _, data = self.get_json(self.url, granularity='word')
+        self.assertEqual(data['granularity'], 'line')
+        self.assertIn(['-', 'two\n'], data['fields']['prompt_text']['ops'])
+
+    def test_oversized_diff_is_still_correct(self):
+        old = ''.join(f'line {i % 7}\n' for i in range(3000))
+        new = old.replace('line 3\n', 'line three\n', 5)
+        with override_settings(PROMPT_DIFF_MAX_TOKENS=100):
+            ops = diffs.diff_text(old, new)['ops']
+        self.assertEqual(''.join(text for kind, text in ops if kind != '+'), old)
+        self.assertEqual(''.join(text for kind, text in ops if kind != '-'), new)
+
+    def test_large_diff_streams_in_chunks(self):
+        result = diffs.diff_text('\n'.join(map(str, range(0, 2000, 2))), '\n'.join(map(str, range(2000))))
+        chunks = list(diffs.iter_json({'from': 1, 'to': 2, 'granularity': 'line', 'fields': {'prompt_text': result}}))
+        self.assertGreater(len(chunks), 5)
+        self.assertEqual(json.loads(''.join(chunks))['fields']['prompt_text']['ops'], result['ops'])
+
+    def test_access(self):
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        other = versioning.snapshot(make_prompt(self.bob), self.bob)
+        self.client.force_authenticate(self.alice)
+        url = f'/api/prompts/{self.prompt.id}/history/{self.old.id}/diff/{other.id}/'
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_ttl_cache(self):
+        def result(text):
+            return {'fields': {'prompt_text': {'ops': [['+', text]]}}}
+
+        small = diffs.TTLCache.cost(result('x' * 100))
+        cache = diffs.TTLCache(max_bytes=2 * small, ttl=60)
+        for key in 'abc':
+            cache.set(key, result('x' * 100))
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertEqual(cache.size, 2 * small)
+
+        # One large diff pushes out the small ones; one too large is skipped.
+        cache.set('big', result('x' * (small + 100)))
+        self.assertEqual(len(cache), 1)
+        cache.set('huge', result('x' * 3 * small))
+        self.assertIsNone(cache.get('huge'))
+        self.assertIsNotNone(cache.get('big'))
+
+        cache.ttl = -1
+        cache.set('d', result('d'))
+        self.assertIsNone(cache.get('d'))
+
+
+class ExportTests(PromptAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user(username='alice', password='pw')
+        self.admin = User.objects.create_user(username='admin', password='pw', is_staff=True)
+        self.prompts = [make_prompt(self.alice, title=f'Prompt {i}', category='sales' if i % 2 else 'engineering')
+                        for i in range(5)]
+        versioning.snapshot(self.prompts[0], self.alice)
+        versioning.snapshot(self.prompts[0], self.alice, prompt_text='Second draft.')
+        Prompt.objects.filter(pk=self.prompts[1].pk).update(like_count=3, vote=3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def export(self, **params):
+        res = self.client.get('/api/prompts/export/', params)
+        self.assertEqual(res.status_code, 200)
+        return res, b''.join(res.streaming_content).decode('utf-8')
+
+    def test_ndjson(self):
+        res, body = self.export()
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([r['id'] for r in rows], [p.id for p in self.prompts])
+        self.assertEqual(rows[1]['like_count'], 3)
+        self.assertEqual(rows[0]['user_username'], 'alice')
+        self.assertEqual([v['prompt_text'] for v in rows[0]['versions']], ['Write something useful.', 'Second draft.'])
+
+    def test_csv_and_filters(self):
+        res, body = self.export(format='csv', category='sales')
+        self.assertFalse(res.is_async)
+        self.assertTrue(res['Content-Type'].startswith('text/csv'))
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([int(r['id']) for r in rows], [self.prompts[1].id, self.prompts[3].id])
+        self.assertEqual(json.loads(rows[0]['versions']), [])
+
+    def test_updated_since(self):
+        Prompt.objects.filter(pk__in=[p.pk for p in self.prompts[:3]]).update(
+            updated_at=timezone.now() - datetime.timedelta(days=3))
+        since = (timezone.now() - datetime.timedelta(days=1)).isoformat()
+        _, body = self.export(updated_since=since)
+        self.assertEqual([json.loads(line)['id'] for line in body.splitlines()], [p.id for p in self.prompts[3:]])
+        self.assertEqual(self.client.get('/api/prompts/export/', {'updated_since': 'yesterday'}).status_code, 400)
+
+    def test_chunks_query_count(self):
+        # One query for the prompts plus one for the versions (and their
+        # contents) of each chunk.
+        with self.assertNumQueries(4):
+            records = list(export.iter_records(Prompt.objects.all(), size=2))
+        self.assertEqual(len(records), 5)
+
+    def test_admin_only(self):
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(self.client.get('/api/prompts/export/').status_code, 403)
+
+    async def test_asgi_streams_asynchronously(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.admin)}'}
+        with override_settings(PROMPT_EXPORT_CHUNK_SIZE=2):
+            res = await AsyncClient().get('/api/prompts/export/', {'format': 'csv'}, headers=headers)
+            self.assertTrue(res.is_async)
+            body = b''.join([chunk async for chunk in res.streaming_content]).decode('utf-8')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([int(r['id']) for r in rows], [p.id for p in self.prompts])
+        self.assertEqual(len(json.loads(rows[0]['versions'])), 2)
+
+
+class ImportTests(PromptAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(username='admin', password='pw', is_staff=True)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        override = override_settings(PROMPT_RELATED_INDEX_DIR=self.tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.records = [
+            json.dumps({'title': f'Imported {i}', 'prompt_text': f'Text number {i}.', 'task_type': 'research',
+                        'output_format': 'text', 'category': 'sales'})
+            for i in range(7)
+        ]
+        self.records[2] = json.dumps({'title': 'No text', 'task_type': 'research', 'output_format': 'text',
+                                      'category': 'sales'})
+        self.records[4] = '{not json'
+        self.path = os.path.join(self.tmp.name, 'prompts.jsonl')
+        with open(self.path, 'w') as f:
+            f.write('\n'.join(self.records) + '\n')
+
+    def test_batches_report_bad_rows(self):
+        run = importer.PromptImporter(self.admin, batch_size=3)
+        batches = list(run.batches(self.records))
+        self.assertEqual([b.offset for b in batches], [3, 6, 7])
+        errors = [e for b in batches for e in b.errors]
+        self.assertEqual([e['line'] for e in errors], [3, 5])
+        self.assertIn('prompt_text', errors[0]['errors'])
+        self.assertEqual(run.imported, 5)
+        imported = Prompt.objects.filter(title__startswith='Imported')
+        self.assertEqual(imported.count(), 5)
+        self.assertEqual(set(imported.values_list('status', 'user__username')), {('approved', 'admin')})
+        self.assertEqual(PromptSignature.objects.filter(prompt__in=imported).count(), 5)
+        self.assertEqual(PromptLSHBucket.objects.filter(prompt__in=imported).count(), 5 * minhash.BANDS)
+        self.assertEqual(sum(n for _, n in facets.rollup()), 5)
+        run.finish()
+        index = related.get_store().get()
+        self.assertEqual(set(index.rows), set(imported.values_list('id', flat=True)))
+
+    def test_command_resumes_from_checkpoint(self):
+        checkpoint = os.path.join(self.tmp.name, 'checkpoint.json')
+        errors = os.path.join(self.tmp.name, 'errors.jsonl')
+        with open(checkpoint, 'w') as f:
+            json.dump({'offset': 3}, f)
+        call_command('import_prompts', self.path, user='admin', batch_size=2, checkpoint=checkpoint,
+                     errors=errors, stdout=io.StringIO())
+        self.assertEqual(sorted(Prompt.objects.values_list('title', flat=True)),
+                         ['Imported 3', 'Imported 5', 'Imported 6'])
+        with open(checkpoint) as f:
+            self.assertEqual(json.load(f), {'offset': 7})
+        with open(errors) as f:
+            self.assertEqual([json.loads(line)['line'] for line in f], [5])
+
+    def test_field_map_and_defaults(self):
+        lines = [json.dumps({'request_id': 'r-1', 'title': 'Mapped', 'body': 'From the body.'})]
+        run = importer.PromptImporter(self.admin, status='pending', field_map={'body': 'prompt_text'},
+                                      defaults={'task_type': 'research', 'output_format': 'text',
+                                                'category': 'engineering'})
+        self.assertEqual([b.imported for b in run.batches(lines)], [1])
+        self.assertEqual(Prompt.objects.get(title='Mapped').prompt_text, 'From the body.')
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with open(self.path, 'rb') as f:
+            res = client.post('/api/prompts/import/?start=1', {'file': f}, format='multipart')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((res.data['imported'], res.data['rejected'], res.data['offset']), (4, 2, 7))
+        res = client.generic('POST', '/api/prompts/import/', self.records[0] + '\n',
+                             content_type='application/x-ndjson')
+        self.assertEqual(res.data['imported'], 1)
+        client.force_authenticate(User.objects.create_user(username='bob', password='pw'))
+        self.assertEqual(client.generic('POST', '/api/prompts/import/', self.records[0],
+                                        content_type='application/x-ndjson').status_code, 403)
+
+    def test_copy_driver_errors_are_database_errors(self):
+        class CopyCursor:
+            # A Django cursor whose raw driver cursor rejects the COPY.
+            def __init__(self):
+                self.cursor = self
+
+            def execute(self, sql, params):
+                self.count = params[0]
+
+            def fetchall(self):
+                return [(pk,) for pk in range(1, self.count + 1)]
+
+            def copy_expert(self, sql, buffer):
+                raise connection.Database.DataError('invalid input for COPY')
+
+        run = importer.PromptImporter(self.admin)
+        prompt, _ = run._validate(1, self.records[0])
+        with self.assertRaises(DatabaseError):
+            run._copy(CopyCursor(), [prompt])
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY needs PostgreSQL')
+    def test_copy_batch_reports_the_rejected_row(self):
+        # Too many lexemes for the search_vector trigger's tsvector: only the
+        # database rejects it.
+        huge = json.dumps({'title': 'Huge', 'prompt_text': ' '.join(f'w{i}x' for i in range(200000)),
+                           'task_type': 'research', 'output_format': 'text', 'category': 'sales'})
+        run = importer.PromptImporter(self.admin, batch_size=10, use_copy=True)
+        self.assertTrue(run.use_copy)
+        batches = list(run.batches([self.records[0], huge, self.records[1], self.records[3]]))
+        self.assertEqual([e['line'] for b in batches for e in b.errors], [2])
+        self.assertEqual(run.imported, 3)
+        self.assertEqual(sorted(Prompt.objects.values_list('title', flat=True)),
+                         ['Imported 0', 'Imported 1', 'Imported 3'])
+
+    def test_copy_columns_cover_the_table(self):
+        # COPY doesn't apply field defaults: a NOT NULL column left out fails
+        # every batch on PostgreSQL.
+        columns = {f.column for f in Prompt._meta.concrete_fields} - {'search_vector'}
+        self.assertEqual(set(importer.COPY_COLUMNS), columns)
+        self.assertEqual(len(importer.COPY_COLUMNS), len(columns))
+        self.assertEqual(importer.COPY_COLUMNS[-1], 'possible_duplicates')
+
+    def test_copy_escaping(self):
+        self.assertEqual(importer._copy_value(None), '\\N')
+        self.assertEqual(importer._copy_value('a\tb\nc\\d'), 'a\\tb\\nc\\\\d')
+
+
+class ModerationTests(PromptAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        override = override_settings(PROMPT_RELATED_INDEX_DIR=self.tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.alice = User.objects.create_user(username='alice', password='pw')
+        self.admin = User.objects.create_user(username='admin', password='pw', is_staff=True)
+        statuses = ['pending', 'approved', 'pending_deletion', 'pending', 'rejected', 'pending']
+        self.prompts = [make_prompt(self.alice, title=f'Prompt {i}', status=s) for i, s in enumerate(statuses)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_queue_is_oldest_first_and_paginated(self):
+        res = self.client.get('/api/prompts/moderation/', {'page_size': 2})
+        self.assertEqual(res.status_code, 200)
+        ids = [row['id'] for row in res.data['results']]
+        res = self.client.get(res.data['next'])
+        ids += [row['id'] for row in res.data['results']]
+        self.assertIsNone(res.data['next'])
+        self.assertEqual(ids, [self.prompts[i].id for i in (0, 2, 3, 5)])
+        self.assertNotIn('prompt_text', res.data['results'][0])
+        self.assertEqual(res.data['results'][0]['user_username'], 'alice')
+
+        res = self.client.get('/api/prompts/moderation/', {'status': 'pending_deletion'})
+        self.assertEqual([row['id'] for row in res.data['results']], [self.prompts[2].id])
+        self.assertEqual(self.client.get('/api/prompts/moderation/', {'status': 'approved'}).status_code, 400)
+
+    def test_bulk_approve(self):
+        ids = [self.prompts[0].id, self.prompts[1].id, 9999, self.prompts[3].id]
+        # SELECT ... FOR UPDATE, one UPDATE and the generation bump, plus the
+        # savepoint pair of the atomic block. The facet rollup adds an insert
+        # of missing rows and an UPDATE per changed combination.
+        with self.assertNumQueries(8):
+            res = self.client.post('/api/prompts/moderation/bulk/', {'action': 'approve', 'ids': ids}, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['changed'], 2)
+        self.assertEqual(res.data['results'], [
+            {'id': ids[0], 'status': 'approved'},
+            {'id': ids[1], 'error': 'Prompt is already approved.'},
+            {'id': 9999, 'error': 'Not found.'},
+            {'id': ids[3], 'status': 'approved'},
+        ])
+        self.assertEqual(Prompt.objects.get(pk=ids[0]).status, 'approved')
+
+    def test_bulk_delete_and_validation(self):
+        ids = [self.prompts[2].id, self.prompts[4].id]
+        res = self.client.post('/api/prompts/moderation/bulk/', {'action': 'delete', 'ids': ids}, format='json')
+        self.assertEqual([r['status'] for r in res.data['results']], ['deleted', 'deleted'])
+        self.assertFalse(Prompt.objects.filter(pk__in=ids).exists())
+        for body in ({'action': 'publish', 'ids': [1]}, {'action': 'reject', 'ids': []},
+                     {'action': 'reject', 'ids': ['1']}):
+            self.assertEqual(self.client.post('/api/prompts/moderation/bulk/', body, format='json').status_code, 400)
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(self.client.post('/api/prompts/moderation/bulk/',
+                                          {'action': 'reject', 'ids': [1]}, format='json').status_code, 403)
+        self.assertEqual(self.client.get('/api/prompts/moderation/').status_code, 403)
+
+    def test_bulk_reject_restores_pending_deletion(self):
+        facets.rebuild()
+        ids = [self.prompts[0].id, self.prompts[2].id]
+        res = self.client.post('/api/prompts/moderation/bulk/', {'action': 'reject', 'ids': ids}, format='json')
+        self.assertEqual(res.data['changed'], 2)
+        self.assertEqual(res.data['results'], [
+            {'id': ids[0], 'status': 'rejected'},
+            {'id': ids[1], 'status': 'approved'},
+        ])
+        self.assertEqual(Prompt.objects.get(pk=ids[0]).status, 'rejected')
+        self.assertEqual(Prompt.objects.get(pk=ids[1]).status, 'approved')
+        maintained = sorted(facets.rollup())
+        facets.rebuild()
+        self.assertEqual(maintained, sorted(facets.rollup()))
+
+    def test_related_index_follows_bulk_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/prompts/moderation/bulk/',
+                             {'action': 'approve', 'ids': [self.prompts[0].id]}, format='json')
+        self.assertIn(self.prompts[0].id, related.get_store().get())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/prompts/moderation/bulk/',
+                             {'action': 'reject', 'ids': [self.prompts[0].id, self.prompts[1].id]}, format='json')
+        index = related.get_store().get()
+        self.assertNotIn(self.prompts[0].id, index)
+        self.assertNotIn(self.prompts[1].id, index)
+
+
+class SparseFieldsetTests(PromptAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user(username='alice', password='pw')
+        self.prompt = make_prompt(self.alice, title='Card', prompt_description='Short.',
+                                  prompt_text='Long body ' * 200, guidance='Read carefully.')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_list_is_slim_and_defers_large_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get('/api/prompts/')
+        row = res.data['results'][0]
+        self.assertEqual(row['prompt_description'], 'Short.')
+        self.assertEqual(row['like_count'], 0)
+        for name in ('prompt_text', 'guidance', 'possible_duplicates'):
+            self.assertNotIn(name, row)
+        page_query = next(q['sql'] for q in ctx.captured_queries if 'LIMIT' in q['sql'])
+        self.assertNotIn('"prompt_text"', page_query)
+
+        detail = self.client.get(f'/api/prompts/{self.prompt.id}/').data
+        self.assertEqual(detail['prompt_text'], self.prompt.prompt_text)
+        self.assertEqual(detail['guidance'], 'Read carefully.')
+
+    def test_fields_and_omit(self):
+        row = self.client.get('/api/prompts/', {'fields': 'title,prompt_text'}).data['results'][0]
+        self.assertEqual(set(row), {'id', 'title', 'prompt_text'})
+        row = self.client.get('/api/prompts/', {'omit': 'user,user_vote'}).data['results'][0]
+        self.assertNotIn('user_vote', row)
+        self.assertIn('like_count', row)
+        detail = self.client.get(f'/api/prompts/{self.prompt.id}/', {'fields': 'title'}).data
+        self.assertEqual(detail, {'id': self.prompt.id, 'title': 'Card'})
+
+    def test_cached_rows_keep_their_fieldset(self):
+        for expected in ('MISS', 'HIT'):
+            res = self.client.get('/api/prompts/', {'fields': 'title,like_count'})
+            self.assertEqual(res['X-Cache'], expected)
+            self.assertEqual(set(res.data['results'][0]), {'id', 'title', 'like_count'})
+
+    def test_writes_ignore_fieldsets(self):
+        res = self.client.patch(f'/api/prompts/{self.prompt.id}/?fields=title', {'guidance': 'New.'}, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['guidance'], 'New.')
+
+
+class FragmentTests(PromptAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user(username='alice', password='pw')
+        self.bob = User.objects.create_user(username='bob', password='pw')
+        self.prompts = [
+            make_prompt(self.alice, title=f'Prompt {i} \u2028 \u00e9', prompt_description=f'About {i}.',
+                        guidance='Be brief.')
+            for i in range(3)
+        ]
+        Vote.objects.create(user=self.bob, prompt=self.prompts[1], value=1)
+        counters.apply_vote(self.prompts[1].pk, 0, 1)
+        Bookmark.objects.create(user=self.bob, prompt=self.prompts[2])
+        self.client = APIClient()
+        self.client.force_authenticate(self.bob)
+
+    def expected(self, res, serializer_class, params=None, user=None):
+        # What JSONRenderer makes of the serializer for the same rows.
+        user = user or self.bob
+        request = Request(APIRequestFactory().get('/api/prompts/', params or {}))
+        request.user = user
+        ids = [row['id'] for row in res.data['results']]
+        prompts = Prompt.objects.with_vote_stats(user).in_bulk(ids)
+        rows = serializer_class([prompts[pk] for pk in ids], many=True, context={'request': request}).data
+        return JSONRenderer().render(rows)
+
+    def results(self, res):
+        return b'[' + res.content.split(b'"results":[', 1)[1][:-1]
+
+    def test_rows_match_the_serializer(self):
+        for params, serializer_class in (
+            ({}, PromptListSerializer),
+            ({'fields': 'title,guidance,like_count,user_vote'}, PromptSerializer),
+            ({'omit': 'user_vote,created_at'}, PromptListSerializer),
+        ):
+            for expected_cache in ('MISS', 'HIT'):
+                res = self.client.get('/api/prompts/', params)
+                self.assertEqual(res['X-Cache'], expected_cache)
+                self.assertEqual(self.results(res), self.expected(res, serializer_class, params))
+        res = self.client.get('/api/prompts/', {'mine': '1'})
+        self.assertEqual(self.results(res), self.expected(res, PromptListSerializer))
+
+    def test_cached_page_renders_evicted_fragments(self):
+        self.client.get('/api/prompts/')
+        fragments.cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get('/api/prompts/')
+        self.assertEqual(res['X-Cache'], 'HIT')
+        self.assertEqual(self.results(res), self.expected(res, PromptListSerializer))
+        self.assertEqual(len(fragments.cache), 3)
+        self.assertEqual(len(ctx.captured_queries), 3)
+
+    def test_saving_a_prompt_moves_its_key(self):
+        self.client.get('/api/prompts/', {'mine': '1'})
+        Prompt.objects.filter(pk=self.prompts[0].pk).update(title='Renamed', updated_at=timezone.now())
+        titles = [row['title'] for row in self.client.get('/api/prompts/', {'mine': '1'}).data['results']]
+        self.assertIn('Renamed', titles)
+        self.assertEqual(len(fragments.cache), 4)
+
+    def test_renaming_a_user_moves_their_keys(self):
+        self.assertEqual(self.client.get('/api/prompts/')['X-Cache'], 'MISS')
+        self.alice.username = 'alice2'
+        self.alice.save()
+        res = self.client.get('/api/prompts/')
+        self.assertEqual({row['user_username'] for row in res.data['results']}, {'alice2'})
+        self.assertEqual(self.results(res), self.expected(res, PromptListSerializer))
+        with self.assertNumQueries(1):
+            self.bob.save(update_fields=['email'])
+
+    def test_lru_is_bounded_by_size(self):
+        lru = fragments.FragmentCache(max_bytes=3 * (fragments.ENTRY_OVERHEAD + 100))
+        for key in 'abc':
+            lru.set(key, (b'x' * 60, b'y' * 40))
+        lru.get('a')
+        lru.set('d', (b'z' * 100,))
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual([lru.get(key) is not None for key in 'acd'], [True, True, True])
+        self.assertEqual(lru.size, 3 * (fragments.ENTRY_OVERHEAD + 100))
+        lru.set('huge', (b'x' * lru.max_bytes,))
+        self.assertIsNone(lru.get('huge'))
+        self.assertEqual(len(lru), 3)
+
+    def test_warm_command_fills_the_shared_cache(self):
+        with self.assertRaises(CommandError):
+            call_command('warm_prompt_fragments', stdout=io.StringIO())
+        with override_settings(PROMPT_FRAGMENT_CACHE_ALIAS='prompts'):
+            call_command('warm_prompt_fragments', full=True, stdout=io.StringIO())
+            rows = fragments.RowRenderer(PromptListSerializer())
+            keys = [rows.key_for(p) for p in Prompt.objects.filter(pk__in=[p.pk for p in self.prompts])]
+            self.assertEqual(len(caches['prompts'].get_many(keys)), 3)
+            res = self.client.get('/api/prompts/')
+            self.assertEqual(self.results(res), self.expected(res, PromptListSerializer))
+
+
+@override_settings(PROMPT_LIST_FAST_PATH=True)
+class FastPathTests(FragmentTests):
+    # Every FragmentTests check again, with rows built from values_list().
+
+    def test_searches_staff_and_later_pages_match(self):
+        for i in range(4):
+            make_prompt(self.alice, title=f'Needle {i}', possible_duplicates=[{'id': 1, 'score': 0.9}])
+        make_prompt(self.alice, title='Needle draft', status='pending')
+        staff = User.objects.create_user(username='staff', password='pw', is_staff=True)
+        admin = APIClient()
+        admin.force_authenticate(staff)
+        full = {'fields': 'title,possible_duplicates,guidance,status,created_at,is_bookmarked'}
+
+        res = self.client.get('/api/prompts/', {'search': 'needle', 'page_size': 2})
+        self.assertEqual(self.results(res), self.expected(res, PromptListSerializer))
+        res = self.client.get(res.data['next'])
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertEqual(self.results(res), self.expected(res, PromptListSerializer))
+        res = admin.get('/api/prompts/', full)
+        self.assertEqual(len(res.data['results']), 8)
+        self.assertEqual(self.results(res), self.expected(res, PromptSerializer, full, user=staff))
+
+    def test_same_queries_as_the_serializer_path(self):
+        counts = []
+        for enabled in (False, True):
+            caches['prompts'].clear()
+            fragments.cache.clear()
+            with override_settings(PROMPT_LIST_FAST_PATH=enabled), CaptureQueriesContext(connection) as ctx:
+                self.client.get('/api/prompts/')
+            counts.append(len(ctx.captured_queries))
+            page_query = next(q['sql'] for q in ctx.captured_queries if '"api_prompt"."title"' in q['sql'])
+            # Instances join the whole author row; the fast path only its username.
+            self.assertEqual('"auth_user"."password"' in page_query, not enabled)
+        self.assertEqual(counts[0], counts[1])
+
+    def test_unmapped_fields_fall_back(self):
+        request = Request(APIRequestFactory().get('/api/prompts/'))
+        request.user = self.bob
+        serializer = PromptListSerializer(context={'request': request})
+        with self.assertRaises(fastpath.Unsupported):
+            fastpath.CompiledRows(serializer, annotations={})
+        compiled = fastpath.CompiledRows(serializer, Prompt.objects.with_vote_stats(self.bob).query.annotations)
+        self.assertIn('user__username', compiled.columns)
+
+
+class FacetTests(PromptAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user(username='alice', password='pw')
+        self.admin = User.objects.create_user(username='admin', password='pw', is_staff=True)
+        rows = [
+            ('engineering', 'create_code', 'code', 'approved', 'Parser generator'),
+            ('engineering', 'create_content', 'text', 'approved', 'Release notes'),
+            ('marketing', 'create_content', 'text', 'approved', 'Launch email'),
+            ('marketing', 'create_content', 'code', 'pending', 'Landing page'),
+            ('sales', 'create_content', 'text', 'rejected', 'Cold email'),
+        ]
+        self.prompts = [
+            make_prompt(self.alice, category=c, task_type=t, output_format=o, status=s, title=title)
+            for c, t, o, s, title in rows
+        ]
+        # make_prompt bypasses the views that keep the rollup up to date.
+        facets.rebuild()
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def facets(self, params=None, user=None):
+        if user is not None:
+            self.client.force_authenticate(user)
+        res = self.client.get('/api/prompts/facets/', params or {})
+        self.assertEqual(res.status_code, 200)
+        return res
+
+    def rollup(self):
+        return sorted(facets.rollup())
+
+    def test_counts_exclude_their_own_filter(self):
+        data = self.facets({'category': 'engineering'}).data
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['category'], {'engineering': 2, 'marketing': 1})
+        self.assertEqual(data['output_format'], {'code': 1, 'text': 1})
+        self.assertEqual(data['status'], {'approved': 2})
+
+        data = self.facets({'category': 'engineering', 'output_format': 'text'}).data
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['category'], {'engineering': 1, 'marketing': 1})
+        self.assertEqual(data['output_format'], {'code': 1, 'text': 1})
+
+    def test_search_mine_and_staff(self):
+        data = self.facets({'search': 'email'}).data
+        self.assertEqual((data['total'], data['category']), (1, {'marketing': 1}))
+        data = self.facets({'search': 'email'}, user=self.admin).data
+        self.assertEqual(data['category'], {'marketing': 1, 'sales': 1})
+        data = self.facets(user=self.admin).data
+        self.assertEqual(data['status'], {'approved': 3, 'pending': 1, 'rejected': 1})
+        self.client.force_authenticate(User.objects.create_user(username='bob', password='pw'))
+        self.assertEqual(self.facets({'mine': '1'}).data['total'], 3)
+        self.assertEqual(self.facets({'mine': '1'}, user=self.alice).data['total'], 5)
+
+    def test_concurrent_changes_count_once(self):
+        # Two requests that loaded the pending prompt before either saved.
+        first, second = Prompt.objects.get(pk=self.prompts[3].pk), Prompt.objects.get(pk=self.prompts[3].pk)
+        for prompt in (first, second):
+            with facets.locked(prompt):
+                prompt.status = 'approved'
+                prompt.save()
+                facets.saved(prompt)
+        self.assertEqual(self.rollup(), sorted(facets.combinations(Prompt.objects.all())))
+        stale = Prompt.objects.get(pk=self.prompts[4].pk)
+        with facets.locked(Prompt.objects.get(pk=stale.pk)) as prompt:
+            facets.deleted(prompt)
+            prompt.delete()
+        with self.assertRaises(Http404):
+            with facets.locked(stale):
+                pass
+        self.assertEqual(self.rollup(), sorted(facets.combinations(Prompt.objects.all())))
+
+    def test_multiple_values_and_per_user_filters(self):
+        data = self.facets({'category': 'engineering,marketing', 'output_format': 'text'}).data
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['category'], {'engineering': 1, 'marketing': 1})
+        Bookmark.objects.create(user=self.alice, prompt=self.prompts[2])
+        data = self.facets({'bookmarked': 'true'}).data
+        self.assertEqual((data['total'], data['category']), (1, {'marketing': 1}))
+        self.assertNotIn('X-Cache', self.facets({'bookmarked': 'true'}))
+        data = self.facets({'mine': '1', 'owned': 'true', 'status': 'pending'}).data
+        self.assertEqual((data['total'], data['status']), (1, {'approved': 3, 'pending': 1, 'rejected': 1}))
+
+    def test_cached_per_catalog_generation(self):
+        self.assertEqual(self.facets()['X-Cache'], 'MISS')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.facets()['X-Cache'], 'HIT')
+        self.client.force_authenticate(self.admin)
+        self.client.post(f'/api/prompts/{self.prompts[3].id}/approve/')
+        res = self.facets(user=self.alice)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['total'], 4)
+        self.assertNotIn('X-Cache', self.facets(user=self.admin))
+        res = self.client.get('/api/prompts/facets/', {'status': 'nonsense'})
+        self.assertEqual(res.status_code, 400)
+
+    def test_rollup_follows_changes(self):
+        self.client.post('/api/prompts/', {
+            'title': 'New', 'prompt_text': 'Text', 'task_type': 'create_code',
+            'output_format': 'code', 'category': 'sales',
+        }, format='json')
+        self.client.patch(f'/api/prompts/{self.prompts[1].id}/', {'category': 'sales'}, format='json')
+        self.client.force_authenticate(self.admin)
+        self.client.post(f'/api/prompts/{self.prompts[3].id}/approve/')
+        self.client.post('/api/prompts/moderation/bulk/',
+                         {'action': 'reject', 'ids': [self.prompts[0].id, self.prompts[2].id]}, format='json')
+        self.client.post('/api/prompts/moderation/bulk/', {'action': 'delete', 'ids': [self.prompts[4].id]},
+                         format='json')
+        self.client.delete(f'/api/prompts/{self.prompts[3].id}/')
+        maintained = self.rollup()
+        facets.rebuild()
+        self.assertEqual(maintained, self.rollup())
+        self.assertEqual(sum(n for _, n in maintained), Prompt.objects.count())
+        self.assertFalse(PromptFacetCount.objects.filter(count__lt=0).exists())
+
+
+class ClaimsAuthenticationTests(PromptAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(username='admin', password='pw', is_staff=True)
+        self.alice = User.objects.create_user(username='alice', password='pw', email='alice@example.com')
+        # Claims are only trusted with a cache every worker sees.
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'prompts': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tmp.name},
+        })
+        override.enable()
+        self.addCleanup(override.disable)
+        # Users saved in this second would make the new tokens look stale.
+        authentication._changed.clear()
+
+    def login(self, username):
+        res = APIClient().post('/api/token/', {'username': username, 'password': 'pw'}, format='json')
+        self.assertEqual(res.status_code, 200)
+        return res.data
+
+    def client_for(self, access):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return client
+
+    def test_claims_skip_the_user_query(self):
+        tokens = self.login('alice')
+        self.assertEqual(AccessToken(tokens['access'])['username'], 'alice')
+        client = self.client_for(tokens['access'])
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get('/api/categories/').status_code, 200)
+        with self.assertNumQueries(2):
+            self.client_for(AccessToken.for_user(self.alice)).get('/api/categories/')
+        res = client.get('/api/auth/user/')
+        self.assertEqual((res.data['username'], res.data['email'], res.data['is_staff']),
+                         ('alice', 'alice@example.com', False))
+        res = client.post('/api/prompts/', {'title': 'Mine', 'prompt_text': 'Text', 'task_type': 'create_code',
+                                            'output_format': 'code', 'category': 'sales'}, format='json')
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(Prompt.objects.get(pk=res.data['id']).user, self.alice)
+
+    def test_promotion_and_deactivation_invalidate_claims(self):
+        tokens = self.login('alice')
+        client = self.client_for(tokens['access'])
+        self.assertEqual(client.get('/api/cache/stats/').status_code, 403)
+        admin = self.client_for(self.login('admin')['access'])
+        self.assertEqual(admin.post('/api/auth/promote-admin/', {'username': 'alice'}, format='json').status_code, 200)
+        self.assertEqual(client.get('/api/cache/stats/').status_code, 200)
+        refreshed = APIClient().post('/api/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertTrue(AccessToken(refreshed.data['access'])['is_staff'])
+
+        self.alice.is_active = False
+        self.alice.save()
+        self.assertEqual(client.get('/api/categories/').status_code, 401)
+
+    def test_per_process_cache_loads_the_user(self):
+        tokens = self.login('alice')
+        with override_settings(CACHES={'prompts': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertFalse(authentication.shared())
+            client = self.client_for(tokens['access'])
+            with self.assertNumQueries(2):
+                self.assertEqual(client.get('/api/categories/').status_code, 200)
+            # Changed behind the cache's back, as in another worker.
+            User.objects.filter(pk=self.alice.pk).update(is_active=False)
+            self.assertEqual(client.get('/api/categories/').status_code, 401)
+
+
+class HashingPoolTests(TestCase):
+    def register(self, username):
+        return APIClient().post('/api/register/', {'username': username, 'email': 'Me@Example.COM',
+                                                   'password': 'secret'}, format='json')
+
+    def login(self, username, password):
+        return APIClient().post('/api/token/', {'username': username, 'password': password}, format='json')
+
+    def test_register_and_login_hash_in_the_pool(self):
+        res = self.register('carol')
+        self.assertEqual(res.status_code, 201)
+        self.assertNotIn('password', res.data)
+        user = User.objects.get(username='carol')
+        self.assertTrue(user.check_password('secret'))
+        self.assertEqual(user.email, 'Me@example.com')
+        self.assertEqual(self.login('carol', 'secret').status_code, 200)
+        self.assertEqual(self.login('carol', 'wrong').status_code, 401)
+        self.assertEqual(self.login('nobody', 'secret').status_code, 401)
+        self.assertEqual(hashing.pool.pending, 0)
+
+    def test_overload_answers_503(self):
+        User.objects.create_user(username='dave', password='secret')
+        with override_settings(PROMPT_HASH_MAX_PENDING=0):
+            for res in (self.register('erin'), self.login('dave', 'secret')):
+                self.assertEqual(res.status_code, 503)
+                self.assertEqual(res['Retry-After'], '1')
+        self.assertFalse(User.objects.filter(username='erin').exists())
+
+    @override_settings(PROMPT_HASH_WORKERS=0)
+    def test_inline_without_workers(self):
+        self.assertEqual(self.register('frank').status_code, 201)
+        self.assertEqual(self.login('frank', 'secret').status_code, 200)
+
+
+class AsyncViewTests(PromptAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user(username='alice', password='pw')
+        self.bob = User.objects.create_user(username='bob', password='pw')
+        self.approved = make_prompt(self.alice, title='Shared', category='house_style')
+        self.pending = make_prompt(self.alice, title='Draft', status='pending')
+        self.client = AsyncClient()
+
+    def auth(self, user):
+        return {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+
+    async def test_jwt_list_and_categories(self):
+        res = await self.client.get('/api/prompts/', {'mine': '1'}, headers=self.auth(self.alice))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual({p['title'] for p in res.json()['results']}, {'Shared', 'Draft'})
+        res = await self.client.get('/api/categories/', headers=self.auth(self.alice))
+        self.assertIn('house_style', res.json())
+        self.assertIn('engineering', res.json())
+        res = await self.client.get('/api/auth/user/', headers=self.auth(self.bob))
+        self.assertEqual(res.json()['username'], 'bob')
+        res = await self.client.get('/api/prompts/')
+        self.assertEqual(res.status_code, 401)
+
+    async def test_object_permissions(self):
+        res = await self.client.get(f'/api/prompts/{self.approved.id}/', headers=self.auth(self.bob))
+        self.assertEqual(res.status_code, 200)
+        res = await self.client.get(f'/api/prompts/{self.pending.id}/', headers=self.auth(self.bob))
+        self.assertEqual(res.status_code, 404)
+        res = await self.client.get(f'/api/prompts/{self.pending.id}/', {'mine': '1'}, headers=self.auth(self.alice))
+        self.assertEqual(res.json()['title'], 'Draft')
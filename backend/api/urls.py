@@ -9,6 +9,10 @@ from .views import (
     PromoteAdminView,
     CurrentUserView, 
     BookmarkToggleView,
+    CacheStatsView,
+    MetricsView,
+    ProfileListView,
+    ProfileDetailView,
 )
 
 router = DefaultRouter()
@@ -21,6 +25,10 @@ urlpatterns = [
     path('auth/company-sso/', CompanySSOView.as_view(), name='company-sso'),
     path('auth/user/', CurrentUserView.as_view(), name='current-user'),
     path('categories/', CategoryListView.as_view(), name='category-list'),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('profiles/', ProfileListView.as_view(), name='profile-list'),
+    path('profiles/<str:report_id>/', ProfileDetailView.as_view(), name='profile-detail'),
     # path('prompts/<int:pk>/vote/', VoteToggleView.as_view(), name='prompt-vote'),
     path('prompts/<int:pk>/upvote/', PromptViewSet.as_view({'post': 'upvote'}), name='prompt-upvote'),
     path('prompts/<int:pk>/downvote/', PromptViewSet.as_view({'post': 'downvote'}), name='prompt-downvote'),
@@ -0,0 +1,181 @@
+# api/versioning.py
+"""
+Compact storage for PromptVersion bodies.
+
+A version's body (description, prompt text and guidance) lives in a
+PromptContent row, addressed by the SHA-256 of the body: an edit that
+leaves the body unchanged reuses the existing row instead of storing the
+text again.
+
+New bodies are stored as a token-level delta against the previous
+snapshot of the same prompt, zlib-compressed. Every
+PROMPT_VERSION_KEYFRAME_INTERVAL steps (or when a delta would not be
+smaller) a full keyframe is written instead, so rebuilding a body never
+walks more than that many rows.
+
+Bodies are rebuilt lazily (`PromptVersion.body`), or for a whole page of
+versions at once with `prefetch_bodies()`, which fetches each level of the
+delta chains in one query. Every rebuilt body is checked against its
+digest, so a revert restores exactly what was stored.
+"""
+import difflib
+import hashlib
+import json
+import re
+import zlib
+
+from django.conf import settings
+
+from .models import PromptContent, PromptVersion
+
+BODY_FIELDS = ('prompt_description', 'prompt_text', 'guidance')
+META_FIELDS = ('title', 'task_type', 'output_format', 'category')
+
+# Every character is either part of a word or a token of its own, so
+# ''.join(TOKEN_RE.findall(text)) == text.
+TOKEN_RE = re.compile(r'\w+|\W')
+
+
+def keyframe_interval():
+    return getattr(settings, 'PROMPT_VERSION_KEYFRAME_INTERVAL', 16)
+
+
+# --- codec ---
+
+def encode_body(values):
+    return json.dumps([values.get(f) for f in BODY_FIELDS], ensure_ascii=False, separators=(',', ':'))
+
+
+def decode_body(text):
+    return dict(zip(BODY_FIELDS, json.loads(text)))
+
+
+def body_digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def make_delta(base, text):
+    """
+    Ops turning `base` into `text`: [i, j] copies base tokens i..j, a string
+    is inserted as is.
+    """
+    a, b = TOKEN_RE.findall(base), TOKEN_RE.findall(text)
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b).get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append(''.join(b[j1:j2]))
+    return ops
+
+
+def apply_delta(base, ops):
+    tokens = TOKEN_RE.findall(base)
+    return ''.join(op if isinstance(op, str) else ''.join(tokens[op[0]:op[1]]) for op in ops)
+
+
+def _pack(payload):
+    return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def _unpack(data):
+    return json.loads(zlib.decompress(bytes(data)).decode('utf-8'))
+
+
+# --- storage ---
+
+def store_body(text, base=None, base_text=None):
+    """
+    The PromptContent holding `text`, creating it if needed: a delta against
+    `base` (a PromptContent whose body is `base_text`) when that is
+    worthwhile, otherwise a keyframe.
+    """
+    digest = body_digest(text)
+    existing = PromptContent.objects.filter(digest=digest).first()
+    if existing is not None:
+        return existing
+
+    full = _pack(text)
+    fields = {'base': None, 'depth': 0, 'data': full, 'size': len(text)}
+    if base is not None and base.depth + 1 < keyframe_interval():
+        if base_text is None:
+            base_text = resolve([base])[base.pk]
+        delta = _pack(make_delta(base_text, text))
+        if len(delta) < len(full):
+            fields.update(base=base, depth=base.depth + 1, data=delta)
+
+    content, _ = PromptContent.objects.get_or_create(digest=digest, defaults=fields)
+    return content
+
+
+def resolve(contents):
+    """
+    {content pk: body text} for the given PromptContent rows. Missing delta
+    bases are fetched one chain level per query.
+    """
+    rows = {c.pk: c for c in contents}
+    missing = {c.base_id for c in rows.values() if c.base_id and c.base_id not in rows}
+    while missing:
+        fetched = PromptContent.objects.in_bulk(missing)
+        rows.update(fetched)
+        missing = {c.base_id for c in fetched.values() if c.base_id and c.base_id not in rows}
+
+    known = {}
+
+    def text_of(pk):
+        chain = []
+        while pk is not None and pk not in known:
+            chain.append(rows[pk])
+            pk = rows[pk].base_id
+        text = known.get(pk)
+        for row in reversed(chain):
+            payload = _unpack(row.data)
+            text = payload if row.base_id is None else apply_delta(text, payload)
+            known[row.pk] = text
+        return text
+
+    texts = {}
+    for content in contents:
+        text = text_of(content.pk)
+        if body_digest(text) != content.digest:
+            raise ValueError(f"PromptContent {content.pk} does not match its digest")
+        texts[content.pk] = text
+    return texts
+
+
+def load_body(content):
+    return decode_body(resolve([content])[content.pk])
+
+
+def prefetch_bodies(versions):
+    """
+    Rebuild the bodies of many versions with a handful of queries and cache
+    them on the instances.
+    """
+    versions = [v for v in versions if 'body' not in v.__dict__]
+    texts = resolve({v.content_id: v.content for v in versions}.values())
+    for version in versions:
+        version.body = decode_body(texts[version.content_id])
+    return versions
+
+
+def snapshot(prompt, edited_by, **values):
+    """
+    Record the prompt's current state (with `values` overriding fields) as
+    a new PromptVersion, delta-encoded against its previous snapshot.
+    """
+    fields = {f: getattr(prompt, f) for f in BODY_FIELDS + META_FIELDS}
+    fields.update(values)
+    previous = (
+        PromptVersion.objects.filter(prompt=prompt)
+        .select_related('content')
+        .order_by('-version_created_at', '-id')
+        .first()
+    )
+    content = store_body(encode_body(fields), base=previous.content if previous else None)
+    return PromptVersion.objects.create(
+        prompt=prompt,
+        edited_by=edited_by,
+        content=content,
+        **{f: fields[f] for f in META_FIELDS},
+    )
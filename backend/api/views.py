@@ -1,15 +1,65 @@
-from rest_framework import viewsets, permissions, generics, status, filters
+from rest_framework import viewsets, permissions, generics, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
+import datetime
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db.models import Q
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q, Count, Exists, Max, OuterRef
+from django_filters import rest_framework as filters
+from django_filters import utils as filter_utils
 from django_filters.rest_framework import DjangoFilterBackend
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.db import transaction
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
-from .models import Vote, Bookmark, PromptVersion, Prompt, CATEGORY_CHOICES
-from .serializers import PromptSerializer, PromptVersionSerializer, UserSerializer
+from .models import (
+    Vote, Bookmark, PromptVersion, Prompt, CATEGORY_CHOICES, FACET_FIELDS, MODERATION_STATUSES, STATUS_CHOICES,
+)
+from .serializers import (
+    LARGE_FIELDS, ModerationQueueSerializer, PromptListSerializer, PromptSerializer, PromptVersionSerializer,
+    PromptVersionSummarySerializer, UserSerializer, requested_fields,
+)
+from .pagination import KeysetCursorPagination, ModerationCursorPagination, VersionCursorPagination
+from .async_views import AsyncAPIView, AsyncViewMixin
+from .search import FullTextSearchFilter
+from .suggest import suggest_titles
+from . import related as related_index
+from . import minhash
+from . import counters
+from . import cache as response_cache
+from . import conditional
+from . import metrics
+from . import profiling
+from . import versioning
+from . import diffs
+from . import export
+from . import importer
+from . import facets
+from . import fastpath
+from . import fragments
+
+# List filters that depend on who is asking, so the results can't be shared.
+USER_SCOPED_PARAMS = ('mine', 'bookmarked', 'owned')
+
+# Bulk moderation action -> resulting status.
+BULK_MODERATION_STATUS = {'approve': 'approved', 'reject': 'rejected', 'delete': 'deleted'}
+
+
+def _bulk_target(action_choice, current):
+    # Rejecting a deletion request keeps the prompt, as review_delete does.
+    if action_choice == 'reject' and current == 'pending_deletion':
+        return 'approved'
+    return BULK_MODERATION_STATUS[action_choice]
 
 
 # Custom permission
@@ -65,7 +115,7 @@ class IsAdminOrOwner(permissions.BasePermission):
 
         # For write operations, must be the owner
 
-        return obj.user == request.user
+        return obj.user_id == request.user.pk
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -73,16 +123,17 @@ class RegisterView(generics.CreateAPIView):
     serializer_class = UserSerializer
 
 
-class CategoryListView(generics.ListAPIView):
+class CategoryListView(AsyncAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
-    def get(self, request, *args, **kwargs):
+    async def get(self, request, *args, **kwargs):
         predefined_categories = [choice[0] for choice in CATEGORY_CHOICES]
-        user_categories = list(
-            request.user.prompts.all()
+        user_categories = [
+            category async for category in
+            Prompt.objects.filter(user_id=request.user.pk).order_by()
             .values_list('category', flat=True)
             .distinct()
-        )
+        ]
         all_categories = sorted(list(set(predefined_categories + user_categories)))
         return Response(all_categories)
 
@@ -106,44 +157,483 @@ class PromoteAdminView(APIView):
         if user_to_promote.is_staff:
             return Response({'message': f'User "{username}" is already an admin.'}, status=status.HTTP_400_BAD_REQUEST)
         user_to_promote.is_staff = True
+        # Saving also stops trusting the claims of their current tokens
+        # (see api/authentication.py).
         user_to_promote.save()
         return Response({'message': f'Successfully promoted user "{username}" to admin.'})
 
 
-class CurrentUserView(APIView):
+class CacheStatsView(APIView):
+    """
+    Admin-only: hit/miss counters of the prompt response cache.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(response_cache.stats.snapshot())
+
+
+class MetricsView(APIView):
+    """
+    Admin-only: per-endpoint latency, SQL and status metrics of all
+    workers, in the Prometheus text exposition format.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(metrics.render(metrics.collect()), content_type=metrics.CONTENT_TYPE)
+
+
+class ProfileListView(APIView):
+    """
+    Admin-only: the most recent request profiles (see api/profiling.py).
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = min(int(request.query_params.get('limit', 50)), 200)
+        except ValueError:
+            limit = 50
+        return Response(profiling.recent_reports(limit))
+
+
+class ProfileDetailView(APIView):
+    """
+    Admin-only: full report of one profile, including its SQL and plans.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, report_id, *args, **kwargs):
+        report = profiling.load_report(report_id)
+        if report is None:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(report)
+
+
+class CurrentUserView(AsyncAPIView):
     """
     Returns current user's basic details for frontend (id, username, email, is_staff).
     """
     permission_classes = [permissions.IsAuthenticated]
 
-    def get(self, request, *args, **kwargs):
+    async def get(self, request, *args, **kwargs):
         user = request.user
+        # Not among the token claims (see api/authentication.py).
+        email = await User.objects.filter(pk=user.pk).values_list('email', flat=True).afirst()
         return Response({
             "id": user.id,
             "username": user.username,
-            "email": user.email,
+            "email": email,
             "is_staff": user.is_staff,
         })
 
 
-class PromptViewSet(viewsets.ModelViewSet):
+class CharInFilter(filters.BaseInFilter, filters.CharFilter):
+    pass
+
+
+class PromptFilter(filters.FilterSet):
+    """
+    ?category=, ?task_type= and ?output_format= take one value or several,
+    comma-separated (?category=sales,finance). ?bookmarked=true and
+    ?owned=true narrow the list to the requesting user's bookmarks or own
+    prompts (with ?mine=1, including unapproved ones).
+    """
+    category = CharInFilter(lookup_expr='in')
+    task_type = CharInFilter(lookup_expr='in')
+    output_format = CharInFilter(lookup_expr='in')
+    bookmarked = filters.BooleanFilter(method='filter_bookmarked')
+    owned = filters.BooleanFilter(method='filter_owned')
+
+    class Meta:
+        model = Prompt
+        fields = ['category', 'task_type', 'output_format', 'status']
+
+    def filter_bookmarked(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(Exists(Bookmark.objects.filter(prompt=OuterRef('pk'), user_id=self.request.user.pk)))
+
+    def filter_owned(self, queryset, name, value):
+        return queryset.filter(user_id=self.request.user.pk) if value else queryset
+
+
+class PromptViewSet(AsyncViewMixin, viewsets.ModelViewSet):
     serializer_class = PromptSerializer
     queryset = Prompt.objects.all()
     permission_classes = [permissions.IsAuthenticated, IsAdminOrOwner]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
-    filterset_fields = ['category', 'task_type', 'output_format', 'status']
-    search_fields = ['title', 'prompt_description', 'prompt_text']
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter]
+    filterset_class = PromptFilter
+    pagination_class = KeysetCursorPagination
+    # Lists are written out from pre-rendered row fragments (api/fragments.py).
+    renderer_classes = [fragments.JSONRenderer, BrowsableAPIRenderer]
+
+    def get_serializer_class(self):
+        # Lists default to the slim card row; an explicit ?fields= picks from
+        # the full representation instead.
+        if self.action == 'list' and requested_fields(self.request)[0] is None:
+            return PromptListSerializer
+        return PromptSerializer
+
+    def _unrendered_columns(self):
+        # Large columns the serializer for this request won't render, so the
+        # list query can leave them out.
+        rendered = self.get_serializer().fields
+        return [name for name in LARGE_FIELDS if name not in rendered]
 
     def get_queryset(self):
+        # `id` breaks ties between prompts created in the same instant, so the
+        # keyset cursor never skips or repeats a row.
+        prompts = Prompt.objects.with_vote_stats(self.request.user).defer('search_vector')
+        return self._visible(prompts).order_by('-created_at', '-id')
+
+    def _visible(self, prompts):
+        # Staff see everything; others the approved library, plus their own
+        # prompts with ?mine=1.
         user = self.request.user
         if user.is_staff:
-            return Prompt.objects.all().order_by('-created_at')
+            return prompts
         if self.request.query_params.get('mine') == '1':
-            return Prompt.objects.filter(Q(status='approved') | Q(user=user)).order_by('-created_at')
-        return Prompt.objects.filter(status='approved').order_by('-created_at')
+            return prompts.filter(Q(status='approved') | Q(user_id=user.pk))
+        return prompts.filter(status='approved')
+
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """
+        GET /api/prompts/suggest/?q=<partial title>&limit=<k>
+        Lightweight, typo-tolerant title autocomplete over the approved library.
+        Returns only [{id, title}, ...].
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response([])
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 10
+        limit = max(1, min(limit, 25))
+        return Response(suggest_titles(query, limit=limit))
+
+    @action(detail=False, methods=['get'], url_path='facets', url_name='facets')
+    def facet_counts(self, request):
+        """
+        GET /api/prompts/facets/?category=&task_type=&output_format=&status=&search=&mine=1&bookmarked=&owned=
+        Counts per category, task type, output format and status of the
+        prompts the list would show, e.g. {"total": 40, "category":
+        {"engineering": 12, ...}, ...}. Each facet ignores its own filter.
+        """
+        filterset = DjangoFilterBackend().get_filterset(request, Prompt.objects.all(), self)
+        if not filterset.is_valid():
+            raise filter_utils.translate_validation(filterset.errors)
+        selected, scopes = {}, []
+        for name, value in filterset.form.cleaned_data.items():
+            if value in (None, '', []):
+                continue
+            if name in FACET_FIELDS:
+                selected[name] = value if isinstance(value, list) else [value]
+            else:
+                scopes.append((filterset.filters[name], value))
+        cacheable = self._is_cacheable(request)
+        if cacheable:
+            cache = response_cache.get_cache()
+            key = response_cache.make_key('facets', response_cache.catalog_generation(), request)
+            data = cache.get(key)
+            if data is not None:
+                response = Response(data)
+                response['X-Cache'] = 'HIT'
+                return response
+        data = facets.counts(self._facet_combinations(request, scopes), selected)
+        response = Response(data)
+        if cacheable:
+            cache.set(key, data, response_cache.timeout())
+            response['X-Cache'] = 'MISS'
+        return response
+
+    def _facet_combinations(self, request, scopes):
+        # A search or a per-user filter (?bookmarked=, ?owned=) has to group
+        # the prompts it matches; otherwise the rollup has the counts.
+        search = FullTextSearchFilter()
+        if scopes or search.get_search_term(request):
+            prompts = search.filter_queryset(request, self._visible(Prompt.objects.all()), self)
+            for scope, value in scopes:
+                prompts = scope.filter(prompts, value)
+            return facets.combinations(prompts)
+        if request.user.is_staff:
+            return facets.rollup()
+        combinations = facets.rollup(statuses=['approved'])
+        if request.query_params.get('mine') == '1':
+            own = Prompt.objects.filter(user_id=request.user.pk).exclude(status='approved')
+            combinations += facets.combinations(own)
+        return combinations
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser],
+            renderer_classes=[export.NDJSONRenderer, export.CSVRenderer])
+    def export(self, request):
+        """
+        GET /api/prompts/export/?format=ndjson|csv&updated_since=<ISO date or datetime>
+        Admin-only dump of every prompt with its vote counts and version
+        history, streamed from a server-side cursor (see api/export.py).
+        Accepts the list filters (?category=, ?status=, ?search=, ...).
+        """
+        prompts = self.filter_queryset(Prompt.objects.all())
+        since = request.query_params.get('updated_since')
+        if since:
+            moment = parse_datetime(since)
+            if moment is None and parse_date(since) is not None:
+                moment = datetime.datetime.combine(parse_date(since), datetime.time())
+            if moment is None:
+                return Response(
+                    {'detail': 'updated_since must be an ISO 8601 date or datetime.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if timezone.is_naive(moment):
+                moment = timezone.make_aware(moment, datetime.timezone.utc)
+            prompts = prompts.filter(updated_at__gte=moment)
+
+        fmt = request.accepted_renderer.format
+        # Under ASGI a sync iterator would be buffered whole before sending.
+        if isinstance(request._request, ASGIRequest):
+            chunks, content_type = export.astream(prompts, fmt)
+        else:
+            chunks, content_type = export.stream(prompts, fmt)
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        stamp = timezone.now().strftime('%Y%m%dT%H%M%SZ')
+        response['Content-Disposition'] = f'attachment; filename="prompts-{stamp}.{fmt}"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='import', url_name='import',
+            permission_classes=[IsAdminUser], parser_classes=[MultiPartParser, importer.JSONLinesParser])
+    def import_prompts(self, request):
+        """
+        POST /api/prompts/import/?start=<line offset>&status=<status>
+        Admin-only bulk import of JSONL, either as a multipart `file` or as an
+        application/x-ndjson body (see api/importer.py). Responds with the
+        count imported, the rejected rows and the `offset` to resume from.
+        """
+        upload = request.FILES.get('file')
+        if upload is not None:
+            lines = importer.decode_lines(upload)
+        elif request.content_type.startswith(importer.JSONLinesParser.media_type):
+            lines = request.data
+        else:
+            return Response(
+                {'detail': 'Send a multipart "file" or an application/x-ndjson body.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            start = int(request.query_params.get('start', 0))
+        except ValueError:
+            start = -1
+        status_choice = request.query_params.get('status', 'approved')
+        if start < 0 or status_choice not in {choice for choice, _ in STATUS_CHOICES}:
+            return Response(
+                {'detail': 'start must be a non-negative line offset and status a prompt status.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        run = importer.PromptImporter(request.user, status=status_choice)
+        offset, errors, rejected = start, [], 0
+        try:
+            for batch in run.batches(lines, start=start):
+                offset = batch.offset
+                rejected += len(batch.errors)
+                errors.extend(batch.errors[:max(0, importer.MAX_REPORTED_ERRORS - len(errors))])
+        finally:
+            run.finish()
+        return Response({'imported': run.imported, 'rejected': rejected, 'errors': errors, 'offset': offset})
+
+    def _is_cacheable(self, request):
+        # Only the shared, approved-library view is cached; staff listings and
+        # the "mine", bookmarked and owned filters depend on who is asking.
+        return not request.user.is_staff and not any(
+            request.query_params.get(param) for param in USER_SCOPED_PARAMS
+        )
+
+    async def _detail_etag(self, request, pk):
+        # The row's edit time and status, its vote counters and the
+        # requester's own vote and bookmark: everything the body can change
+        # with. No Last-Modified: other users' votes move no timestamp, so
+        # If-Modified-Since would keep serving stale counts.
+        row = await (
+            self.get_queryset().filter(pk=pk)
+            .values_list('updated_at', 'status', 'annotated_vote_count', 'annotated_like_count',
+                         'annotated_dislike_count', 'annotated_user_vote', 'annotated_is_bookmarked')
+            .afirst()
+        )
+        if row is None:
+            return None
+        return conditional.make_etag('detail', request.get_full_path(), request.user.pk, row)
+
+    async def list(self, request, *args, **kwargs):
+        # The ETag hashes the page about to be sent, links and encoded rows
+        # with their vote counters and per-user fields, so it changes with
+        # anything the body shows. A cache hit builds that page from the
+        # cached entry and row fragments: revalidating is O(page), never a
+        # scan of the whole list. No Last-Modified: prompts that leave the
+        # list and other users' votes don't move any timestamp.
+        response = await self._cached_list(request, await response_cache.acatalog_generation())
+        etag = conditional.make_etag(
+            'list', request.get_full_path(), request.user.pk, hashlib.sha1(response.data.encode()).hexdigest(),
+        )
+        not_modified = conditional.not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+        return conditional.finalize(response, etag)
+
+    def _row_renderer(self):
+        serializer = self.get_serializer()
+        compiled = None
+        if fastpath.enabled():
+            try:
+                compiled = fastpath.CompiledRows(serializer, self.get_queryset().query.annotations)
+            except fastpath.Unsupported:
+                pass
+        return fragments.RowRenderer(serializer, compiled)
+
+    def _list_rows(self, queryset, rows, ordering=()):
+        # Named values_list() rows on the fast path, otherwise instances
+        # without the large columns this serializer won't render.
+        if rows.compiled is not None:
+            return rows.compiled.values(queryset, ordering)
+        return queryset.defer(*self._unrendered_columns())
+
+    async def _list_page(self, request, rows):
+        queryset = self._list_rows(
+            self.filter_queryset(self.get_queryset()), rows, [f.lstrip('-') for f in self.get_cursor_ordering()],
+        )
+        page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        return page, fragments.SplicedPage(
+            self.paginator.get_next_link(), self.paginator.get_previous_link(), await rows.arows(page),
+        )
+
+    async def _cached_list(self, request, generation):
+        rows = self._row_renderer()
+        if not self._is_cacheable(request):
+            return Response((await self._list_page(request, rows))[1])
+        # Entries hold a page's links and (id, updated_at) pairs; the rows
+        # themselves come from the fragment store.
+        cache = response_cache.get_cache()
+        key = response_cache.make_key('page', generation, request)
+        entry = await cache.aget(key)
+        if entry is None:
+            await sync_to_async(response_cache.stats.record)('miss')
+            page, data = await self._list_page(request, rows)
+            await cache.aset(key, {
+                'next': data.next,
+                'previous': data.previous,
+                'rows': [(prompt.id, prompt.updated_at) for prompt in page],
+            }, response_cache.timeout())
+            response = Response(data)
+            response['X-Cache'] = 'MISS'
+            return response
+        await sync_to_async(response_cache.stats.record)('hit')
+        response = Response(fragments.SplicedPage(
+            entry['next'], entry['previous'], await self._cached_rows(request, rows, entry['rows']),
+        ))
+        response['X-Cache'] = 'HIT'
+        return response
+
+    async def _cached_rows(self, request, rows, entries):
+        """
+        Encoded rows for a cached page: volatile values read for its ids,
+        fragments from the store. Prompts deleted since are dropped; ones
+        whose fragment isn't cached (here or in the shared cache) are loaded
+        and rendered.
+        """
+        live = await response_cache.avolatile_values([pk for pk, _ in entries], request.user)
+        entries = [(pk, rows.key(pk, updated_at)) for pk, updated_at in entries if pk in live]
+        found = await rows.alookup([key for _, key in entries])
+        missing = [pk for pk, key in entries if key not in found]
+        if missing:
+            loaded = [prompt async for prompt in self._list_rows(self.get_queryset().filter(pk__in=missing), rows)]
+            keys = {prompt.id: rows.key_for(prompt) for prompt in loaded}
+            rendered = {keys[prompt.id]: rows.render(prompt) for prompt in loaded}
+            await rows.astore(rendered)
+            found.update(rendered)
+            entries = [(pk, keys.get(pk, key)) for pk, key in entries]
+        return [rows.row(found[key], live[pk]) for pk, key in entries if key in found]
+
+    async def retrieve(self, request, *args, **kwargs):
+        etag = await self._detail_etag(request, kwargs.get('pk'))
+        if etag is not None:
+            not_modified = conditional.not_modified(request, etag)
+            if not_modified is not None:
+                return not_modified
+        response = await self._cached_retrieve(request, kwargs.get('pk'))
+        if etag is not None and response.status_code == 200:
+            conditional.finalize(response, etag)
+        return response
+
+    async def _aget_object(self, pk):
+        instance = await self.filter_queryset(self.get_queryset()).filter(pk=pk).afirst()
+        if instance is None:
+            raise Http404
+        await self.acheck_object_permissions(self.request, instance)
+        return instance
+
+    async def _cached_retrieve(self, request, pk):
+        cacheable = self._is_cacheable(request)
+        if cacheable:
+            cache = response_cache.get_cache()
+            key = response_cache.make_key('detail', await response_cache.acatalog_generation(), request, pk)
+            row = await cache.aget(key)
+            if row is not None:
+                merged = await response_cache.amerge([row], request.user)
+                if merged:
+                    await sync_to_async(response_cache.stats.record)('hit')
+                    response = Response(merged[0])
+                    response['X-Cache'] = 'HIT'
+                    return response
+            await sync_to_async(response_cache.stats.record)('miss')
+        response = Response(self.get_serializer(await self._aget_object(pk)).data)
+        if cacheable:
+            await cache.aset(key, response_cache.strip_volatile(response.data), response_cache.timeout())
+            response['X-Cache'] = 'MISS'
+        return response
+
+    # ?ordering= values. Each is served by a (status, ..., id) index; see
+    # api/ranking.py for the hot score.
+    ORDERINGS = {
+        'new': ('-created_at', '-id'),
+        'hot': ('-hot_score', '-id'),
+        'top': ('-vote', '-id'),
+    }
+
+    def get_cursor_ordering(self):
+        # Searches are ranked unless an ordering is asked for; ties fall back
+        # to newest first.
+        ordering = self.request.query_params.get('ordering')
+        if ordering is None and FullTextSearchFilter().get_search_term(self.request):
+            return ('-search_rank', '-created_at', '-id')
+        if ordering is not None and ordering not in self.ORDERINGS:
+            raise ValidationError({'ordering': [f"Must be one of: {', '.join(self.ORDERINGS)}."]})
+        return self.ORDERINGS[ordering or 'new']
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+        facets.saved(serializer.instance)
+        self._flag_duplicates(serializer.instance)
+
+    def perform_destroy(self, instance):
+        prompt_id = instance.pk
+        with facets.locked(instance):
+            facets.deleted(instance)
+            instance.delete()
+        response_cache.bump_generation()
+        transaction.on_commit(lambda: related_index.remove_prompt(prompt_id))
+
+    def _flag_duplicates(self, prompt):
+        """
+        Index the prompt's MinHash signature and record any existing prompts
+        it nearly duplicates, so moderators see them in the admin view.
+        """
+        duplicates = minhash.check_prompt(prompt)
+        # Moving updated_at too keeps cached row fragments (api/fragments.py)
+        # keyed on it from serving the old report.
+        prompt.possible_duplicates = duplicates
+        prompt.updated_at = timezone.now()
+        Prompt.objects.filter(pk=prompt.pk).update(possible_duplicates=duplicates, updated_at=prompt.updated_at)
     
     def perform_update(self, serializer):
         """
@@ -152,46 +642,138 @@ class PromptViewSet(viewsets.ModelViewSet):
         - If user is NON-ADMIN, set status to 'pending'.
         - If user is ADMIN, save changes as-is.
         """
-        prompt_before_edit = self.get_object()
-
-        # Create a history snapshot ONLY if the version being edited was 'approved'
-        if prompt_before_edit.status == 'approved':
-            PromptVersion.objects.create(
-                prompt=prompt_before_edit,
-                edited_by=self.request.user,
-                title=prompt_before_edit.title,
-                prompt_description=prompt_before_edit.prompt_description,
-                prompt_text=prompt_before_edit.prompt_text,
-                guidance=prompt_before_edit.guidance,
-                task_type=prompt_before_edit.task_type,
-                output_format=prompt_before_edit.output_format,
-                category=prompt_before_edit.category
-            )
+        with facets.locked(serializer.instance):
+            prompt_before_edit = self.get_object()
 
-        # Save the new changes
-        if not self.request.user.is_staff:
-            serializer.save(status='pending')
-        else:
-            serializer.save()
+            # Create a history snapshot ONLY if the version being edited was 'approved'
+            if prompt_before_edit.status == 'approved':
+                versioning.snapshot(prompt_before_edit, self.request.user)
+
+            # Save the new changes
+            if not self.request.user.is_staff:
+                serializer.save(status='pending')
+            else:
+                serializer.save()
+            self._flag_duplicates(serializer.instance)
+            self._catalog_changed(serializer.instance)
+
+    def _catalog_changed(self, prompt):
+        """
+        Called whenever a prompt's content or status changes: invalidates
+        cached listings and keeps the facet counts and the related-prompts
+        index in step. Existing prompts are changed inside facets.locked().
+        """
+        facets.saved(prompt)
+        response_cache.bump_generation()
+        transaction.on_commit(lambda: related_index.sync_prompt(prompt))
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAdminUser])
     def approve(self, request, pk=None):
         prompt = self.get_object()
-        if prompt.status == 'approved':
-            return Response({'detail': 'Prompt is already approved.'}, status=status.HTTP_400_BAD_REQUEST)
-        prompt.status = 'approved'
-        prompt.save()
+        with facets.locked(prompt):
+            if prompt.status == 'approved':
+                return Response({'detail': 'Prompt is already approved.'}, status=status.HTTP_400_BAD_REQUEST)
+            prompt.status = 'approved'
+            prompt.save(update_fields=['status', 'updated_at'])
+            self._catalog_changed(prompt)
         return Response(PromptSerializer(prompt).data)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAdminUser])
     def reject(self, request, pk=None):
         prompt = self.get_object()
-        if prompt.status == 'rejected':
-            return Response({'detail': 'Prompt is already rejected.'}, status=status.HTTP_400_BAD_REQUEST)
-        prompt.status = 'rejected'
-        prompt.save()
+        with facets.locked(prompt):
+            if prompt.status == 'rejected':
+                return Response({'detail': 'Prompt is already rejected.'}, status=status.HTTP_400_BAD_REQUEST)
+            prompt.status = 'rejected'
+            prompt.save(update_fields=['status', 'updated_at'])
+            self._catalog_changed(prompt)
         return Response(PromptSerializer(prompt).data)
 
+    @action(detail=False, methods=['get'], url_path='moderation', url_name='moderation',
+            permission_classes=[IsAdminUser])
+    def moderation_queue(self, request):
+        """
+        GET /api/prompts/moderation/?status=pending|pending_deletion
+        Admin-only: prompts waiting for review, oldest first, as lightweight
+        keyset-paginated rows (no body, no vote lookups).
+        """
+        statuses = MODERATION_STATUSES
+        wanted = request.query_params.get('status')
+        if wanted:
+            if wanted not in MODERATION_STATUSES:
+                return Response(
+                    {'detail': f"status must be one of {', '.join(MODERATION_STATUSES)}."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            statuses = (wanted,)
+        prompts = (
+            Prompt.objects.filter(status__in=statuses)
+            .select_related('user')
+            .only(*ModerationQueueSerializer.QUERY_FIELDS)
+        )
+        paginator = ModerationCursorPagination()
+        page = paginator.paginate_queryset(prompts, request, view=self)
+        return paginator.get_paginated_response(ModerationQueueSerializer(page, many=True).data)
+
+    @action(detail=False, methods=['post'], url_path='moderation/bulk', url_name='moderation_bulk',
+            permission_classes=[IsAdminUser])
+    def bulk_moderate(self, request):
+        """
+        POST /api/prompts/moderation/bulk/
+        Body: { "action": "approve" | "reject" | "delete", "ids": [1, 2, ...] }
+        Admin-only: applies the action to every id with set-based UPDATEs
+        (or a DELETE) and returns a result per id: its new status, or an
+        error. Rejecting a pending_deletion prompt restores it to approved.
+        """
+        action_choice = str(request.data.get('action', '')).lower()
+        ids = request.data.get('ids')
+        limit = getattr(settings, 'PROMPT_MODERATION_BULK_MAX', 1000)
+        if action_choice not in BULK_MODERATION_STATUS:
+            return Response(
+                {'detail': f"Invalid action. Must be one of {', '.join(BULK_MODERATION_STATUS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if (not isinstance(ids, list) or not ids or len(ids) > limit
+                or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids)):
+            return Response(
+                {'detail': f'ids must be a list of 1 to {limit} prompt ids.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        ids = list(dict.fromkeys(ids))
+
+        with transaction.atomic():
+            stored = {
+                row[0]: row[1:]
+                for row in Prompt.objects.select_for_update().filter(pk__in=ids).values_list('id', *FACET_FIELDS)
+            }
+            current = {pk: values[FACET_FIELDS.index('status')] for pk, values in stored.items()}
+            target = {pk: _bulk_target(action_choice, old) for pk, old in current.items()}
+            changed = [pk for pk, old in current.items() if old != target[pk]]
+            by_status = {}
+            for pk in changed:
+                by_status.setdefault(target[pk], []).append(pk)
+            for new_status, pks in by_status.items():
+                if action_choice == 'delete':
+                    Prompt.objects.filter(pk__in=pks).delete()
+                else:
+                    Prompt.objects.filter(pk__in=pks).update(status=new_status, updated_at=timezone.now())
+                facets.status_changed([stored[pk] for pk in pks], None if action_choice == 'delete' else new_status)
+
+        results = []
+        for pk in ids:
+            if pk not in current:
+                results.append({'id': pk, 'error': 'Not found.'})
+            elif current[pk] == target[pk]:
+                results.append({'id': pk, 'error': f'Prompt is already {target[pk]}.'})
+            else:
+                results.append({'id': pk, 'status': target[pk]})
+        if changed:
+            response_cache.bump_generation()
+            approved = by_status.get('approved', [])
+            removed = [pk for pk in changed if target[pk] != 'approved']
+            transaction.on_commit(lambda: related_index.sync_prompts(approved=approved, removed=removed))
+        return Response({'action': action_choice, 'changed': len(changed), 'results': results})
+
     # ✅ FIXED: Consolidated vote logic with proper transaction handling
     def _handle_vote(self, request, pk, value_to_set):
         """
@@ -202,35 +784,31 @@ class PromptViewSet(viewsets.ModelViewSet):
         user = request.user
 
         with transaction.atomic():
-            existing = Vote.objects.filter(user=user, prompt=prompt).first()
+            # Lock only this user's vote row; the prompt row is touched by a
+            # single constant-time UPDATE below (or not at all when sharded).
+            existing = Vote.objects.select_for_update().filter(user_id=user.pk, prompt=prompt).first()
+            old_value = existing.value if existing else 0
 
             if existing is None:
                 # No vote exists, create one
-                Vote.objects.create(user=user, prompt=prompt, value=value_to_set)
+                Vote.objects.create(user_id=user.pk, prompt=prompt, value=value_to_set)
+                new_value = value_to_set
+            elif existing.value == value_to_set:
+                # User is clicking the same button again (un-voting)
+                existing.delete()
+                new_value = 0
             else:
-                if existing.value == value_to_set:
-                    # User is clicking the same button again (un-voting)
-                    existing.delete()
-                else:
-                    # User is switching their vote (e.g., down -> up)
-                    existing.value = value_to_set
-                    existing.save()
-
-            # Refresh prompt from database to get latest vote counts
-            prompt.refresh_from_db()
-            
-            # Calculate new counts
-            likes = prompt.votes.filter(value=1).count()
-            dislikes = prompt.votes.filter(value=-1).count()
-
-            # Update aggregate fields
-            prompt.like_count = likes
-            prompt.dislike_count = dislikes
-            prompt.vote = likes - dislikes
-            
-            prompt.save(update_fields=['like_count', 'dislike_count', 'vote'])
-
-        # Return the fully updated prompt
+                # User is switching their vote (e.g., down -> up)
+                existing.value = value_to_set
+                existing.save(update_fields=['value', 'updated_at'])
+                new_value = value_to_set
+
+            # Apply the change as F() deltas instead of recounting every vote
+            counters.apply_vote(prompt.pk, old_value, new_value, shards=prompt.vote_shards,
+                                created_at=prompt.created_at)
+
+        # Return the fully updated prompt (re-read so the annotations are fresh)
+        prompt = self.get_queryset().get(pk=prompt.pk)
         serializer = PromptSerializer(prompt, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -250,6 +828,24 @@ class PromptViewSet(viewsets.ModelViewSet):
         """
         return self._handle_vote(request, pk, value_to_set=-1)
     
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """
+        GET /api/prompts/<pk>/related/?limit=<k>
+        Top-k approved prompts most similar in wording to this one,
+        from the local TF-IDF index (see api/related.py).
+        """
+        prompt = self.get_object()
+        try:
+            limit = int(request.query_params.get('limit', 5))
+        except ValueError:
+            limit = 5
+        limit = max(1, min(limit, 25))
+        ids = related_index.related_prompt_ids(prompt, k=limit)
+        rows = {p.pk: p for p in self.get_queryset().filter(pk__in=ids, status='approved')}
+        serializer = self.get_serializer([rows[i] for i in ids if i in rows], many=True)
+        return Response(serializer.data)
+
     @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
     def history(self, request, pk=None):
         """
@@ -258,15 +854,71 @@ class PromptViewSet(viewsets.ModelViewSet):
         """
         prompt = self.get_object()
         # Check if user is owner or admin
-        if not request.user.is_staff and prompt.user != request.user:
+        if not request.user.is_staff and prompt.user_id != request.user.pk:
             return Response(
                 {'detail': 'You do not have permission to view this history.'},
                 status=status.HTTP_403_FORBIDDEN
             )
         versions = prompt.versions.all()
-        serializer = PromptVersionSerializer(versions, many=True)
-        return Response(serializer.data)
+        # Versions are append-only, so their count and newest timestamp
+        # identify the history exactly.
+        stats = versions.order_by().aggregate(n=Count('id'), last=Max('version_created_at'))
+        query = sorted(request.query_params.items())
+        etag = conditional.make_etag('history', prompt.pk, stats['n'], stats['last'], query)
+        not_modified = conditional.not_modified(request, etag, stats['last'])
+        if not_modified is not None:
+            return not_modified
+
+        # ?summary=1 lists versions without their bodies.
+        summary = request.query_params.get('summary') in ('1', 'true')
+        versions = versions.select_related('edited_by', 'content')
+        if summary:
+            versions = versions.defer('content__data')
+        paginator = VersionCursorPagination()
+        page = paginator.paginate_queryset(versions, request, view=self)
+        if summary:
+            serializer = PromptVersionSummarySerializer(page, many=True)
+        else:
+            versioning.prefetch_bodies(page)
+            serializer = PromptVersionSerializer(page, many=True)
+        response = paginator.get_paginated_response(serializer.data)
+        return conditional.finalize(response, etag, stats['last'])
     
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated],
+            url_path=r'history/(?P<v1>\d+)/diff/(?P<v2>\d+)', url_name='history_diff')
+    def history_diff(self, request, pk=None, v1=None, v2=None):
+        """
+        Structured diff of the body fields between two versions of a prompt.
+        GET /api/prompts/<pk>/history/<v1>/diff/<v2>/?granularity=line|word
+        """
+        prompt = self.get_object()
+        if not request.user.is_staff and prompt.user_id != request.user.pk:
+            return Response(
+                {'detail': 'You do not have permission to view this history.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        granularity = request.query_params.get('granularity', 'line')
+        if granularity not in diffs.GRANULARITIES:
+            return Response(
+                {'detail': f"granularity must be one of {', '.join(diffs.GRANULARITIES)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        versions = prompt.versions.select_related('content').in_bulk([v1, v2])
+        old, new = versions.get(int(v1)), versions.get(int(v2))
+        if old is None or new is None:
+            return Response({'detail': 'Version not found for this prompt.'}, status=status.HTTP_404_NOT_FOUND)
+
+        # Versions are immutable, so the pair identifies the diff.
+        etag = conditional.make_etag('diff', old.pk, new.pk, granularity)
+        not_modified = conditional.not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+        result, hit = diffs.cached_diff(old, new, granularity)
+        response = StreamingHttpResponse(diffs.iter_json(result), content_type='application/json')
+        response['X-Cache'] = 'HIT' if hit else 'MISS'
+        return conditional.finalize(response, etag)
+
     @action(detail=True, methods=["post"], url_path="request-delete", url_name="request_delete")
     def request_delete(self, request, pk=None):
         """
@@ -277,11 +929,13 @@ class PromptViewSet(viewsets.ModelViewSet):
 
         # Only allow owner to request deletion
         if request.user.is_authenticated:
-            if prompt.user and request.user != prompt.user and not request.user.is_staff:
+            if prompt.user_id is not None and request.user.pk != prompt.user_id and not request.user.is_staff:
                 return Response({"detail": "Only the owner can request deletion."}, status=status.HTTP_403_FORBIDDEN)
 
-        prompt.status = "pending_deletion"
-        prompt.save()
+        with facets.locked(prompt):
+            prompt.status = "pending_deletion"
+            prompt.save()
+            self._catalog_changed(prompt)
 
         serializer = self.get_serializer(prompt)
         return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
@@ -299,13 +953,20 @@ class PromptViewSet(viewsets.ModelViewSet):
             return Response({"detail": "Invalid action. Must be 'approve' or 'reject'."}, status=status.HTTP_400_BAD_REQUEST)
 
         if action_choice == "reject":
-            prompt.status = "approved"
-            prompt.save()
+            with facets.locked(prompt):
+                prompt.status = "approved"
+                prompt.save()
+                self._catalog_changed(prompt)
             serializer = self.get_serializer(prompt)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         if action_choice == "approve":
-            prompt.delete()
+            prompt_id = prompt.pk
+            with facets.locked(prompt):
+                facets.deleted(prompt)
+                prompt.delete()
+            response_cache.bump_generation()
+            transaction.on_commit(lambda: related_index.remove_prompt(prompt_id))
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post'], permission_classes=[IsAdminOrOwner], url_path='revert/(?P<version_id>\\d+)')
@@ -325,34 +986,27 @@ class PromptViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Create a snapshot of the current state before reverting
-        if prompt.status == 'approved':
-            PromptVersion.objects.create(
-                prompt=prompt,
-                edited_by=request.user,
-                title=prompt.title,
-                prompt_description=prompt.prompt_description,
-                prompt_text=prompt.prompt_text,
-                guidance=prompt.guidance,
-                task_type=prompt.task_type,
-                output_format=prompt.output_format,
-                category=prompt.category
-            )
-        
-        # Apply the old version's data to the main prompt
-        prompt.title = version.title
-        prompt.prompt_description = version.prompt_description
-        prompt.prompt_text = version.prompt_text
-        prompt.guidance = version.guidance
-        prompt.task_type = version.task_type
-        prompt.output_format = version.output_format
-        prompt.category = version.category
-        
-        # If a non-admin reverts, it must go to pending for re-approval
-        if not request.user.is_staff:
-            prompt.status = 'pending'
-        
-        prompt.save()
+        with facets.locked(prompt):
+            # Create a snapshot of the current state before reverting
+            if prompt.status == 'approved':
+                versioning.snapshot(prompt, request.user)
+
+            # Apply the old version's data to the main prompt
+            prompt.title = version.title
+            prompt.prompt_description = version.prompt_description
+            prompt.prompt_text = version.prompt_text
+            prompt.guidance = version.guidance
+            prompt.task_type = version.task_type
+            prompt.output_format = version.output_format
+            prompt.category = version.category
+
+            # If a non-admin reverts, it must go to pending for re-approval
+            if not request.user.is_staff:
+                prompt.status = 'pending'
+
+            prompt.save()
+            self._flag_duplicates(prompt)
+            self._catalog_changed(prompt)
         
         serializer = self.get_serializer(prompt)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -369,9 +1023,9 @@ class BookmarkToggleView(APIView):
         prompt = get_object_or_404(Prompt, pk=pk)
         user = request.user
 
-        existing = prompt.bookmarks.filter(user=user).first()
+        existing = prompt.bookmarks.filter(user_id=user.pk).first()
         if existing is None:
-            Bookmark.objects.create(user=user, prompt=prompt)
+            Bookmark.objects.create(user_id=user.pk, prompt=prompt)
         else:
             existing.delete()
 
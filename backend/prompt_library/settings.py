@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # 3rd Party Apps
     'rest_framework',
@@ -49,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',  # first, so its timings cover the whole stack
     'corsheaders.middleware.CorsMiddleware', # Add this
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -57,6 +59,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.profiling.ProfilerMiddleware',  # last: it wraps the view itself
 ]
 
 ROOT_URLCONF = 'prompt_library.urls'
@@ -95,9 +98,10 @@ DATABASES = {
 
 
 REST_FRAMEWORK = {
-    # Use JWT for authentication
+    # JWT, trusting the user claims in our tokens instead of loading the
+    # user on every request (see api/authentication.py)
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.ClaimsJWTAuthentication',
     ),
     # Default to requiring authentication
     'DEFAULT_PERMISSION_CLASSES': (
@@ -105,6 +109,139 @@ REST_FRAMEWORK = {
     ),
 }
 
+# Tokens from /api/token/ carry the username and is_staff claims.
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'api.authentication.TokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'api.authentication.TokenRefreshSerializer',
+}
+
+# Seconds a worker trusts that a user's claims haven't changed before
+# checking the "prompts" cache again. Claims are only trusted when that
+# cache is shared (PROMPT_CACHE_URL); with local memory every request
+# loads the user.
+PROMPT_AUTH_CACHE_TTL = 10
+
+# Password checks on login go through the hashing pool (see api/hashing.py).
+AUTHENTICATION_BACKENDS = ['api.hashing.PooledModelBackend']
+
+# Hashing pool: processes per web worker (0: hash inline), their nice
+# level, and admission control. Past PROMPT_HASH_MAX_PENDING running or
+# queued hashes, or after PROMPT_HASH_TIMEOUT seconds, register and login
+# answer 503 with Retry-After: PROMPT_HASH_RETRY_AFTER. Each pending hash
+# holds a request thread, so keep the limit below the threads per worker.
+PROMPT_HASH_WORKERS = int(os.getenv('PROMPT_HASH_WORKERS', 2))
+PROMPT_HASH_NICE = int(os.getenv('PROMPT_HASH_NICE', 0))
+PROMPT_HASH_MAX_PENDING = int(os.getenv('PROMPT_HASH_MAX_PENDING', 4))
+PROMPT_HASH_TIMEOUT = 10
+PROMPT_HASH_RETRY_AFTER = 1
+
+# Keyset pagination for /api/prompts/ (see api/pagination.py).
+# Clients may ask for a smaller or larger page with ?page_size=, capped at the max.
+PROMPT_PAGE_SIZE = int(os.getenv('PROMPT_PAGE_SIZE', 20))
+PROMPT_MAX_PAGE_SIZE = int(os.getenv('PROMPT_MAX_PAGE_SIZE', 100))
+
+# Minimum share of the query's trigrams a title must contain to be suggested
+# by the in-process autocomplete index (Postgres uses pg_trgm's own threshold).
+PROMPT_SUGGEST_THRESHOLD = 0.3
+
+# On-disk TF-IDF index behind /api/prompts/<id>/related/ (see api/related.py).
+# Workers on the same host share it; rebuild with `manage.py build_related_index`.
+PROMPT_RELATED_INDEX_DIR = os.getenv('PROMPT_RELATED_INDEX_DIR', str(BASE_DIR / 'var' / 'related_index'))
+# Changes are appended to a log and folded into a new version in the
+# background once the log is this large (or by `build_related_index --merge`).
+PROMPT_RELATED_MERGE_BYTES = int(os.getenv('PROMPT_RELATED_MERGE_BYTES', 4 * 1024 * 1024))
+
+# Estimated Jaccard similarity above which a new or edited prompt is flagged
+# as a likely duplicate (see api/minhash.py).
+PROMPT_DUPLICATE_THRESHOLD = 0.8
+
+# PromptVersion bodies are stored as deltas against the previous snapshot,
+# with a full keyframe every this many versions (see api/versioning.py).
+PROMPT_VERSION_KEYFRAME_INTERVAL = 16
+
+# In-process LRU of computed version diffs (see api/diffs.py), bounded by
+# the diffs' size.
+PROMPT_DIFF_CACHE_BYTES = int(os.getenv('PROMPT_DIFF_CACHE_BYTES', 32 * 1024 * 1024))
+PROMPT_DIFF_CACHE_TTL = 3600
+# Above this many tokens (both sides together), word diffs fall back to
+# line diffs and SequenceMatcher's autojunk heuristic is kept on.
+PROMPT_DIFF_MAX_TOKENS = 20000
+
+# Prompts per server-side cursor fetch in /api/prompts/export/ (see api/export.py).
+# A chunk holds its prompts' full version history, so keep it modest.
+PROMPT_EXPORT_CHUNK_SIZE = 200
+
+# Bulk JSONL import (see api/importer.py): rows per validated batch and
+# transaction, and whether Postgres uses COPY rather than bulk_create.
+PROMPT_IMPORT_BATCH_SIZE = 1000
+PROMPT_IMPORT_USE_COPY = True
+
+# Most prompt ids one POST /api/prompts/moderation/bulk/ may act on.
+PROMPT_MODERATION_BULK_MAX = 1000
+
+# Caches. The "prompts" alias holds cached prompt listings (see api/cache.py):
+# local memory by default, or set PROMPT_CACHE_URL to a redis:// URL or a
+# file:// directory to share it between workers.
+PROMPT_CACHE_URL = os.getenv('PROMPT_CACHE_URL', '')
+if PROMPT_CACHE_URL.startswith(('redis://', 'rediss://')):
+    _prompt_cache = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': PROMPT_CACHE_URL,
+    }
+elif PROMPT_CACHE_URL.startswith('file://'):
+    _prompt_cache = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': PROMPT_CACHE_URL[len('file://'):],
+    }
+else:
+    _prompt_cache = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'prompts',
+    }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'prompts': _prompt_cache,
+}
+
+PROMPT_CACHE_ALIAS = 'prompts'
+PROMPT_CACHE_TIMEOUT = int(os.getenv('PROMPT_CACHE_TIMEOUT', 300))
+
+# Pre-rendered JSON of list rows, keyed by (id, updated_at) so never stale
+# (see api/fragments.py). Each worker keeps an LRU of at most this many
+# bytes; a shared "prompts" cache also serves as a second level, which
+# `manage.py warm_prompt_fragments` fills.
+PROMPT_FRAGMENT_CACHE_BYTES = int(os.getenv('PROMPT_FRAGMENT_CACHE_BYTES', 64 * 1024 * 1024))
+PROMPT_FRAGMENT_CACHE_ALIAS = PROMPT_CACHE_ALIAS if PROMPT_CACHE_URL else None
+PROMPT_FRAGMENT_CACHE_TIMEOUT = 86400
+
+# Build list rows from values_list() with precompiled row functions instead
+# of serializer fields (see api/fastpath.py). Same output; opt-in.
+PROMPT_LIST_FAST_PATH = os.getenv('PROMPT_LIST_FAST_PATH', '') == '1'
+
+# ?ordering=hot divides net votes by (age in hours + 2) ** gravity; higher
+# sinks older prompts faster (see api/ranking.py).
+PROMPT_HOT_GRAVITY = float(os.getenv('PROMPT_HOT_GRAVITY', 1.8))
+
+# Request metrics served at /api/metrics/ (see api/metrics.py). With several
+# gunicorn workers, point PROMPT_METRICS_DIR at a directory they share (and
+# empty it on restart) so the endpoint reports all of them.
+PROMPT_METRICS_DIR = os.getenv('PROMPT_METRICS_DIR') or None
+PROMPT_METRICS_FLUSH_INTERVAL = 5.0
+
+# Request profiler (see api/profiling.py). Staff trigger it per request with
+# an `X-Profile: 1` header; PROMPT_PROFILE_SAMPLE_RATE = N also profiles one
+# request in N. Statements slower than PROMPT_PROFILE_EXPLAIN_MS get a plan.
+PROMPT_PROFILE_DIR = os.getenv('PROMPT_PROFILE_DIR', str(BASE_DIR / 'var' / 'profiles'))
+PROMPT_PROFILE_SAMPLE_RATE = int(os.getenv('PROMPT_PROFILE_SAMPLE_RATE', 0))
+PROMPT_PROFILE_EXPLAIN_MS = float(os.getenv('PROMPT_PROFILE_EXPLAIN_MS', 100))
+PROMPT_PROFILE_KEEP = 200
+# Bind parameters go into the bundles only when enabled (never for auth_user).
+PROMPT_PROFILE_CAPTURE_PARAMS = os.getenv('PROMPT_PROFILE_CAPTURE_PARAMS', '') == '1'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -9,6 +9,9 @@ export default function HistoryModal({ promptId, onClose }) {
   const [error, setError] = useState(null);
   const [reverting, setReverting] = useState(false);
   const [revertingId, setRevertingId] = useState(null);
+  const [nextPageUrl, setNextPageUrl] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [diffs, setDiffs] = useState({});
 
   useEffect(() => {
     if (!promptId) {
@@ -21,7 +24,8 @@ export default function HistoryModal({ promptId, onClose }) {
       setError(null);
       try {
         const res = await api.get(`/prompts/${promptId}/history/`);
-        setVersions(res.data || []);
+        setVersions(res.data.results || []);
+        setNextPageUrl(res.data.next);
       } catch (err) {
         console.error("Error fetching prompt history:", err);
         
@@ -40,6 +44,64 @@ export default function HistoryModal({ promptId, onClose }) {
     fetchHistory();
   }, [promptId]);
 
+  // History is paginated newest-first; older versions are fetched on demand.
+  const loadOlder = async () => {
+    setLoadingMore(true);
+    try {
+      const res = await api.get(nextPageUrl);
+      setVersions((prev) => [...prev, ...(res.data.results || [])]);
+      setNextPageUrl(res.data.next);
+    } catch (err) {
+      console.error("Error fetching older versions:", err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  // Diff of this version against the one before it, computed by the server.
+  const toggleDiff = async (version, previous) => {
+    if (diffs[version.id]) {
+      setDiffs(({ [version.id]: _, ...rest }) => rest);
+      return;
+    }
+    setDiffs((prev) => ({ ...prev, [version.id]: 'loading' }));
+    try {
+      const res = await api.get(`/prompts/${promptId}/history/${previous.id}/diff/${version.id}/`);
+      setDiffs((prev) => ({ ...prev, [version.id]: res.data }));
+    } catch (err) {
+      console.error("Error fetching diff:", err);
+      setDiffs(({ [version.id]: _, ...rest }) => rest);
+    }
+  };
+
+  const DIFF_LABELS = { prompt_description: 'Description', prompt_text: 'Prompt Text', guidance: 'Guidance' };
+
+  const DiffView = ({ diff }) => {
+    const changed = Object.entries(diff.fields).filter(
+      ([, field]) => field.stats.insertions + field.stats.deletions > 0
+    );
+    if (changed.length === 0) {
+      return <p className="text-sm text-gray-500">No text changes in this edit.</p>;
+    }
+    return changed.map(([name, field]) => (
+      <div key={name} className="p-4 bg-white rounded-lg border border-gray-200/80">
+        <label className="text-xs font-bold text-gray-700 uppercase tracking-wide mb-2 block">
+          {DIFF_LABELS[name] || name}
+        </label>
+        <p className="text-sm text-gray-800 whitespace-pre-wrap font-mono leading-relaxed">
+          {field.ops.map(([op, text], i) => (
+            <span
+              key={i}
+              className={op === '+' ? 'bg-green-100 text-green-800' : op === '-' ? 'bg-red-100 text-red-700 line-through' : ''}
+            >
+              {text}
+            </span>
+          ))}
+        </p>
+      </div>
+    ));
+  };
+
   const handleRevert = async (versionId) => {
     if (!window.confirm("Revert to this version? This will create a new version with these contents.")) {
       return;
@@ -222,8 +284,24 @@ export default function HistoryModal({ promptId, onClose }) {
                     />
                   </div>
 
+                  {/* Changes since the previous version */}
+                  {diffs[version.id] && diffs[version.id] !== 'loading' && (
+                    <div className="space-y-3">
+                      <DiffView diff={diffs[version.id]} />
+                    </div>
+                  )}
+
                   {/* Revert Button */}
-                  <div className="pt-4 border-t border-gray-200/50">
+                  <div className="pt-4 border-t border-gray-200/50 flex flex-wrap gap-3">
+                    {versions[index + 1] && (
+                      <button
+                        onClick={() => toggleDiff(version, versions[index + 1])}
+                        disabled={diffs[version.id] === 'loading'}
+                        className="px-5 py-2.5 bg-white border border-teal-600 text-teal-700 rounded-lg hover:bg-teal-50 disabled:opacity-50 transition-all duration-200 text-sm font-medium"
+                      >
+                        {diffs[version.id] === 'loading' ? "Comparing…" : diffs[version.id] ? "Hide changes" : "Show changes"}
+                      </button>
+                    )}
                     <button
                       onClick={() => handleRevert(version.id)}
                       disabled={reverting}
@@ -237,6 +315,17 @@ export default function HistoryModal({ promptId, onClose }) {
               </div>
             ))
           )}
+          {!loading && !error && nextPageUrl && (
+            <div className="flex justify-center">
+              <button
+                onClick={loadOlder}
+                disabled={loadingMore}
+                className="px-5 py-2 rounded-full text-sm font-semibold bg-white border text-gray-700 hover:bg-gray-200 disabled:opacity-50 transition-all"
+              >
+                {loadingMore ? "Loading…" : "Load older versions"}
+              </button>
+            </div>
+          )}
         </div>
 
         {/* Footer - only show if versions exist */}
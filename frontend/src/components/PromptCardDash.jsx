@@ -44,6 +44,9 @@ export default function PromptCardDash({
       prompt?.status === "approved"
   );
 
+  // near-duplicates flagged by the backend when the prompt was submitted/edited
+  const duplicates = prompt.possible_duplicates ?? prompt.raw?.possible_duplicates ?? [];
+
   // safe handlers
   const safeOnApprove = typeof onApprove === "function" ? onApprove : () => {};
   const safeOnReject = typeof onReject === "function" ? onReject : () => {};
@@ -80,6 +83,15 @@ export default function PromptCardDash({
       {/* Author */}
       <p className="text-xs text-teal-600 font-semibold">@{author}</p>
 
+      {duplicates.length > 0 && (
+        <div className="text-xs bg-amber-50 border border-amber-200 text-amber-700 px-2 py-1 rounded-md">
+          Possible duplicate of{" "}
+          {duplicates
+            .map((d) => `"${d.title}" (${Math.round(d.similarity * 100)}%)`)
+            .join(", ")}
+        </div>
+      )}
+
       {/* Description box (same as user card) */}
       <div className="bg-white p-3 rounded-lg border border-gray-200">
         <p
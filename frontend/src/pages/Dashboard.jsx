@@ -1,5 +1,5 @@
 // src/pages/Dashboard.jsx
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import { Navigate } from "react-router-dom";
 import { useAuth } from "../context/AuthContext";
 import Header from "../components/Header";
@@ -11,6 +11,12 @@ import HistoryModal from "../components/HistoryModal.jsx";
 
 const API_BASE = "http://127.0.0.1:8000/api";
 
+// Moderators read the whole prompt, so ask for the body the slim list leaves out.
+const DASHBOARD_FIELDS = [
+  "user_username", "title", "prompt_description", "prompt_text", "guidance",
+  "task_type", "output_format", "category", "status", "possible_duplicates",
+].join(",");
+
 export default function Dashboard() {
   const { isAdmin, isLoggedIn } = useAuth();
 
@@ -19,28 +25,45 @@ export default function Dashboard() {
   if (!isAdmin) return <Navigate to="/" replace />;
 
   const [prompts, setPrompts] = useState([]);
+  const [nextPageUrl, setNextPageUrl] = useState(null);
+  const [loading, setLoading] = useState(false);
   const [selectedPrompt, setSelectedPrompt] = useState(null);
   const [activeTab, setActiveTab] = useState("pending");
+  // Only the latest request may update the list: a slow page of the
+  // previous tab must not overwrite the new one.
+  const latestRequest = useRef(0);
 
   // History modal states
   const [historyModalOpen, setHistoryModalOpen] = useState(false);
   const [selectedPromptId, setSelectedPromptId] = useState(null);
 
-  // Fetch prompts for the active tab
+  // Fetch a page of prompts for the active tab. The list endpoint is
+  // cursor-paginated ({ next, previous, results }): the first page replaces
+  // the list, "Load more" appends the page at `next`.
+  const fetchPrompts = async (url = null) => {
+    const request = ++latestRequest.current;
+    setLoading(true);
+    try {
+      const res = await fetch(url || `${API_BASE}/prompts/?status=${activeTab}&fields=${DASHBOARD_FIELDS}`, {
+        headers: {
+          Authorization: `Bearer ${localStorage.getItem("accessToken") || ""}`,
+        },
+      });
+      const data = await res.json();
+      if (request !== latestRequest.current) return;
+      const results = data.results || [];
+      setPrompts((prev) => (url ? [...prev, ...results] : results));
+      setNextPageUrl(data.next || null);
+    } catch (err) {
+      console.error("Error fetching prompts:", err);
+    } finally {
+      if (request === latestRequest.current) setLoading(false);
+    }
+  };
+
   useEffect(() => {
-    const fetchPrompts = async () => {
-      try {
-        const res = await fetch(`${API_BASE}/prompts/?status=${activeTab}`, {
-          headers: {
-            Authorization: `Bearer ${localStorage.getItem("accessToken") || ""}`,
-          },
-        });
-        const data = await res.json();
-        setPrompts(data);
-      } catch (err) {
-        console.error("Error fetching prompts:", err);
-      }
-    };
+    setPrompts([]);
+    setNextPageUrl(null);
     fetchPrompts();
   }, [activeTab]);
 
@@ -170,6 +193,18 @@ export default function Dashboard() {
             />
           ))}
         </div>
+
+        {nextPageUrl && (
+          <div className="flex justify-center">
+            <button
+              onClick={() => fetchPrompts(nextPageUrl)}
+              disabled={loading}
+              className="px-5 py-2 rounded-full text-sm cursor-pointer font-semibold transition-all bg-white border text-gray-700 hover:bg-gray-200 disabled:opacity-50"
+            >
+              {loading ? "Loading…" : "Load more"}
+            </button>
+          </div>
+        )}
       </main>
 
       {/* History Modal */}
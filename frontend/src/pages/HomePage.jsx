@@ -1,5 +1,5 @@
 // src/pages/HomePage.jsx
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import { useNavigate } from "react-router-dom";
 import { useAuth } from "../context/AuthContext";
 import PromptModal from "../components/PromptModal";
@@ -14,16 +14,16 @@ import HistoryModal from "../components/HistoryModal";
 
 export default function HomePage() {
   const { user } = useAuth();
-  const [task, setTask] = useState([]);
-  const [output, setOutput] = useState([]);
-  const [department, setDepartment] = useState([]);
   const [showBookmarks, setShowBookmarks] = useState(false);
   const [bookmarks, setBookmarks] = useState([]);
   const [selectedPrompt, setSelectedPrompt] = useState(null);
 
   const [allPrompts, setAllPrompts] = useState([]);
+  const [nextPageUrl, setNextPageUrl] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
+  // Only the latest request may update the list, whatever order they finish in.
+  const latestRequest = useRef(0);
 
   // Filters
   const [searchTerm, setSearchTerm] = useState("");
@@ -108,32 +108,60 @@ export default function HomePage() {
     menu: (provided) => ({ ...provided, zIndex: 9999 }),
   };
 
-  // fetch prompts
-  const fetchPrompts = async () => {
+  // Search, filters, tab and bookmarks are applied by the server, so every
+  // page the list loads already matches them.
+  const listParams = () => {
+    const params = {};
+    if (searchTerm.trim()) params.search = searchTerm.trim();
+    const join = (selected) => selected.map((o) => o.value).join(",");
+    if (selectedCategories.length > 0) params.category = join(selectedCategories);
+    if (selectedTaskTypes.length > 0) params.task_type = join(selectedTaskTypes);
+    if (selectedOutputFormats.length > 0) params.output_format = join(selectedOutputFormats);
+    if (activeTab === "my") {
+      params.mine = 1;
+      params.owned = true;
+    } else {
+      params.status = "approved";
+    }
+    if (showBookmarks) params.bookmarked = true;
+    return params;
+  };
+
+  // fetch prompts (cursor-paginated: { next, previous, results }). Without a
+  // url, loads the first page for the current filters; `next` links already
+  // carry them.
+  const fetchPrompts = async (url = null) => {
+    const append = url !== null;
+    const request = ++latestRequest.current;
     setLoading(true);
     setError(null);
     try {
-      const res = await api.get("/prompts/");
-      const backendPrompts = res.data || [];
+      const res = append ? await api.get(url) : await api.get("/prompts/", { params: listParams() });
+      if (request !== latestRequest.current) return;
+      const backendPrompts = res.data?.results || [];
       const mapped = backendPrompts.map(mapBackendPromptToFrontend);
-      setAllPrompts(mapped);
+      setAllPrompts((prev) => (append ? [...prev, ...mapped] : mapped));
+      setNextPageUrl(res.data?.next || null);
 
       // bookmarks from server (if present)
       const bkIds = backendPrompts
         .filter((p) => p.is_bookmarked || (p.raw && p.raw.is_bookmarked))
         .map((p) => p.id);
-      setBookmarks(bkIds);
+      setBookmarks((prev) => (append ? [...prev, ...bkIds] : bkIds));
     } catch (err) {
       console.error(err);
-      setError("Failed to load prompts");
+      if (request === latestRequest.current) setError("Failed to load prompts");
     } finally {
-      setLoading(false);
+      if (request === latestRequest.current) setLoading(false);
     }
   };
 
+  // Refetch from the first page when a filter changes; typing in the search
+  // box waits for a pause.
   useEffect(() => {
-    fetchPrompts();
-  }, []);
+    const timer = setTimeout(() => fetchPrompts(), searchTerm ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [searchTerm, selectedCategories, selectedTaskTypes, selectedOutputFormats, activeTab, showBookmarks]);
 
   useEffect(() => {
     let mounted = true;
@@ -150,53 +178,6 @@ export default function HomePage() {
     };
   }, []);
 
-  const matchesAny = (selectedArr, fieldValue) => {
-    if (!selectedArr || selectedArr.length === 0) return true;
-    if (!fieldValue) return false;
-    return selectedArr.includes(fieldValue);
-  };
-
-  // filtering
-  const filteredPrompts = allPrompts.filter((p) => {
-    if (!matchesAny(task, p.task)) return false;
-    if (!matchesAny(output, p.output)) return false;
-    if (!matchesAny(department, p.department)) return false;
-
-    if (searchTerm) {
-      const s = searchTerm.toLowerCase();
-      const inTitle = p.title && p.title.toLowerCase().includes(s);
-      const inDesc = (p.desc || p.description || p.prompt_text || p.prompt_description || "").toLowerCase().includes(s);
-      if (!inTitle && !inDesc) return false;
-    }
-
-    if (selectedCategories.length > 0) {
-      const vals = selectedCategories.map((c) => c.value);
-      if (!vals.includes(p.department || p.category)) return false;
-    }
-
-    if (selectedTaskTypes.length > 0) {
-      const vals = selectedTaskTypes.map((t) => t.value);
-      if (!vals.includes(p.task || p.task_type)) return false;
-    }
-
-    if (selectedOutputFormats.length > 0) {
-      const vals = selectedOutputFormats.map((o) => o.value);
-      if (!vals.includes(p.output || p.output_format)) return false;
-    }
-
-    return true;
-  });
-
-  // base list: my vs all
-  let baseList;
-  if (activeTab === "my" && user?.username) {
-    baseList = allPrompts.filter((p) => p.author === user.username);
-  } else {
-    baseList = filteredPrompts.filter((p) => (p.raw && p.raw.status === "approved"));
-  }
-
-  const promptsToShow = showBookmarks ? baseList.filter((p) => bookmarks.includes(p.id)) : baseList;
-
   const handleBookmark = (prompt) => {
     setBookmarks((prev) => (prev.includes(prompt.id) ? prev.filter((id) => id !== prompt.id) : [...prev, prompt.id]));
   };
@@ -204,6 +185,18 @@ export default function HomePage() {
   const handleApprove = (id) => alert("Approved prompt: " + id);
   const handleReject = (id) => alert("Rejected prompt: " + id);
 
+  // List rows are slim (no prompt text or guidance): show the card's data
+  // right away, then swap in the full prompt.
+  const openPrompt = async (p) => {
+    setSelectedPrompt(p);
+    try {
+      const res = await api.get(`/prompts/${p.id}/`);
+      setSelectedPrompt((current) => (current && current.id === p.id ? mapBackendPromptToFrontend(res.data) : current));
+    } catch (err) {
+      console.error(err);
+    }
+  };
+
   const handleCardEdit = (prompt) => {
     navigate(`/add-prompt/${prompt.id}`);
   };
@@ -384,11 +377,11 @@ const handleOpenHistory = (prompt) => {
 
         {/* Cards */}
         <div className="mt-3 grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-3 gap-6">
-          {promptsToShow.map((prompt) => (
+          {allPrompts.map((prompt) => (
             <PromptCard
               key={prompt.id}
               prompt={prompt}
-              onClick={(p) => setSelectedPrompt(p)}
+              onClick={openPrompt}
               handleBookmark={handleBookmark}
               bookmarks={bookmarks}
               onVote={(updatedBackendPrompt) => {
@@ -407,6 +400,14 @@ const handleOpenHistory = (prompt) => {
             />
           ))}
         </div>
+
+        {nextPageUrl && (
+          <div className="flex justify-center">
+            <button onClick={() => fetchPrompts(nextPageUrl)} disabled={loading} className="px-5 py-2 rounded-full text-sm cursor-pointer font-semibold transition-all bg-white border text-gray-700 hover:bg-gray-200 disabled:opacity-50">
+              {loading ? "Loading…" : "Load more"}
+            </button>
+          </div>
+        )}
       </main>
 
       <PromptModal prompt={selectedPrompt} onClose={() => setSelectedPrompt(null)} onApprove={handleApprove} onReject={handleReject} />